@@ -0,0 +1,178 @@
+import re
+import threading
+
+import numpy as np
+
+# Light "S" stemming (plural endings only). Changing it changes the terms
+# the index is built with, so a saved index is rebuilt (see Analyzer.signature).
+STEMMING = False
+# Bumped whenever the token rules change, for the same reason
+ANALYZER_VERSION = 1
+# Distinct raw tokens remembered by an Analyzer; beyond this, new ones are
+# analyzed again each time they are seen
+MAX_CACHED_TOKENS = 1_000_000
+
+# DO NOT include: car, vehicle, electric, battery, engine, motor, etc.
+# These are words you WANT to find!
+STOP_WORDS = {
+    # Articles
+    "the", "a", "an",
+
+    # Conjunctions
+    "and", "or", "but", "if", "because",
+
+    # Prepositions
+    "in", "on", "at", "to", "for", "of", "with", "by", "from",
+    "about", "into", "through", "during", "before", "after",
+    "above", "below", "between", "under",
+
+    # Be verbs
+    "is", "are", "was", "were", "be", "been", "being",
+
+    # Have verbs
+    "have", "has", "had",
+
+    # Do verbs
+    "do", "does", "did",
+
+    # Pronouns
+    "i", "you", "he", "she", "it", "we", "they",
+    "this", "that", "these", "those",
+    "my", "your", "his", "her", "its", "our", "their",
+
+    # Common words
+    "will", "would", "could", "should", "can", "may", "might",
+    "just", "also", "very", "really", "only", "even",
+    "more", "most", "other", "some", "any", "all", "each",
+    "no", "not", "so", "than", "too", "now", "here", "there"
+}
+
+# Tokens are runs of these bytes; everything else, including every byte
+# of a non-ASCII character, separates them. Splitting on a translated copy
+# is several times faster than a regex over the text.
+TOKEN_CHARACTERS = b"abcdefghijklmnopqrstuvwxyz0123456789-."
+TOKEN_BYTES = bytes(c if c in TOKEN_CHARACTERS else ord(" ") for c in range(256))
+# Within a token that is not plain letters: a run of letters and digits
+# (EV6, 4runner) is one term, and so is a run joined to a number by "-"
+# or "." (F-150, ID.4, MX-30). Words joined to words ("e-tron",
+# "well-known") and sentence ends ("2023.The") still split.
+TERM = re.compile(r'[a-z0-9]+(?:[-.](?=[0-9])[a-z0-9]+)?')
+SEPARATORS = str.maketrans("", "", "-.")
+
+
+def stem(word):
+    """Harman's S stemmer: strips plural endings and nothing else"""
+    if len(word) <= 3 or not word.endswith("s") or not word.isalpha():
+        return word
+    if word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if not word.endswith(("us", "ss")):
+        return word[:-1]
+    return word
+
+
+class TermDictionary:
+    """Dense integer ids for terms, assigned in order of first sight"""
+
+    def __init__(self):
+        self.terms = []
+        self.ids = _Ids(self)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def id(self, term):
+        return self.ids[term]
+
+
+class _Ids(dict):
+    def __init__(self, dictionary):
+        super().__init__()
+        self.dictionary = dictionary
+
+    def __missing__(self, term):
+        with self.dictionary.lock:
+            if term not in self:
+                self[term] = len(self.dictionary.terms)
+                self.dictionary.terms.append(term)
+        return self[term]
+
+
+class _Tokens(dict):
+    # raw token -> its terms. Only tokens off the plain-word fast path
+    # (model numbers, punctuation, or every token when stemming) get here.
+    def __init__(self, analyzer):
+        super().__init__()
+        self.analyzer = analyzer
+
+    def __missing__(self, token):
+        terms = [term for term in map(self.analyzer.analyze_term, TERM.findall(token)) if term]
+        if len(self) < MAX_CACHED_TOKENS:
+            self[token] = terms
+        return terms
+
+
+class Analyzer:
+    """Text to index terms: lowercase, split into tokens, drop stop words
+    and numbers, join model names ("F-150" and "f150" are both f150) and,
+    if stemming, strip plural endings.
+
+    Plain lowercase words, nearly all tokens, only need the stop word
+    check. The rest are analyzed once per distinct token and remembered.
+    """
+
+    def __init__(self, stemming=None):
+        self.stemming = STEMMING if stemming is None else stemming
+        self.tokens = _Tokens(self)
+        self.dictionary = TermDictionary()
+
+    @property
+    def signature(self):
+        """Identifies the terms this analyzer produces"""
+        return f"analyzer:{ANALYZER_VERSION}:stemming={self.stemming}".encode("utf-8")
+
+    def analyze_term(self, term):
+        if "-" in term or "." in term:
+            term = term.translate(SEPARATORS)
+        if term in STOP_WORDS or term.isdigit():
+            return ""
+        return stem(term) if self.stemming else term
+
+    def analyze(self, text):
+        """Terms of text, in order"""
+        terms = []
+        append = terms.append
+        tokens = self.tokens
+        plain = not self.stemming
+        for token in text.lower().encode("utf-8", "surrogatepass").translate(TOKEN_BYTES).decode("ascii").split():
+            if plain and token.isalpha():
+                if token not in STOP_WORDS:
+                    append(token)
+            else:
+                terms += tokens[token]
+        return terms
+
+    def analyze_ids(self, text):
+        """Term ids of text in self.dictionary, in order"""
+        return list(map(self.dictionary.ids.__getitem__, self.analyze(text)))
+
+    def analyze_batch(self, texts):
+        """Term ids of many texts at once, as CSR arrays: text i is
+        ids[offsets[i]:offsets[i + 1]]"""
+        ids = []
+        offsets = [0]
+        for text in texts:
+            ids += self.analyze_ids(text)
+            offsets.append(len(ids))
+        return np.array(ids, dtype=np.int32), np.array(offsets, dtype=np.int64)
+
+
+ANALYZER = Analyzer()
+
+
+def analyze(text):
+    """Terms of text with the shared analyzer"""
+    return ANALYZER.analyze(text)
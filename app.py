@@ -1,11 +1,21 @@
 import os
+import time
 import logging
-from flask import Flask, render_template, request
-from urllib.parse import urlparse
+import threading
+from contextlib import nullcontext
+from flask import Flask, Response, render_template, request, jsonify
 
 # Import your modules
-from indexer import load_documents, build_inverted_index, search
-from crawler import crawl, SEED_URLS
+from indexer import (load_and_index_documents, build_inverted_index, search, data_fingerprint, save_index,
+                     load_index, add_document, copy_index, is_indexable, query_expander, INDEX_FILE, MAX_RESULTS)
+from document_store import DOCUMENTS_FILE
+from expansion import SYNONYMS
+from metrics import SearchMetrics, SlowQueryProfiler, exposition, stage
+from query_cache import QueryCache, cached_search
+from snapshot import Snapshot, SnapshotHolder
+from suggest import QueryLog, Suggester, QUERY_LOG_FILE
+from vector_search import ShardedMatrix
+from crawler import crawl_all, load_existing_simhashes, load_existing_validators, fetch_report, SEED_URLS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +23,46 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 app.config['DATA_DIR'] = 'data'
+# "tfidf" or "bm25"
+app.config['RANKING'] = 'tfidf'
+# Documents are split into this many shards, scored in parallel per query.
+# Worth raising towards the core count once one core cannot score the
+# whole corpus within the latency budget; small corpora are faster unsharded.
+app.config['SEARCH_SHARDS'] = 1
+# Log sampled stacks of searches slower than this many seconds; None turns
+# the profiler off. While on, a thread samples every running search.
+app.config['SLOW_QUERY_SECONDS'] = None
+# Groups of interchangeable query expressions, e.g. ("ev", "electric vehicle")
+app.config['SYNONYMS'] = SYNONYMS
+# Typeahead ranks past queries by their counts as of this many seconds
+# ago at most; the counts are saved to QUERY_LOG_FILE as often
+app.config['SUGGEST_REFRESH_SECONDS'] = 60
+# While a recrawl runs, the pages it saved are indexed and published this often
+app.config['RECRAWL_PUBLISH_SECONDS'] = 5
+
+search_metrics = SearchMetrics()
+crawl_totals = {"pages": 0, "seconds": 0.0, "last_pages_per_second": 0.0}
+
+def crawl_seed_urls(on_save=None):
+    # Limit to first 5 URLs for quick test
+    urls_to_crawl = SEED_URLS[:5]
+    
+    try:
+        # Stored ETag/Last-Modified values turn refetches of unchanged pages into 304s
+        load_existing_validators()
+        # Near-duplicates are caught against earlier crawls' pages, and this
+        # crawl's fingerprints are saved for the next one
+        load_existing_simhashes()
+        stats = crawl_all(urls_to_crawl, on_save)
+        crawl_totals["pages"] += stats['fetched']
+        crawl_totals["seconds"] += stats['elapsed']
+        crawl_totals["last_pages_per_second"] = stats['fetched'] / stats['elapsed'] if stats['elapsed'] else 0.0
+        report = fetch_report()
+        logger.info(f"🕷️ Crawled {stats['fetched']} pages in {stats['elapsed']:.1f}s, "
+                    f"{report['wire_bytes']} bytes, connection reuse {report['connection_reuse_ratio']:.0%}, "
+                    f"304 hit rate {report['not_modified_rate']:.0%}")
+    except Exception as e:
+        logger.error(f"Error crawling seed URLs: {e}")
 
 def initialize_search_engine(force_recrawl=False):
     # Create data directory if it doesn't exist
@@ -21,33 +71,82 @@ def initialize_search_engine(force_recrawl=False):
     # Check if we need to crawl
     if force_recrawl or not os.listdir(app.config['DATA_DIR']):
         logger.info("🕷️ No documents found. Running crawler...")
-        
-        # Limit to first 5 URLs for quick test
-        urls_to_crawl = SEED_URLS[:5]
-        
-        for url in urls_to_crawl:
-            try:
-                domain = urlparse(url).netloc
-                crawl(url, domain)
-            except Exception as e:
-                logger.error(f"Error crawling {url}: {e}")
+        crawl_seed_urls()
     
-    # Load documents and build index
+    # Reuse the saved index unless the documents changed since it was built
     try:
-        docs = load_documents()
-        index = build_inverted_index(docs)
+        fingerprint = data_fingerprint()
+        saved = load_index(fingerprint)
+        if saved is not None:
+            docs, index = saved
+            logger.info(f"💾 Mapped saved index with {len(docs)} documents")
+            return docs, index
+
+        docs, index = load_and_index_documents()
+        save_index(index, docs, fingerprint)
         
         logger.info(f"📚 Loaded {len(docs)} documents")
-        logger.info(f"🔍 Built index with {len(index)} unique words")
+        logger.info(f"🔍 Built index with {len(index['postings'])} unique words")
         
-        return docs, index
+        # Serve from the saved files so document bodies are not kept in memory
+        return load_index(fingerprint) or (docs, index)
     
     except Exception as e:
         logger.error(f"Error initializing search engine: {e}")
         return {}, {}
 
-# Initialize search engine when app starts
-docs, index = initialize_search_engine()
+search_cache = QueryCache()
+query_log = QueryLog(path=QUERY_LOG_FILE)
+# Started by the first search after SLOW_QUERY_SECONDS is set
+slow_query_profiler = None
+slow_query_lock = threading.Lock()
+
+def profile_if_slow(query):
+    """Profile the search for query if SLOW_QUERY_SECONDS is set, read per request"""
+    global slow_query_profiler
+    threshold = app.config['SLOW_QUERY_SECONDS']
+    if threshold is None:
+        return nullcontext()
+    with slow_query_lock:
+        if slow_query_profiler is None:
+            slow_query_profiler = SlowQueryProfiler(threshold)
+        slow_query_profiler.threshold = threshold
+    return slow_query_profiler.profile(query)
+
+def make_snapshot(docs, index):
+    """Snapshot with the vectorized scorer, typeahead and query expansion built for index"""
+    if not index:
+        return Snapshot(docs, index)
+    query_expander(index, app.config['SYNONYMS'])
+    return Snapshot(docs, index, ShardedMatrix(index, docs, app.config['SEARCH_SHARDS']),
+                    Suggester(index, query_log.popular()))
+
+# Initialize search engine when app starts. Requests read the published
+# snapshot through engine.acquire(); a recrawl publishes a new one.
+engine = SnapshotHolder(make_snapshot(*initialize_search_engine()))
+
+def refresh_popular_queries():
+    """Save the query log and rerank typeahead's past queries, whenever searches were recorded"""
+    refreshed = query_log.recorded
+    while True:
+        time.sleep(app.config['SUGGEST_REFRESH_SECONDS'])
+        if query_log.recorded == refreshed:
+            continue
+        refreshed = query_log.recorded
+        try:
+            query_log.save()
+            with engine.acquire() as snapshot:
+                if snapshot.suggester is not None:
+                    snapshot.suggester.refresh_queries(query_log.popular())
+        except Exception:
+            logger.exception("Refreshing popular queries failed")
+
+threading.Thread(target=refresh_popular_queries, name="popular-queries", daemon=True).start()
+
+def rank(snapshot, query, top_k):
+    if snapshot.matrix is None:
+        return search(query, snapshot.documents, snapshot.index, top_k)
+    return snapshot.matrix.search(query, top_k, ranking=app.config['RANKING'])
 
 @app.route("/")
 def home():
@@ -65,23 +164,30 @@ def search_page():
         return render_template("results.html", query=query, results=[], page = 1, total_pages = 0)
 
     try:
-        all_results = search(query, docs, index)
-        per_page = 25
-        total_results = len(all_results)
-        total_pages = (total_results + per_page - 1) // per_page 
-        total_pages = max(total_pages, 1)
-
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
+        with search_metrics.timed(), profile_if_slow(query), engine.acquire() as snapshot:
+            per_page = 25
+            # Results stop at MAX_RESULTS, two pages, so rank that deep for
+            # every page: the count is exact and all pages share a cache entry
+            all_results = cached_search(search_cache, query, snapshot.documents, snapshot.index,
+                                        top_k=MAX_RESULTS,
+                                        search_function=lambda query, top_k: rank(snapshot, query, top_k),
+                                        version=snapshot.version)
+            if all_results:
+                query_log.record(query)
+            total_results = len(all_results)
+            total_pages = max(1, -(-total_results // per_page))
+            # Past the last page, show the last page
+            page = min(max(page, 1), total_pages)
+            start_idx = (page - 1) * per_page
+            page_results = all_results[start_idx:start_idx + per_page]
 
-        page_results = all_results[start_idx:end_idx]
-        
-        return render_template("results.html", 
-                             query=query, 
-                             results=page_results,  
-                             page=page,
-                             total_pages=total_pages,
-                             total_results=total_results)
+            with stage("render"):
+                return render_template("results.html",
+                                     query=query,
+                                     results=page_results,
+                                     page=page,
+                                     total_pages=total_pages,
+                                     total_results=total_results)
     
     except Exception as e:
             return render_template("results.html", 
@@ -92,12 +198,138 @@ def search_page():
                          total_results=0,
                          error_message="Search failed. Please try again.")
 
+recrawl_status = {"state": "idle", "phase": None, "pages_saved": 0, "pages_indexed": 0, "started": None,
+                  "finished": None, "error": None, "index_version": engine.current.version}
+recrawl_lock = threading.Lock()
+# (doc_id, url, text) of pages the running recrawl saved but has not indexed yet
+saved_pages = []
+
+def _update_recrawl(**changes):
+    with recrawl_lock:
+        recrawl_status.update(changes)
+
+def _queue_saved_page(doc_id, url, text):
+    with recrawl_lock:
+        recrawl_status["pages_saved"] += 1
+        saved_pages.append((doc_id, url, text))
+
+def publish_saved_pages():
+    """Add the pages saved since the last call to a copy of the published
+    index and publish it; returns the number of pages added.
+
+    Building the matrix and typeahead takes seconds on a large index, so
+    the published snapshot has neither: searches score it with
+    indexer.search, and typeahead keeps the vocabulary it had, until
+    run_recrawl publishes the saved index at the end.
+    """
+    with recrawl_lock:
+        pages = [page for page in saved_pages if is_indexable(page[1], page[2])]
+        saved_pages.clear()
+    if not pages:
+        return 0
+    with engine.acquire() as snapshot:
+        docs = snapshot.documents.copy()
+        index = copy_index(snapshot.index) if snapshot.index else build_inverted_index({})
+        suggester = snapshot.suggester
+    # add_document keeps the copied expander up to date
+    query_expander(index, app.config['SYNONYMS'])
+    for doc_id, url, text in pages:
+        add_document(index, docs, doc_id, url, text)
+    engine.publish(Snapshot(docs, index, suggester=suggester))
+    search_cache.invalidate()
+    with recrawl_lock:
+        recrawl_status["pages_indexed"] += len(pages)
+        recrawl_status["index_version"] = engine.current.version
+    return len(pages)
+
+def run_recrawl():
+    """Crawl, publishing the new pages every few seconds, then save the index"""
+    try:
+        _update_recrawl(phase="crawling")
+        crawl = threading.Thread(target=crawl_seed_urls, kwargs={"on_save": _queue_saved_page},
+                                 name="recrawl-crawl", daemon=True)
+        crawl.start()
+        indexed = 0
+        while crawl.is_alive():
+            crawl.join(app.config['RECRAWL_PUBLISH_SECONDS'])
+            indexed += publish_saved_pages()
+
+        if indexed:
+            # Save the published index and serve it from the new files, so
+            # the pages added in memory need not be indexed again at startup
+            _update_recrawl(phase="saving")
+            fingerprint = data_fingerprint()
+            with engine.acquire() as snapshot:
+                save_index(snapshot.index, snapshot.documents, fingerprint)
+            saved = load_index(fingerprint)
+            if saved is None:
+                raise RuntimeError("Saved index could not be loaded")
+            _update_recrawl(phase="publishing")
+            engine.publish(make_snapshot(*saved))
+            search_cache.invalidate()
+        logger.info(f"📚 Published index version {engine.current.version}, {indexed} pages added")
+        _update_recrawl(state="succeeded", phase=None, finished=time.time(), index_version=engine.current.version)
+    except Exception as e:
+        logger.exception("Recrawl failed")
+        _update_recrawl(state="failed", phase=None, finished=time.time(), error=str(e))
+
 @app.route("/recrawl")
 def recrawl():
-    """Force recrawling documents"""
-    global docs, index
-    docs, index = initialize_search_engine(force_recrawl=True)
-    return "Documents recrawled. <a href='/'>Return to home</a>"
+    """Start recrawling and reindexing in the background"""
+    with recrawl_lock:
+        running = recrawl_status["state"] == "running"
+        if not running:
+            recrawl_status.update(state="running", phase="starting", pages_saved=0, pages_indexed=0,
+                                  started=time.time(), finished=None, error=None)
+    if running:
+        return "A recrawl is already running. <a href='/recrawl/status'>Status</a>", 409
+    threading.Thread(target=run_recrawl, name="recrawl", daemon=True).start()
+    return "Recrawl started; new pages become searchable as they are crawled. " \
+           "<a href='/recrawl/status'>Status</a> <a href='/'>Return to home</a>", 202
+
+@app.route("/recrawl/status")
+def recrawl_status_page():
+    """Progress of the current or last recrawl"""
+    with recrawl_lock:
+        return jsonify(recrawl_status)
+
+@app.route("/suggest")
+def suggest():
+    """Typeahead completions for a partly typed query"""
+    with engine.acquire() as snapshot:
+        if snapshot.suggester is None:
+            return jsonify([])
+        return jsonify(snapshot.suggester.suggest(request.args.get("q", "")))
+
+@app.route("/metrics")
+def metrics_page():
+    """Prometheus metrics: search latency by stage, index, cache and crawler"""
+    cache = search_cache.stats()
+    with engine.acquire() as snapshot:
+        num_docs = len(snapshot.documents)
+        num_terms = len(snapshot.index["postings"]) if snapshot.index else 0
+    index_bytes = sum(os.path.getsize(path) for path in (INDEX_FILE, DOCUMENTS_FILE) if os.path.exists(path))
+    values = [
+        ("mobisearch_documents", "gauge", "Documents in the index", num_docs),
+        ("mobisearch_index_terms", "gauge", "Distinct terms in the index", num_terms),
+        ("mobisearch_index_bytes", "gauge", "Size of the saved index and document files", index_bytes),
+        ("mobisearch_cache_hits_total", "counter", "Search cache hits", cache["hits"]),
+        ("mobisearch_cache_misses_total", "counter", "Search cache misses", cache["misses"]),
+        ("mobisearch_cache_hit_ratio", "gauge", "Search cache hits per lookup", cache["hit_rate"]),
+        ("mobisearch_cache_bytes", "gauge", "Estimated size of the cached results", cache["bytes"]),
+        ("mobisearch_crawl_pages_total", "counter", "Pages fetched by crawls", crawl_totals["pages"]),
+        ("mobisearch_crawl_seconds_total", "counter", "Time spent crawling", crawl_totals["seconds"]),
+        ("mobisearch_crawl_pages_per_second", "gauge", "Fetch rate of the last crawl",
+         crawl_totals["last_pages_per_second"]),
+        ("mobisearch_crawl_wire_bytes_total", "counter", "Bytes received by the crawler",
+         fetch_report()["wire_bytes"]),
+    ]
+    return Response(exposition(search_metrics, values), mimetype="text/plain; version=0.0.4")
+
+@app.route("/cache")
+def cache_stats():
+    """Search result cache hit/miss counters"""
+    return jsonify(search_cache.stats())
 
 
 if __name__ == "__main__":
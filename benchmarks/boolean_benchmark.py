@@ -0,0 +1,70 @@
+"""Latency of boolean queries as they get more selective.
+
+Builds a synthetic corpus, saves and maps its index, then times groups
+of queries that pair a frequent word with words of falling frequency
+through AND, plus exclusions. For each group it reports the average
+number of matching documents and the mean latency of the in-memory
+search(), search() on the mapped index (skip-table probes) and the
+vectorized DocumentMatrix. All three must return the same results.
+
+    python benchmarks/boolean_benchmark.py            # 20000 docs
+    python benchmarks/boolean_benchmark.py 100000     # custom size
+"""
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import indexer
+from search_benchmark import make_corpus, time_queries, word
+from vector_search import DocumentMatrix
+
+QUERIES = 50
+TOP_K = 25
+# (name, query template); {common} words are among the 20 most frequent
+GROUPS = (
+    ("a b (any)", lambda rng: f"{word(rng.randint(0, 20))} {word(rng.randint(20, 200))}"),
+    ("a AND b", lambda rng: f"{word(rng.randint(0, 20))} AND {word(rng.randint(20, 200))}"),
+    ("a AND rare", lambda rng: f"{word(rng.randint(0, 20))} AND {word(rng.randint(500, 2000))}"),
+    ("a AND b AND rare", lambda rng: f"{word(rng.randint(0, 20))} AND {word(rng.randint(20, 200))} "
+                                     f"AND {word(rng.randint(2000, 10000))}"),
+    ("a b -c", lambda rng: f"{word(rng.randint(0, 20))} {word(rng.randint(20, 200))} -{word(rng.randint(0, 20))}"),
+)
+
+
+def main(num_docs):
+    documents = make_corpus(num_docs)
+    index = indexer.build_inverted_index(documents)
+    matrix = DocumentMatrix(index, documents)
+    with tempfile.TemporaryDirectory() as tmp:
+        fingerprint = bytes(32)
+        index_path = os.path.join(tmp, "index.bin")
+        documents_path = os.path.join(tmp, "documents.bin")
+        indexer.save_index(index, documents, fingerprint, index_path, documents_path)
+        mapped_documents, mapped_index = indexer.load_index(fingerprint, index_path, documents_path)
+
+        print(f"{num_docs} docs, {QUERIES} queries per group, top {TOP_K}")
+        print(f"{'queries':>18} {'matches':>8} {'search ms':>10} {'mapped ms':>10} {'matrix ms':>10}")
+        rng = random.Random(1)
+        for name, template in GROUPS:
+            queries = [template(rng) for _ in range(QUERIES)]
+            runs = (lambda q, k: indexer.search(q, documents, index, k),
+                    lambda q, k: indexer.search(q, mapped_documents, mapped_index, k),
+                    lambda q, k: matrix.search(q, k))
+            for query in queries:
+                results = [run(query, TOP_K) for run in runs]
+                if results[1] != results[0] or results[2] != results[0]:
+                    raise SystemExit(f"Results differ between scorers for {query!r}")
+            matches = []
+            for query in queries:
+                tree = indexer.normalize_query(query)
+                matches.append(len(indexer.match_query(tree, index)))
+            timings = [time_queries(run, queries, TOP_K)[0] for run in runs]
+            print(f"{name:>18} {sum(matches) / len(matches):>8.0f} "
+                  + " ".join(f"{mean:>10.2f}" for mean in timings))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,69 @@
+"""Crawl throughput against local stub HTTP servers.
+
+Starts one stub server per simulated host (tests/stub_site.py), each
+serving linked automotive pages with a fixed response latency, then
+crawls them sequentially (one fetch at a time), with the default
+concurrency limits and with worker processes sharing a SQLite crawl
+store. A final
+recrawl keeps the stored ETags and links, so the stub answers it with
+304s and the crawl still reaches every page behind them.
+
+    python benchmarks/crawl_benchmark.py
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests"))
+
+import crawler
+from stub_site import reset_crawler, seed_urls, start_servers
+
+HOSTS = 8
+LINKS_PER_PAGE = 40
+LATENCY = 0.05
+WORKERS = 4
+
+
+def run(seeds, data_dir, keep_validators=False, **limits):
+    reset_crawler(data_dir, keep_validators)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return crawler.crawl_all(seeds, **limits)
+
+
+def report(label, stats):
+    rate = stats["fetched"] / stats["elapsed"]
+    fetches = crawler.fetch_report()
+    print(f"{label:>10}: {stats['fetched']} pages, {stats['unchanged']} unchanged, {stats['saved']} saved, "
+          f"{stats['near_duplicates']} near-duplicates "
+          f"in {stats['elapsed']:.2f}s -> {rate:.1f} pages/sec; "
+          f"{fetches['wire_bytes']} bytes, reuse {fetches['connection_reuse_ratio']:.0%}, "
+          f"304 rate {fetches['not_modified_rate']:.0%}")
+
+
+if __name__ == "__main__":
+    servers = start_servers(HOSTS, LINKS_PER_PAGE, LATENCY)
+    seeds = seed_urls(servers)
+    crawler.MAX_PAGES = 30
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        report("sequential", run(seeds, data_dir, max_concurrency=1, per_host_concurrency=1))
+    with tempfile.TemporaryDirectory() as data_dir:
+        reset_crawler(data_dir)
+        started = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            counts = crawler.crawl_with_workers(seeds, WORKERS)
+        elapsed = time.time() - started
+        saved = len([name for name in os.listdir(data_dir) if name.startswith("doc_")])
+        print(f"{f'{WORKERS} workers':>10}: {counts.get('done', 0)} pages, {saved} saved "
+              f"in {elapsed:.2f}s -> {counts.get('done', 0) / elapsed:.1f} pages/sec")
+    with tempfile.TemporaryDirectory() as data_dir:
+        report("concurrent", run(seeds, data_dir))
+        report("recrawl", run(seeds, data_dir, keep_validators=True))
+
+    for server in servers:
+        server.shutdown()
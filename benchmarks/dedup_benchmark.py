@@ -0,0 +1,71 @@
+"""Memory and lookup cost of the crawler's URL dedup structures.
+
+Fills a plain set of URL strings (the old seen_urls), an exact digest set
+and a Bloom filter with N synthetic URLs, then times lookups of present
+and absent keys and measures the Bloom filter's real false-positive rate.
+
+    python benchmarks/dedup_benchmark.py             # 1M and 10M keys
+    python benchmarks/dedup_benchmark.py 100000      # custom sizes
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dedup import BloomFilter, DigestSet, digest
+
+LOOKUPS = 100_000
+FP_RATE = 0.001
+# Building a set of 10M URL strings needs well over a gigabyte
+MAX_STRING_SET = 1_000_000
+
+
+def url(n):
+    return f"https://en.wikipedia.org/wiki/article_{n}"
+
+
+def time_lookups(contains, keys):
+    started = time.perf_counter()
+    for key in keys:
+        contains(key)
+    return (time.perf_counter() - started) / len(keys) * 1e9
+
+
+def bench_string_set(n):
+    tracemalloc.start()
+    seen = {url(i) for i in range(n)}
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    hit = time_lookups(seen.__contains__, [url(i) for i in range(LOOKUPS)])
+    return memory, hit
+
+
+def bench_digests(n, members):
+    started = time.perf_counter()
+    for i in range(n):
+        members.add_digest(digest(url(i)))
+    build = time.perf_counter() - started
+    present = [digest(url(i)) for i in range(LOOKUPS)]
+    absent = [digest(url(n + i)) for i in range(LOOKUPS)]
+    hit = time_lookups(members.contains_digest, present)
+    miss = time_lookups(members.contains_digest, absent)
+    false_positives = sum(members.contains_digest(value) for value in absent)
+    return members.memory_bytes(), build, hit, miss, false_positives / LOOKUPS
+
+
+def main(sizes):
+    print(f"{'keys':>10} {'structure':>12} {'bytes/key':>10} {'build s':>8} "
+          f"{'hit ns':>8} {'miss ns':>8} {'fp rate':>8}")
+    for n in sizes:
+        if n <= MAX_STRING_SET:
+            memory, hit = bench_string_set(n)
+            print(f"{n:>10} {'str set':>12} {memory / n:>10.1f} {'':>8} {hit:>8.0f} {'':>8} {'':>8}")
+        for name, members in [("digest set", DigestSet()), ("bloom 0.1%", BloomFilter(n, FP_RATE))]:
+            memory, build, hit, miss, fp = bench_digests(n, members)
+            print(f"{n:>10} {name:>12} {memory / n:>10.1f} {build:>8.1f} {hit:>8.0f} {miss:>8.0f} {fp:>8.4%}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1_000_000, 10_000_000])
@@ -0,0 +1,95 @@
+"""Cost of query expansion (expansion.py): spelling correction and synonyms.
+
+Builds a QueryExpander over the vocabulary of a synthetic automotive
+corpus and reports its build time and size. Then corrects one-edit typos
+of vocabulary words (a letter dropped, added, changed or two swapped),
+checks the corrections against scanning the whole vocabulary, and times
+the lookups and whole searches with typos and synonyms in them.
+
+    python benchmarks/expansion_benchmark.py            # 20000 docs
+    python benchmarks/expansion_benchmark.py 100000     # custom size
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from expansion import (QueryExpander, edit_distance, LONG_WORD, MAX_CORRECTIONS, MAX_EDIT_DISTANCE,
+                       MIN_FUZZY_DOC_FREQ, MIN_FUZZY_LENGTH)
+import indexer
+from indexer import doc_freq, search
+from suite_benchmark import corpus
+
+TYPOS = 500
+# Typos also corrected by scanning the vocabulary, which is slow
+SCANNED = 50
+
+
+def typo(rng, word):
+    i = rng.randrange(len(word))
+    letter = rng.choice(string.ascii_lowercase)
+    edits = [word[:i] + word[i + 1:], word[:i] + letter + word[i:], word[:i] + letter + word[i + 1:]]
+    if i + 1 < len(word):
+        edits.append(word[:i] + word[i + 1] + word[i] + word[i + 2:])
+    return rng.choice(edits)
+
+
+def scan(expander, word):
+    # Every vocabulary word, as corrections() would rank them
+    limit = 1 if len(word) < LONG_WORD else MAX_EDIT_DISTANCE
+    distances = {candidate: edit_distance(word, candidate, limit) for candidate in expander.words}
+    best = min(distances.values())
+    return [candidate for candidate in expander.words if distances[candidate] == best <= limit][:MAX_CORRECTIONS]
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return (f"{latencies[len(latencies) // 2] * 1000:.3f} ms p50, "
+            f"{latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms p99")
+
+
+def main(num_docs):
+    indexer.DATA_DIR = corpus(num_docs)
+    documents, index = indexer.load_and_index_documents()
+    postings = index["postings"]
+    vocabulary = {word: doc_freq(postings, word) for word in postings}
+
+    started = time.perf_counter()
+    expander = QueryExpander(vocabulary)
+    print(f"{num_docs} docs, {len(vocabulary)} terms, {len(expander.words)} correctable, "
+          f"built in {time.perf_counter() - started:.2f} s, {expander.memory_bytes() / 2**20:.1f} MiB")
+
+    rng = random.Random(3)
+    words = [word for word in expander.words if len(word) >= MIN_FUZZY_LENGTH and word.isalpha()]
+    typos = []
+    while len(typos) < TYPOS:
+        misspelled = typo(rng, rng.choice(words))
+        if misspelled not in vocabulary and len(misspelled) >= MIN_FUZZY_LENGTH:
+            typos.append(misspelled)
+
+    latencies = []
+    for misspelled in typos:
+        started = time.perf_counter()
+        expander.corrections(misspelled)
+        latencies.append(time.perf_counter() - started)
+    differ = sum(expander.corrections(misspelled) != scan(expander, misspelled) for misspelled in typos[:SCANNED])
+    print(f"{TYPOS} typos: corrections in {percentiles(latencies)}; {differ} of {SCANNED} "
+          f"differ from scanning the vocabulary")
+
+    index["expander"] = expander
+    frequent = [word for word in words if vocabulary[word] >= MIN_FUZZY_DOC_FREQ * 10][:200]
+    queries = [f"{rng.choice(frequent)} {misspelled}" for misspelled in typos[:200]]
+    queries += [f"ev {rng.choice(frequent)}", f"{rng.choice(frequent)} electric vehicle"] * 50
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query, documents, index, 25)
+        latencies.append(time.perf_counter() - started)
+    print(f"{len(queries)} searches with typos or synonyms: {percentiles(latencies)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
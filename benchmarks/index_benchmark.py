@@ -0,0 +1,48 @@
+"""Startup index build time against the number of worker processes.
+
+Writes a synthetic corpus to a temporary data directory, then times
+load_and_index_documents() with 1, 2, 4, ... workers up to the core count.
+
+    python benchmarks/index_benchmark.py             # 20000 docs
+    python benchmarks/index_benchmark.py 100000      # custom size
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import indexer
+from search_benchmark import make_corpus
+
+
+def write_corpus(data_dir, num_docs):
+    for doc_id, (url, text) in make_corpus(num_docs).items():
+        with open(os.path.join(data_dir, doc_id + ".txt"), "w", encoding="utf-8") as f:
+            # Enough keywords to pass is_valid_automotive_content
+            f.write(url + "\n\n" + "electric vehicle battery charging car " + text)
+
+
+def main(num_docs):
+    cores = os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as data_dir:
+        write_corpus(data_dir, num_docs)
+        indexer.DATA_DIR = data_dir
+        print(f"{num_docs} docs, {cores} cores")
+        print(f"{'workers':>8} {'seconds':>8} {'speedup':>8}")
+        workers = 1
+        baseline = None
+        while True:
+            started = time.perf_counter()
+            documents, index = indexer.load_and_index_documents(workers)
+            elapsed = time.perf_counter() - started
+            baseline = baseline or elapsed
+            print(f"{workers:>8} {elapsed:>8.2f} {baseline / elapsed:>7.1f}x")
+            if workers >= cores:
+                break
+            workers = min(workers * 2, cores)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,73 @@
+"""Per-page CPU time of HTML parsing in the crawler.
+
+Compares the old pipeline, which parsed every page three times with the
+stdlib parser (relevance check, text extraction, link extraction), with
+a single parse_page call on each available parser backend.
+
+    python benchmarks/parse_benchmark.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bs4 import BeautifulSoup
+
+import crawler
+
+PAGES = 50
+URL = "https://en.wikipedia.org/wiki/Electric_vehicle"
+DOMAIN = "en.wikipedia.org"
+WORDS = ["electric", "vehicle", "battery", "charging", "motor", "torque", "range", "the",
+         "of", "and", "lithium", "grid", "supercharger", "toyota", "ford", "nissan", "cell"]
+
+
+def make_page(rng):
+    nav = "".join(f'<li><a href="/wiki/Topic_{rng.randrange(10000)}">Topic</a></li>' for _ in range(80))
+    paragraphs = []
+    for _ in range(30):
+        words = " ".join(rng.choice(WORDS) for _ in range(60))
+        link = f'<a href="/wiki/Article_{rng.randrange(10000)}">see also</a>'
+        paragraphs.append(f"<p>{words} {link}</p>")
+    return (f"<html><head><title>EV</title><script>var x = {rng.random()};</script>"
+            f"<style>p {{ margin: 0 }}</style></head><body><header><nav><ul>{nav}</ul></nav></header>"
+            f"<div class='mw-body-content'><article>{''.join(paragraphs)}</article></div>"
+            f"<footer><a href='/wiki/About'>About</a></footer></body></html>")
+
+
+def three_parses(html):
+    crawler.HTML_PARSER = "html.parser"
+    relevant = crawler.is_valid_content(html)
+    text = crawler.extract_text(BeautifulSoup(html, "html.parser"))
+    links = crawler.parse_links(html, URL, DOMAIN)
+    return text, relevant, links
+
+
+def cpu_per_page(pages, parse):
+    started = time.process_time()
+    for html in pages:
+        parse(html)
+    return (time.process_time() - started) / len(pages)
+
+
+if __name__ == "__main__":
+    rng = random.Random(42)
+    pages = [make_page(rng) for _ in range(PAGES)]
+    print(f"{PAGES} pages, {sum(map(len, pages)) // PAGES} bytes each on average")
+
+    baseline = cpu_per_page(pages, three_parses)
+    print(f"{'three parses (html.parser)':>30}: {baseline * 1000:.2f} ms/page")
+
+    parsers = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        parsers.append("lxml")
+    except ImportError:
+        print("lxml not installed, skipping the lxml backend")
+
+    for parser in parsers:
+        per_page = cpu_per_page(pages, lambda html: crawler.parse_page(html, URL, DOMAIN, parser))
+        print(f"{'parse_page (' + parser + ')':>30}: {per_page * 1000:.2f} ms/page "
+              f"({baseline / per_page:.1f}x faster)")
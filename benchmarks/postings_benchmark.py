@@ -0,0 +1,70 @@
+"""Size and decode speed of the compressed postings in index.bin.
+
+Builds an index over a synthetic corpus and reports bytes per posting
+for the in-memory dicts, the previous fixed-width u32 layout and the
+compressed blocks. Then it times decoding the saved postings and checks
+that search results from the saved index match the in-memory one.
+
+    python benchmarks/postings_benchmark.py            # 20000 docs
+    python benchmarks/postings_benchmark.py 100000     # custom size
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import indexer
+from postings import SKIP_ENTRY, TERM_HEADER
+from search_benchmark import make_corpus, make_queries
+
+
+def main(num_docs):
+    documents = make_corpus(num_docs)
+    tracemalloc.start()
+    index = indexer.build_inverted_index(documents)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    num_postings = sum(len(word_postings) for word_postings in index["postings"].values())
+    num_positions = sum(index["doc_lengths"].values())
+    # Old layout: doc number and tf as u32, then one u32 per position
+    fixed_bytes = 8 * num_postings + 4 * num_positions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fingerprint = bytes(32)
+        index_path = os.path.join(tmp, "index.bin")
+        documents_path = os.path.join(tmp, "documents.bin")
+        indexer.save_index(index, documents, fingerprint, index_path, documents_path)
+        saved_documents, saved_index = indexer.load_index(fingerprint, index_path, documents_path)
+        postings = saved_index["postings"]
+        readers = [postings.reader(word) for word in postings]
+        compressed_bytes = sum(reader.sections[2][1] - reader.sections[0][0] + TERM_HEADER.size
+                               + SKIP_ENTRY.size * reader.num_blocks for reader in readers)
+
+        print(f"{num_docs} docs, {len(readers)} terms, {num_postings} postings, {num_positions} positions")
+        print(f"{'layout':>22} {'bytes':>12} {'bytes/posting':>14}")
+        for name, size in (("python dicts", dict_bytes), ("fixed-width u32", fixed_bytes),
+                           ("compressed blocks", compressed_bytes)):
+            print(f"{name:>22} {size:>12} {size / num_postings:>14.2f}")
+
+        print(f"\n{'decode':>22} {'seconds':>8} {'M postings/s':>13}")
+        for name, decode in (("doc numbers + tfs", lambda reader, word: reader.decode(with_positions=False)),
+                             ("with positions", lambda reader, word: reader.decode()),
+                             ("as {doc_id: positions}", lambda reader, word: postings[word])):
+            started = time.perf_counter()
+            for reader, word in zip(readers, postings):
+                decode(reader, word)
+            elapsed = time.perf_counter() - started
+            print(f"{name:>22} {elapsed:>8.2f} {num_postings / elapsed / 1e6:>13.2f}")
+
+        for query in make_queries():
+            if indexer.search(query, saved_documents, saved_index) != indexer.search(query, documents, index):
+                raise SystemExit(f"Saved index gives different results for {query!r}")
+        print("\nSearch results from the saved index match the in-memory index")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,108 @@
+"""Query latency of pruned top-k search against exhaustive scoring.
+
+Builds an in-memory index over a synthetic corpus whose word frequencies
+follow a Zipf distribution, then runs the same multi-term queries through
+search() (MaxScore pruning) and search_exhaustive() for the first few
+result pages, checking that both return identical results. Then times
+the vectorized DocumentMatrix scorer (TF-IDF, BM25 and batched).
+
+    python benchmarks/search_benchmark.py              # 20000 docs
+    python benchmarks/search_benchmark.py 100000       # custom size
+"""
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from indexer import build_inverted_index, search, search_exhaustive
+from vector_search import DocumentMatrix
+
+VOCABULARY = 50_000
+DOC_WORDS = 200
+QUERIES = 200
+PAGE_SIZE = 25
+PAGES = (1, 2, 4)
+
+
+def word(rank):
+    # Numbers are not indexed, so spell the rank in base 26
+    letters = ""
+    while True:
+        rank, digit = divmod(rank, 26)
+        letters += chr(ord("a") + digit)
+        if not rank:
+            return "q" + letters
+
+
+def make_corpus(num_docs, seed=0):
+    rng = random.Random(seed)
+    words = [word(rank) for rank in range(VOCABULARY)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY)))
+    documents = {}
+    for n in range(num_docs):
+        text = " ".join(rng.choices(words, cum_weights=cum_weights, k=DOC_WORDS))
+        documents[f"doc_{n}"] = [f"https://example.com/cars/{n}", text]
+    return documents
+
+
+def make_queries(seed=1):
+    # Mix frequent and rarer words, as typed queries do
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(QUERIES):
+        terms = [word(rng.randint(0, 50)) for _ in range(rng.randint(1, 2))]
+        terms += [word(rng.randint(50, 5000)) for _ in range(rng.randint(1, 2))]
+        queries.append(" ".join(terms))
+    return queries
+
+
+def time_queries(run, queries, top_k):
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        run(query, top_k)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return sum(latencies) / len(latencies) * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def main(num_docs):
+    started = time.perf_counter()
+    documents = make_corpus(num_docs)
+    index = build_inverted_index(documents)
+    print(f"{num_docs} docs, {len(index['postings'])} terms, built in {time.perf_counter() - started:.1f}s")
+    queries = make_queries()
+
+    for page in PAGES:
+        top_k = page * PAGE_SIZE
+        for query in queries:
+            if search(query, documents, index, top_k) != search_exhaustive(query, documents, index, top_k):
+                raise SystemExit(f"Pruned and exhaustive results differ for {query!r} (top {top_k})")
+
+    print(f"{'page':>5} {'top k':>6} {'exhaustive ms':>14} {'p95':>8} {'pruned ms':>10} {'p95':>8} {'speedup':>8}")
+    for page in PAGES:
+        top_k = page * PAGE_SIZE
+        full_mean, full_p95 = time_queries(lambda q, k: search_exhaustive(q, documents, index, k), queries, top_k)
+        pruned_mean, pruned_p95 = time_queries(lambda q, k: search(q, documents, index, k), queries, top_k)
+        print(f"{page:>5} {top_k:>6} {full_mean:>14.2f} {full_p95:>8.2f} {pruned_mean:>10.2f} "
+              f"{pruned_p95:>8.2f} {full_mean / pruned_mean:>7.1f}x")
+
+    started = time.perf_counter()
+    matrix = DocumentMatrix(index, documents)
+    print(f"\nDocumentMatrix built in {time.perf_counter() - started:.1f}s, {matrix.memory_bytes() / 1e6:.0f} MB")
+    top_k = PAGE_SIZE
+    if matrix.search_batch(queries, top_k) != [search(query, documents, index, top_k) for query in queries]:
+        raise SystemExit("Vectorized TF-IDF results differ from search()")
+    for ranking in ("tfidf", "bm25"):
+        mean, p95 = time_queries(lambda q, k: matrix.search(q, k, ranking=ranking), queries, top_k)
+        print(f"{ranking:>6} top {top_k}: {mean:.2f} ms mean, {p95:.2f} ms p95")
+    started = time.perf_counter()
+    matrix.search_batch(queries, top_k)
+    print(f" batch top {top_k}: {(time.perf_counter() - started) / len(queries) * 1000:.2f} ms per query")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
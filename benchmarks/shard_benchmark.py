@@ -0,0 +1,57 @@
+"""Query latency against the number of search shards.
+
+Builds a synthetic corpus, then runs the same queries through a
+ShardedMatrix with 1, 2, 4, ... shards (up to twice the core count) and
+reports mean, p50 and p99 latency. Every shard count must return the
+same results as a single shard.
+
+    python benchmarks/shard_benchmark.py            # 20000 docs
+    python benchmarks/shard_benchmark.py 100000     # custom size
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from indexer import build_inverted_index
+from search_benchmark import make_corpus, make_queries
+from vector_search import ShardedMatrix
+
+TOP_K = 25
+ROUNDS = 5
+
+
+def main(num_docs):
+    cores = os.cpu_count() or 1
+    documents = make_corpus(num_docs)
+    index = build_inverted_index(documents)
+    queries = make_queries()
+    print(f"{num_docs} docs, {len(queries)} queries, {cores} cores")
+    print(f"{'shards':>7} {'mean ms':>8} {'p50':>8} {'p99':>8}")
+
+    expected = None
+    shards = 1
+    while shards <= 2 * cores:
+        matrix = ShardedMatrix(index, documents, shards)
+        results = [matrix.search(query, TOP_K) for query in queries]
+        expected = expected or results
+        if results != expected:
+            raise SystemExit(f"{shards} shards give different results than 1")
+
+        latencies = []
+        for _ in range(ROUNDS):
+            for query in queries:
+                started = time.perf_counter()
+                matrix.search(query, TOP_K)
+                latencies.append(time.perf_counter() - started)
+        matrix.close()
+        latencies.sort()
+        mean = sum(latencies) / len(latencies)
+        print(f"{shards:>7} {mean * 1000:>8.2f} {latencies[len(latencies) // 2] * 1000:>8.2f} "
+              f"{latencies[int(len(latencies) * 0.99)] * 1000:>8.2f}")
+        shards *= 2
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
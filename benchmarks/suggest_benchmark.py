@@ -0,0 +1,62 @@
+"""Typeahead latency of /suggest's Suggester.
+
+Builds an index over a synthetic corpus and a log of past queries, then
+times suggestions for every prefix of a sample of queries, as typed one
+keystroke at a time. Reports build time and mean, p50 and p99 latency,
+and checks the completions against ranking every vocabulary word.
+
+    python benchmarks/suggest_benchmark.py            # 20000 docs
+    python benchmarks/suggest_benchmark.py 100000     # custom size
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from indexer import build_inverted_index
+from search_benchmark import make_corpus, make_queries
+from suggest import QueryLog, Suggester, SUGGESTIONS
+
+LOGGED_QUERIES = 20_000
+TYPED_QUERIES = 500
+
+
+def main(num_docs):
+    documents = make_corpus(num_docs)
+    index = build_inverted_index(documents)
+    rng = random.Random(2)
+    past = make_queries()
+    query_log = QueryLog()
+    for _ in range(LOGGED_QUERIES):
+        query_log.record(rng.choice(past))
+
+    started = time.perf_counter()
+    suggester = Suggester(index, query_log.popular())
+    print(f"{num_docs} docs, {len(suggester.terms)} terms, {len(suggester.queries)} past queries, "
+          f"built in {(time.perf_counter() - started) * 1000:.0f} ms, "
+          f"{len(suggester.terms.top)} prefixes precomputed")
+
+    # Every vocabulary word ranked by document frequency, then spelling
+    ranked = sorted(index["postings"], key=lambda word: (-len(index["postings"][word]), word))
+    typed = [rng.choice(past) for _ in range(TYPED_QUERIES // 2)] + rng.sample(ranked, TYPED_QUERIES // 2)
+    latencies = []
+    for text in typed:
+        for end in range(1, len(text) + 1):
+            started = time.perf_counter()
+            suggester.suggest(text[:end])
+            latencies.append(time.perf_counter() - started)
+        last = text.split()[-1]
+        expected = [word for word in ranked if word.startswith(last)][:SUGGESTIONS]
+        if suggester.terms.complete(last) != expected:
+            raise SystemExit(f"Completions of {last!r} differ from ranking the vocabulary")
+
+    latencies.sort()
+    mean = sum(latencies) / len(latencies)
+    print(f"{len(latencies)} keystrokes: {mean * 1000:.3f} ms mean, "
+          f"{latencies[len(latencies) // 2] * 1000:.3f} ms p50, {latencies[int(len(latencies) * 0.99)] * 1000:.3f} ms p99")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,290 @@
+"""Reproducible end-to-end benchmark over synthetic automotive corpora.
+
+Writes corpora of doc_N.txt files in the crawler's "URL\\n\\ntext" format,
+with a Zipf-distributed vocabulary of automotive terms, everyday words
+and a long tail, lognormal document lengths and a sprinkling of common
+phrases. For each size, a fresh process times load_documents(),
+build_inverted_index() and a fixed query log through search() and the
+DocumentMatrix the app serves from, and records its peak memory.
+
+Corpora are cached under benchmarks/corpora/ and reused. The results are
+written as JSON, to compare commits:
+
+    python benchmarks/suite_benchmark.py                          # 1k, 10k, 100k docs
+    python benchmarks/suite_benchmark.py --sizes 1000000          # 1M docs, ~1.5 GB of files
+    python benchmarks/suite_benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+SIZES = (1_000, 10_000, 100_000)
+CORPORA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpora")
+SUITE_VERSION = 1
+SEED = 0
+VOCABULARY = 50_000
+ZIPF_EXPONENT = 1.05
+# Median document length in words; lengths are lognormal around it
+MEDIAN_WORDS = 250
+QUERIES = 300
+# The query log is timed this many times over, for steadier percentiles
+SEARCH_ROUNDS = 3
+TOP_K = 25
+# Metrics compared by --compare; lower is better for all of them
+COMPARED = (("load_documents", "seconds"), ("build_inverted_index", "seconds"),
+            ("search", "p50_ms"), ("search", "p99_ms"),
+            ("matrix_search", "p50_ms"), ("matrix_search", "p99_ms"),
+            ("peak_rss_mb", "search"))
+
+AUTOMOTIVE_TERMS = """
+    car vehicle electric battery engine motor charging tesla ford toyota nissan gm honda
+    hybrid ev fuel range model drive power speed torque horsepower mpg emissions diesel
+    gasoline hydrogen lithium cell charger supercharger mile miles sedan suv truck pickup
+    coupe wagon hatchback crossover transmission brake brakes suspension tire tires wheel
+    wheels steering chassis platform volkswagen bmw audi mercedes hyundai kia porsche volvo
+    rivian lucid polestar chevrolet chevy bolt leaf prius mustang lightning cybertruck
+    autopilot autonomous driving driver sensor lidar radar software infotainment dashboard
+    interior seats cargo towing payload acceleration kwh kilowatt voltage inverter regenerative
+    thermal cooling grid station stations automaker automakers automotive automobile dealer
+    dealership lease warranty recall safety crash airbag manufacturing factory plant assembly
+    production supply chain semiconductor chip chips engineering technology solid state
+    anode cathode electrolyte nickel cobalt manganese graphite recycling efficiency aerodynamics
+""".split()
+GENERAL_TERMS = """
+    new year price cost market sales company first time people world launch design system
+    version test review report news market growth plan percent million billion global
+    industry consumer customer service quality performance feature features option options
+    standard premium base trim package upgrade update announced expected available launch
+    higher lower better faster longer shorter large small light heavy strong average total
+    city highway road trip daily commute weekend family owner owners buyers market share
+    government policy tax credit incentive rule rules regulation standard standards data
+    research study results analysis future current early late month week day today program
+""".split()
+SYLLABLES = """ba be bi bo bu da de di do ka ke ki ko la le li lo ma me mi mo
+               na ne ni no ra re ri ro sa se si so ta te ti to va ve vi vo""".split()
+PHRASES = ("electric vehicle", "solid state battery", "fast charging", "charging station",
+           "fuel economy", "internal combustion engine", "plug in hybrid", "range anxiety",
+           "driver assistance", "battery pack", "model year", "test drive")
+HOSTS = ("www.caranddriver.com", "www.motortrend.com", "www.autoweek.com", "www.thedrive.com",
+         "en.wikipedia.org", "electrek.co", "insideevs.com", "www.greencarreports.com")
+# Share of documents on a BLOCKED_DOMAINS host, which loading drops
+BLOCKED_SHARE = 0.02
+
+
+def vocabulary(seed=SEED):
+    """Words by frequency rank: automotive and everyday words, then a long tail"""
+    rng = np.random.default_rng(seed)
+    head = list(dict.fromkeys(AUTOMOTIVE_TERMS + GENERAL_TERMS))
+    head = [head[i] for i in rng.permutation(len(head))]
+    tail = []
+    seen = set(head)
+    for length in itertools.count(2):
+        for syllables in itertools.product(SYLLABLES, repeat=length):
+            word = "".join(syllables)
+            if word not in seen:
+                tail.append(word)
+            if len(head) + len(tail) == VOCABULARY:
+                return head + tail
+
+
+def write_corpus(directory, num_docs, seed=SEED):
+    """Write num_docs doc_N.txt files into directory"""
+    rng = np.random.default_rng(seed)
+    words = np.array(vocabulary(seed), dtype=object)
+    weights = 1 / np.arange(1, len(words) + 1) ** ZIPF_EXPONENT
+    cdf = np.cumsum(weights) / weights.sum()
+    lengths = np.clip(rng.lognormal(math.log(MEDIAN_WORDS), 0.6, num_docs), 30, 5000).astype(np.int64)
+    os.makedirs(directory, exist_ok=True)
+    # A batch of documents at a time keeps memory flat at 1M documents
+    for first in range(0, num_docs, 10_000):
+        batch = lengths[first:first + 10_000]
+        tokens = words[np.searchsorted(cdf, rng.random(int(batch.sum())))]
+        starts = np.concatenate(([0], np.cumsum(batch)))
+        for i, length in enumerate(batch.tolist()):
+            n = first + i
+            doc_words = tokens[starts[i]:starts[i + 1]].tolist()
+            for _ in range(rng.poisson(2)):
+                doc_words.insert(int(rng.integers(0, length)), PHRASES[int(rng.integers(0, len(PHRASES)))])
+            if rng.random() < BLOCKED_SHARE:
+                url = f"https://quotes.toscrape.com/page/{n}"
+            else:
+                url = f"https://{HOSTS[int(rng.integers(0, len(HOSTS)))]}/article/{n}"
+            with open(os.path.join(directory, f"doc_{n}.txt"), "w", encoding="utf-8") as f:
+                f.write(url + "\n\n" + " ".join(doc_words))
+
+
+def corpus(num_docs, seed=SEED):
+    """Directory of the cached corpus of num_docs documents, written if missing"""
+    directory = os.path.join(CORPORA_DIR, f"{num_docs}-{seed}-v{SUITE_VERSION}")
+    marker = os.path.join(directory, ".complete")
+    if not os.path.exists(marker):
+        shutil.rmtree(directory, ignore_errors=True)
+        started = time.perf_counter()
+        write_corpus(directory, num_docs, seed)
+        open(marker, "w").close()
+        print(f"  wrote {num_docs} documents in {time.perf_counter() - started:.0f}s", file=sys.stderr)
+    return directory
+
+
+def query_log(seed=SEED):
+    """The fixed mix of queries timed at every size"""
+    rng = np.random.default_rng(seed + 1)
+    head = vocabulary(seed)[:300]
+    pick = lambda: head[min(int(rng.zipf(1.3)) - 1, len(head) - 1)]
+    queries = []
+    for i in range(QUERIES):
+        kind = i % 10
+        if kind < 5:
+            queries.append(" ".join(pick() for _ in range(1 + kind % 3)))
+        elif kind == 5:
+            queries.append(f'"{PHRASES[int(rng.integers(0, len(PHRASES)))]}"')
+        elif kind == 6:
+            queries.append(f"{pick()} AND {pick()}")
+        elif kind == 7:
+            queries.append(f"{pick()} {pick()} -{pick()}")
+        elif kind == 8:
+            queries.append(f"{pick()} site:{HOSTS[int(rng.integers(0, len(HOSTS)))]}")
+        else:
+            queries.append(f"({pick()} OR {pick()}) AND {pick()}")
+    return queries
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _latencies(run, queries):
+    latencies = []
+    started = time.perf_counter()
+    for query in queries * SEARCH_ROUNDS:
+        query_started = time.perf_counter()
+        run(query)
+        latencies.append(time.perf_counter() - query_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    percentile = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+    return {"queries": len(latencies), "qps": round(len(latencies) / elapsed, 1),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50_ms": percentile(0.5), "p95_ms": percentile(0.95), "p99_ms": percentile(0.99)}
+
+
+def measure(directory, num_docs, workers, queries, results):
+    """Run in a fresh process, so peak memory belongs to this size alone"""
+    import indexer
+    from vector_search import DocumentMatrix
+
+    indexer.DATA_DIR = directory
+    result = {"docs": num_docs, "peak_rss_mb": {}}
+    started = time.perf_counter()
+    documents = indexer.load_documents(workers)
+    elapsed = time.perf_counter() - started
+    result["load_documents"] = {"seconds": round(elapsed, 3), "docs_per_second": round(num_docs / elapsed),
+                                "indexed_docs": len(documents)}
+    result["peak_rss_mb"]["load"] = _peak_rss_mb()
+
+    started = time.perf_counter()
+    index = indexer.build_inverted_index(documents)
+    elapsed = time.perf_counter() - started
+    result["build_inverted_index"] = {"seconds": round(elapsed, 3), "docs_per_second": round(len(documents) / elapsed),
+                                      "terms": len(index["postings"])}
+    result["peak_rss_mb"]["build"] = _peak_rss_mb()
+
+    # One pass to warm up, then the timed one
+    for query in queries[:20]:
+        indexer.search(query, documents, index, TOP_K)
+    result["search"] = _latencies(lambda query: indexer.search(query, documents, index, TOP_K), queries)
+    started = time.perf_counter()
+    matrix = DocumentMatrix(index, documents)
+    result["matrix_build_seconds"] = round(time.perf_counter() - started, 3)
+    result["matrix_search"] = _latencies(lambda query: matrix.search(query, TOP_K), queries)
+    result["peak_rss_mb"]["search"] = _peak_rss_mb()
+    results.put(result)
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """Print each COMPARED metric against baseline; True if none got worse by more than tolerance"""
+    ok = True
+    old_results = {result["docs"]: result for result in baseline["results"]}
+    print(f"\n{'docs':>8} {'metric':>30} {'before':>10} {'after':>10} {'change':>8}")
+    for result in report["results"]:
+        old = old_results.get(result["docs"])
+        if old is None:
+            continue
+        for section, key in COMPARED:
+            before, after = old[section][key], result[section][key]
+            change = after / before - 1 if before else 0.0
+            flag = "  REGRESSION" if change > tolerance else ""
+            ok = ok and not flag
+            print(f"{result['docs']:>8} {section + '.' + key:>30} {before:>10} {after:>10} {change:>+7.0%}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic corpus benchmark suite")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="comma-separated document counts, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--workers", type=int, default=None, help="load_documents workers (default: one per core)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="with --compare, exit 1 if a metric got worse by more than this fraction")
+    args = parser.parse_args()
+
+    queries = query_log()
+    report = {"suite_version": SUITE_VERSION, "commit": _commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+              "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+              "seed": SEED, "top_k": TOP_K, "results": []}
+    context = multiprocessing.get_context("spawn")
+    for num_docs in (int(size) for size in args.sizes.split(",")):
+        print(f"{num_docs} docs", file=sys.stderr)
+        directory = corpus(num_docs)
+        results = context.Queue()
+        process = context.Process(target=measure, args=(directory, num_docs, args.workers, queries, results))
+        process.start()
+        result = results.get()
+        process.join()
+        report["results"].append(result)
+        print(f"  load {result['load_documents']['seconds']}s, build {result['build_inverted_index']['seconds']}s, "
+              f"search p50 {result['search']['p50_ms']} ms p99 {result['search']['p99_ms']} ms, "
+              f"matrix p50 {result['matrix_search']['p50_ms']} ms p99 {result['matrix_search']['p99_ms']} ms, "
+              f"peak {result['peak_rss_mb']['search']} MB", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Throughput of the analysis pipeline (analysis.py) in tokens per second.
+
+Runs over synthetic automotive prose with capitals, punctuation, numbers
+and model names, and compares it with the old process_text (a regex of
+letter runs and a stop word filter). Also checks that model names come
+out as single terms.
+
+    python benchmarks/tokenizer_benchmark.py            # 5000 docs
+    python benchmarks/tokenizer_benchmark.py 20000      # custom size
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from analysis import Analyzer, STOP_WORDS
+from suite_benchmark import vocabulary
+
+DOC_SENTENCES = 20
+ROUNDS = 5
+MODELS = ("F-150", "ID.4", "EV6", "MX-30", "Model 3", "Ioniq 5", "CX-5", "e-tron", "i4", "Q4")
+NUMBERS = ("2024", "$45,000", "300 miles", "0-60 mph", "3.5L", "250 kW", "12%")
+
+
+def make_texts(num_docs, seed=0):
+    rng = random.Random(seed)
+    words = vocabulary()[:5000]
+    texts = []
+    for _ in range(num_docs):
+        sentences = []
+        for _ in range(DOC_SENTENCES):
+            sentence = rng.choices(words, k=rng.randint(6, 18))
+            for extra in rng.sample(MODELS, 1) + rng.sample(NUMBERS, rng.randint(0, 1)):
+                sentence.insert(rng.randrange(len(sentence)), extra)
+            sentences.append(" ".join(sentence).capitalize() + rng.choice((".", ",", ";", "!")))
+        texts.append(" ".join(sentences))
+    return texts
+
+
+def old_process_text(text):
+    return [word for word in re.findall(r'[a-z]+', text.lower()) if word not in STOP_WORDS]
+
+
+def tokens_per_second(texts, analyze):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        tokens = sum(len(analyze(text)) for text in texts)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return tokens, tokens / best
+
+
+def main(num_docs):
+    texts = make_texts(num_docs)
+    print(f"{num_docs} docs, {sum(map(len, texts)) // num_docs} characters each on average")
+
+    analyzer = Analyzer(stemming=False)
+    terms = analyzer.analyze(" ".join(MODELS))
+    expected = ["f150", "id4", "ev6", "mx30", "model", "ioniq", "cx5", "e", "tron", "i4", "q4"]
+    if terms != expected:
+        raise SystemExit(f"Model names analyzed as {terms}, expected {expected}")
+
+    baseline_tokens, baseline = tokens_per_second(texts, old_process_text)
+    print(f"{'old process_text':>22}: {baseline / 1e6:.2f}M tokens/s ({baseline_tokens} tokens)")
+    for label, analyze in (("analyze", analyzer.analyze),
+                           ("analyze (stemming)", Analyzer(stemming=True).analyze),
+                           ("analyze_ids", analyzer.analyze_ids)):
+        tokens, rate = tokens_per_second(texts, analyze)
+        print(f"{label:>22}: {rate / 1e6:.2f}M tokens/s ({tokens} tokens, {rate / baseline:.2f}x)")
+
+    started = time.perf_counter()
+    ids, offsets = analyzer.analyze_batch(texts)
+    elapsed = time.perf_counter() - started
+    print(f"{'analyze_batch':>22}: {len(ids) / elapsed / 1e6:.2f}M tokens/s "
+          f"({len(analyzer.dictionary)} term ids, {ids.nbytes + offsets.nbytes} bytes)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
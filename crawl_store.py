@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+LEASE_SECONDS = 120
+# Claimable URLs a claim looks through for hosts that are free to fetch from
+CLAIM_WINDOW = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    normalized TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS frontier_status ON frontier (status, depth);
+CREATE TABLE IF NOT EXISTS content_hashes (hash TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS fingerprints (doc_number INTEGER PRIMARY KEY, fingerprint INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS seeds (
+    seed INTEGER PRIMARY KEY,
+    allowed_domain TEXT NOT NULL,
+    saved INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, next_allowed REAL NOT NULL);
+"""
+
+
+class CrawlStore:
+    """Crawl state shared by crawler worker processes through one SQLite file.
+
+    The frontier table doubles as the URL-seen set: every URL ever queued
+    has a row, and its status moves queued -> in_progress -> done/failed.
+    Failed fetches go back to queued until they run out of attempts.
+    A worker claims URLs by taking a lease on them; if it dies, the lease
+    runs out and another worker claims them again. Across all workers,
+    claims keep the single-process crawler's politeness limits: a bounded
+    number of live leases per host and a minimum delay between claims
+    from one host. Saving a document (hash check, doc-id allocation, file
+    write, marking the URL done and queueing its links) happens in one
+    transaction, so a crash either commits all of it or none of it.
+    """
+
+    def __init__(self, path, data_dir, first_doc_id=0):
+        self.path = path
+        self.data_dir = data_dir
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(frontier)")]
+        if "attempts" not in columns:
+            self.conn.execute("ALTER TABLE frontier ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute("INSERT OR IGNORE INTO counters VALUES ('next_doc_id', ?)", (first_doc_id,))
+        # The single-process crawler may have written documents since the last run
+        self.conn.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'next_doc_id'", (first_doc_id,))
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front so two workers never
+        # both read the same counter or claim the same URL
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def add_seeds(self, seeds):
+        """seeds: list of (normalized, url, allowed_domain)"""
+        self._transaction()
+        for seed, (normalized, url, allowed_domain) in enumerate(seeds):
+            self.conn.execute("INSERT OR IGNORE INTO seeds (seed, allowed_domain) VALUES (?, ?)",
+                              (seed, allowed_domain))
+            self.conn.execute("INSERT OR IGNORE INTO frontier (normalized, url, depth, seed) VALUES (?, ?, 0, ?)",
+                              (normalized, url, seed))
+        self.conn.execute("COMMIT")
+
+    def claim(self, owner, limit, max_pages, per_host_concurrency, delay):
+        """Lease up to limit URLs, shallowest first, from seeds still under max_pages.
+
+        At most one URL per host, and only from hosts with fewer than
+        per_host_concurrency live leases whose last claim is delay seconds old.
+        """
+        now = time.time()
+        self._transaction()
+        try:
+            rows = self.conn.execute(
+                "SELECT f.normalized, f.url, f.depth, f.seed, s.allowed_domain FROM frontier f "
+                "JOIN seeds s ON s.seed = f.seed "
+                "WHERE (f.status = 'queued' OR (f.status = 'in_progress' AND f.lease_expires < ?)) "
+                "AND s.saved < ? ORDER BY f.depth LIMIT ?",
+                (now, max_pages, CLAIM_WINDOW)).fetchall()
+            active = Counter(urlparse(url).netloc for (url,) in self.conn.execute(
+                "SELECT url FROM frontier WHERE status = 'in_progress' AND lease_expires >= ?", (now,)))
+            waiting = {host for (host,) in self.conn.execute(
+                "SELECT host FROM hosts WHERE next_allowed > ?", (now,))}
+            claimed = []
+            for row in rows:
+                host = urlparse(row[1]).netloc
+                if host in waiting or active[host] >= per_host_concurrency:
+                    continue
+                waiting.add(host)
+                claimed.append(row)
+                if len(claimed) == limit:
+                    break
+            self.conn.executemany(
+                "UPDATE frontier SET status = 'in_progress', lease_owner = ?, lease_expires = ? WHERE normalized = ?",
+                ((owner, now + LEASE_SECONDS, row[0]) for row in claimed))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO hosts VALUES (?, ?)",
+                ((urlparse(row[1]).netloc, now + delay) for row in claimed))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def has_pending(self, max_pages):
+        """True while some URL is queued or leased by a live worker"""
+        row = self.conn.execute(
+            "SELECT 1 FROM frontier f JOIN seeds s ON s.seed = f.seed "
+            "WHERE f.status IN ('queued', 'in_progress') AND s.saved < ? LIMIT 1",
+            (max_pages,)).fetchone()
+        return row is not None
+
+    def mark_failed(self, normalized):
+        self.conn.execute("UPDATE frontier SET status = 'failed', lease_owner = NULL WHERE normalized = ?",
+                          (normalized,))
+
+    def retry(self, normalized, max_retries):
+        """Count a failed attempt; requeue the URL unless it has used up max_retries"""
+        self.conn.execute(
+            "UPDATE frontier SET attempts = attempts + 1, lease_owner = NULL, "
+            "status = CASE WHEN attempts + 1 > ? THEN 'failed' ELSE 'queued' END WHERE normalized = ?",
+            (max_retries, normalized))
+
+    def finish(self, normalized, url, seed, text, content_hash, links, next_depth, max_pages, fingerprint=0):
+        """Record a fetched page and queue its links.
+
+        text is None when the page is not worth saving. Returns the new
+        doc number, or None if nothing was saved (duplicate content or the
+        seed already has max_pages documents).
+        """
+        self._transaction()
+        try:
+            doc_number = None
+            if text is not None:
+                doc_number = self._save_document(url, seed, text, content_hash, max_pages)
+                if doc_number is not None:
+                    # SQLite integers are signed 64-bit
+                    self.conn.execute("INSERT INTO fingerprints VALUES (?, ?)",
+                                      (doc_number, fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint))
+            self.conn.execute(
+                "UPDATE frontier SET status = 'done', lease_owner = NULL WHERE normalized = ?", (normalized,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO frontier (normalized, url, depth, seed) VALUES (?, ?, ?, ?)",
+                ((link_normalized, link, next_depth, seed) for link_normalized, link in links))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return doc_number
+
+    def _save_document(self, url, seed, text, content_hash, max_pages):
+        (saved,) = self.conn.execute("SELECT saved FROM seeds WHERE seed = ?", (seed,)).fetchone()
+        if saved >= max_pages:
+            return None
+        if self.conn.execute("INSERT OR IGNORE INTO content_hashes VALUES (?)", (content_hash,)).rowcount == 0:
+            return None
+        (doc_number,) = self.conn.execute("SELECT value FROM counters WHERE name = 'next_doc_id'").fetchone()
+        self.conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'next_doc_id'")
+        self.conn.execute("UPDATE seeds SET saved = saved + 1 WHERE seed = ?", (seed,))
+
+        # Written while the transaction holds the write lock: if we crash
+        # before COMMIT, the doc id is handed out again and the file rewritten
+        filename = os.path.join(self.data_dir, f"doc_{doc_number}.txt")
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            f.write(url + "\n\n" + text)
+        os.replace(tmp_filename, filename)
+        return doc_number
+
+    def done_urls(self):
+        return [row[0] for row in self.conn.execute("SELECT normalized FROM frontier WHERE status = 'done'")]
+
+    def content_hashes(self):
+        return [row[0] for row in self.conn.execute("SELECT hash FROM content_hashes")]
+
+    def fingerprints(self):
+        return [value & 0xFFFFFFFFFFFFFFFF for (value,) in self.conn.execute("SELECT fingerprint FROM fingerprints")]
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM frontier GROUP BY status").fetchall())
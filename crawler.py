@@ -3,20 +3,66 @@ from bs4 import BeautifulSoup
 import time
 import os
 import re
+import asyncio
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urljoin, urlparse
 import hashlib
+import threading
+import gzip
+import json
+import argparse
+import socket
+import multiprocessing
+from analysis import Analyzer
+from crawl_store import CrawlStore
+from dedup import SeenSet, SimHashIndex, simhash
+from requests.adapters import HTTPAdapter
+
+# lxml is optional and several times faster than the stdlib parser;
+# set HTML_PARSER = "html.parser" to force the stdlib one
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+try:
+    import brotli  # noqa: F401 -- lets urllib3 decode "br" responses
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
 
 
 doc_counter = 0
-seen_urls = set()
-seen_hashes = set()
+seen_urls = SeenSet()
+seen_hashes = SeenSet()
+validators = {}
+# Links found on each page with validators, so a 304 can still expand the frontier
+outlinks = {}
 
 MAX_PAGES = 20
 MAX_DEPTH = 2
-CRAWL_DELAY = 0.0001
+CRAWL_DELAY = 0.0001          # minimum gap between requests to the same host
+MAX_CONCURRENCY = 32          # fetches in flight across all hosts
+PER_HOST_CONCURRENCY = 4      # fetches in flight against one host
+WORKER_BATCH = 8              # URLs a worker process claims and fetches at once
+MAX_RETRIES = 3               # extra attempts for timeouts, 429s and 5xx responses
+CHECKPOINT_INTERVAL = 30      # seconds between frontier checkpoints
+MIN_WORDS = 50
+DEDUP_MODE = "exact"          # "exact" digests, or "bloom" for bounded memory
+DEDUP_CAPACITY = 10_000_000   # keys a Bloom filter is sized for
+DEDUP_FP_RATE = 0.001         # Bloom false-positive rate at DEDUP_CAPACITY keys
+NEAR_DUP_DISTANCE = 5         # SimHash bits two pages may differ by and still count as copies; None disables
+near_duplicates = SimHashIndex(max_distance=NEAR_DUP_DISTANCE or 0)
 DATA_DIR = "data"
-url_log_file = os.path.join(DATA_DIR, "crawled_urls.txt")
-hash_log_file = os.path.join(DATA_DIR, "content_hashes.txt")
+url_log_file = os.path.join(DATA_DIR, "crawled_urls.bin")
+hash_log_file = os.path.join(DATA_DIR, "content_hashes.bin")
+simhash_log_file = os.path.join(DATA_DIR, "simhashes.bin")
+store_file = os.path.join(DATA_DIR, "crawl_state.db")
+checkpoint_file = os.path.join(DATA_DIR, "crawl_checkpoint.json.gz")
+validator_log_file = os.path.join(DATA_DIR, "http_validators.txt")
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 
 SEED_URLS = [
     "https://www.caranddriver.com/news/",
@@ -288,6 +334,9 @@ AUTOMOTIVE_KEYWORDS = [
     'ford', 'gm', 'toyota', 'nissan', 'charging',
     'motor', 'engineering', 'technology'
 ]
+# Relevance counts keyword terms, stemmed so "cars" and "batteries" count
+AUTOMOTIVE_TERMS = set(AUTOMOTIVE_KEYWORDS)
+RELEVANCE_ANALYZER = Analyzer(stemming=True)
 BLACKLISTED_DOMAINS = [
     'quotes.toscrape.com',
     'example.com',
@@ -297,19 +346,25 @@ BLACKLISTED_DOMAINS = [
     'sample.com'
 ]
 
+def open_seen_set(path, read_only=False):
+    seen = SeenSet(path, DEDUP_MODE, DEDUP_CAPACITY, DEDUP_FP_RATE, read_only)
+    # One-time import of the text logs older crawls wrote
+    legacy_path = path[:-len(".bin")] + ".txt"
+    if not read_only and os.path.exists(legacy_path):
+        with open(legacy_path, 'r') as f:
+            seen.update(line.strip() for line in f if line.strip())
+        seen.flush()
+        os.replace(legacy_path, legacy_path + ".imported")
+    return seen
+
 def load_existing_urls():
     global seen_urls
-    if os.path.exists(url_log_file):
-        try:
-            with open(url_log_file, 'r') as f:
-                seen_urls = set(line.strip() for line in f if line.strip())
-        except:
-            seen_urls = set()
+    seen_urls.close()
+    seen_urls = open_seen_set(url_log_file)
     return seen_urls
 
-def save_crawled_url(url):
-    with open(url_log_file, 'a') as f:
-        f.write(url + '\n')
+def save_crawled_url(url, defer=False):
+    seen_urls.add(url, defer)
 
 def normalize_url(url):
     url = url.split('#')[0]
@@ -319,17 +374,51 @@ def normalize_url(url):
 
 def load_existing_hashes():
     global seen_hashes
-    if os.path.exists(hash_log_file):
-        try: 
-            with open(hash_log_file, 'r') as f:
-                seen_hashes = set(line.strip() for line in f if line.strip())
-        except:
-            seen_hashes = set()
+    seen_hashes.close()
+    seen_hashes = open_seen_set(hash_log_file)
     return seen_hashes
 
 def save_content_hash(content_hash):
-    with open(hash_log_file, 'a') as f:
-        f.write(content_hash + '\n')
+    seen_hashes.add(content_hash)
+
+def load_existing_simhashes():
+    global near_duplicates
+    near_duplicates.close()
+    near_duplicates = SimHashIndex(simhash_log_file, NEAR_DUP_DISTANCE or 0)
+    return near_duplicates
+
+def is_near_duplicate(fingerprint):
+    if NEAR_DUP_DISTANCE is None or near_duplicates.find(fingerprint) is None:
+        return False
+    near_duplicates.suppressed += 1
+    return True
+
+def flush_seen_sets():
+    seen_urls.flush()
+    seen_hashes.flush()
+
+def load_existing_validators():
+    global validators, outlinks
+    if os.path.exists(validator_log_file):
+        try:
+            with open(validator_log_file, 'r') as f:
+                for line in f:
+                    # url, etag, last_modified, then the page's links
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) >= 3:
+                        # Later lines win, so a changed ETag replaces the old one
+                        validators[parts[0]] = (parts[1], parts[2])
+                        outlinks[parts[0]] = tuple(parts[3:])
+        except:
+            validators = {}
+            outlinks = {}
+    return validators
+
+def save_validators(url, etag, last_modified, links=()):
+    validators[url] = (etag, last_modified)
+    outlinks[url] = tuple(links)
+    with open(validator_log_file, 'a') as f:
+        f.write("\t".join((url, etag, last_modified) + tuple(links)) + "\n")
 
 def is_valid_domain(url):
     parsed_url = urlparse(url)
@@ -341,37 +430,121 @@ def is_automotive_url(url):
 if not os.path.exists (DATA_DIR) :
     os.makedirs(DATA_DIR)
 
+sessions = {}
+sessions_lock = threading.Lock()
+fetch_stats = {"requests": 0, "not_modified": 0, "wire_bytes": 0, "decoded_bytes": 0}
+fetch_stats_lock = threading.Lock()
+
+def get_session(host):
+    """One keep-alive session per host, shared by all crawler threads"""
+    with sessions_lock:
+        session = sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PER_HOST_CONCURRENCY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                'User-Agent': USER_AGENT,
+                'Accept-Encoding': ACCEPT_ENCODING,
+            })
+            sessions[host] = session
+        return session
+
+def fetch_report():
+    """Transfer statistics for every fetch made by this process"""
+    connections = 0
+    pooled_requests = 0
+    with sessions_lock:
+        for session in sessions.values():
+            pools = session.get_adapter("https://").poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                connections += pool.num_connections
+                pooled_requests += pool.num_requests
+    with fetch_stats_lock:
+        report = dict(fetch_stats)
+    report["connections"] = connections
+    report["connection_reuse_ratio"] = 1 - connections / pooled_requests if pooled_requests else 0
+    report["not_modified_rate"] = report["not_modified"] / report["requests"] if report["requests"] else 0
+    return report
+
 #gets the page to use 
 def fetch_page(url):
+    """Return the page HTML, or None if the fetch failed or the page is unchanged (304)"""
+    status, html, page_validators = fetch_url(url)
+    if page_validators is not None:
+        record_validators(normalize_url(url), page_validators)
+    return html
+
+def fetch_url(url):
+    """Return (status, html, validators).
+
+    status is None if no response arrived; html is set only on a 200,
+    together with its (etag, last_modified) validators. Callers pass those
+    to record_validators once the page is handled, so a crash in between
+    cannot leave a stored ETag for a page that was never saved.
+    """
     print(f"Crawling: {url}")
     try: 
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=5)
+        normalized = normalize_url(url)
+        headers = {}
+        etag, last_modified = validators.get(normalized, ("", ""))
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        session = get_session(urlparse(url).netloc)
+        response = session.get(url, headers=headers, timeout=5)
+        with fetch_stats_lock:
+            fetch_stats["requests"] += 1
+            fetch_stats["wire_bytes"] += response.raw.tell()
+            fetch_stats["decoded_bytes"] += len(response.content)
+            if response.status_code == 304:
+                fetch_stats["not_modified"] += 1
+
         if response.status_code == 200:
-            return response.text
+            page_validators = (response.headers.get('ETag', ''), response.headers.get('Last-Modified', ''))
+            return response.status_code, response.text, page_validators
         else:
-            return None
+            return response.status_code, None, None
         
         
     except Exception as e:
         print(f"Error in the file: {e}")
-        return None
+        return None, None, None
 
-def parse_links(html, current_url, allowed_domain):
-    soup = BeautifulSoup(html, 'html.parser')
+def record_validators(normalized, page_validators, links=None):
+    """Store a page's validators and links; links=None keeps the links stored before"""
+    etag, last_modified = page_validators
+    if not (etag or last_modified):
+        return
+    links = outlinks.get(normalized, ()) if links is None else tuple(sorted(links))
+    if validators.get(normalized) != page_validators or outlinks.get(normalized, ()) != links:
+        save_validators(normalized, etag, last_modified, links)
+
+def unchanged_links(normalized, allowed_domain):
+    """Links stored for a page that answered 304, within allowed_domain"""
+    return [link for link in outlinks.get(normalized, ()) if allowed_domain in link]
+
+def is_retryable(status):
+    return status is None or status == 429 or status >= 500
+
+LINK_SKIP_PATTERNS = [
+    '/media/', '/careers/', '/contact', 
+    'facebook.com', 'twitter.com', 
+    '.pdf', '.jpg', '.png', 
+    'quotes.toscrape.com',
+    '/comments', '/tags', '/page/'
+]
+MAIN_CONTENT_CLASS = re.compile('(content|article|body)')
+
+def extract_links(soup, current_url, allowed_domain):
     links = set()
     for link in soup.find_all('a', href = True):
         href = link["href"]
-        skip_patterns = [
-            '/media/', '/careers/', '/contact', 
-            'facebook.com', 'twitter.com', 
-            '.pdf', '.jpg', '.png', 
-            'quotes.toscrape.com',
-            '/comments', '/tags', '/page/'
-        ]
-        if any(pattern in href.lower() for pattern in skip_patterns):
+        if any(pattern in href.lower() for pattern in LINK_SKIP_PATTERNS):
             continue
         if not href or href.startswith('#') or href.startswith('javascript:'):
             continue 
@@ -383,36 +556,64 @@ def parse_links(html, current_url, allowed_domain):
     
     return links
 
-def is_valid_content(html):
-    content = BeautifulSoup(html, 'html.parser').get_text()
-    word_count = sum(content.lower().count(word) for word in AUTOMOTIVE_KEYWORDS)
+def is_relevant_text(content):
+    word_count = sum(1 for term in RELEVANCE_ANALYZER.analyze(content) if term in AUTOMOTIVE_TERMS)
     return word_count > 2 
 
-def save_text(url, html, doc_id):
-    if not is_valid_content(html):
-        return False
-    soup = BeautifulSoup(html, 'html.parser')
+def extract_text(soup):
+    # Destructive: strips boilerplate tags out of the soup
     for scirpt in soup(["script", "style", "nav", "footer", "header"]):
         scirpt.decompose()
-    main_content = soup.find(['article', 'main', 'div'],class_=re.compile('(content|article|body)'))
+    main_content = soup.find(['article', 'main', 'div'],class_=MAIN_CONTENT_CLASS)
     if main_content:
-        text = main_content.get_text(separator=' ', strip=True)
-    else:
-        text = soup.get_text(separator=' ', strip=True)
+        return main_content.get_text(separator=' ', strip=True)
+    return soup.get_text(separator=' ', strip=True)
+
+def parse_page(html, current_url, allowed_domain=None, parser=None):
+    """Parse a page once and return (text, relevant, links).
+
+    Links and the relevance signal are taken from the full page before the
+    boilerplate is stripped for the text, exactly as the separate helpers
+    below see it. Links are skipped when allowed_domain is None.
+    """
+    soup = BeautifulSoup(html, parser or HTML_PARSER)
+    links = extract_links(soup, current_url, allowed_domain) if allowed_domain is not None else set()
+    relevant = is_relevant_text(soup.get_text())
+    text = extract_text(soup)
+    return text, relevant, links
+
+def parse_links(html, current_url, allowed_domain):
+    return extract_links(BeautifulSoup(html, HTML_PARSER), current_url, allowed_domain)
+
+def is_valid_content(html):
+    return is_relevant_text(BeautifulSoup(html, HTML_PARSER).get_text())
+
+def save_text(url, html, doc_id, on_save=None):
+    text, relevant, _ = parse_page(html, url)
+    if not relevant:
+        return False
+    return store_text(url, text, doc_id, on_save)
+
+def store_text(url, text, doc_id, on_save=None):
     #skip page
-    if len(text.split()) < 50:
+    if len(text.split()) < MIN_WORDS:
         return False
     content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
     if content_hash in seen_hashes:
         return False
+    fingerprint = simhash(text)
+    if is_near_duplicate(fingerprint):
+        return False
     filename = os.path.join(DATA_DIR, f"doc_{doc_id}.txt")
     with open(filename,'w', encoding='utf-8') as f:
         f.write(url + "\n\n" + text)
     
-    seen_hashes.add(content_hash)
     save_content_hash(content_hash)
+    near_duplicates.add(fingerprint)
 
     print(f"Saved: doc_{doc_id}.txt")
+    if on_save is not None:
+        on_save(f"doc_{doc_id}", url, text)
     return True
 
 def get_next_doc_id():
@@ -421,40 +622,343 @@ def get_next_doc_id():
     doc_counter += 1
     return current_id
 
-def crawl(start_url, allowed_domain):
-    queue = [start_url]
-    visited = set()
-    depth = {start_url: 0}
-    local_count = 0
+class Frontier:
+    """URLs waiting to be fetched, queued per host.
 
-    while queue and local_count < MAX_PAGES :
-        url = queue.pop(0)
+    Each host has its own FIFO deque, and hosts are served round robin so
+    one large site cannot starve the others. Every URL is enqueued at most
+    once, tracked by its normalized form.
+    """
+
+    def __init__(self):
+        self.queues = {}
+        self.enqueued = set()
+        self.active = defaultdict(int)
+        self.next_allowed = defaultdict(float)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, url, depth, seed):
         normalized = normalize_url(url)
-        if normalized in seen_urls:
-            continue
-        current_depth = depth.get(url, 0)
-        if current_depth >= MAX_DEPTH:
-            continue
+        if normalized in self.enqueued or normalized in seen_urls:
+            return False
+        self.enqueued.add(normalized)
+        host = urlparse(url).netloc
+        self.queues.setdefault(host, deque()).append((url, depth, seed))
+        self.size += 1
+        return True
 
-        if url in visited:
-            continue 
-        visited.add(url)
-        seen_urls.add(normalized)
+    def pop_ready(self, now, per_host_concurrency):
+        for host, queue in self.queues.items():
+            if self.active[host] >= per_host_concurrency or self.next_allowed[host] > now:
+                continue
+            entry = queue.popleft()
+            self.size -= 1
+            # Move the host to the back of the rotation
+            del self.queues[host]
+            if queue:
+                self.queues[host] = queue
+            return host, entry
+        return None
+
+    def requeue(self, url, depth, seed):
+        # Already counted in enqueued; goes to the back of its host's queue
+        host = urlparse(url).netloc
+        self.queues.setdefault(host, deque()).append((url, depth, seed))
+        self.size += 1
+
+    def entries(self):
+        for queue in self.queues.values():
+            yield from queue
+
+    def start(self, host, now, delay):
+        self.active[host] += 1
+        self.next_allowed[host] = now + delay
+
+    def finish(self, host):
+        self.active[host] -= 1
+
+    def next_ready_in(self, now, per_host_concurrency):
+        # Hosts already at their concurrency limit wake us up when a fetch finishes
+        waits = [self.next_allowed[host] - now for host in self.queues
+                 if self.active[host] < per_host_concurrency]
+        return max(min(waits), 0) if waits else None
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(checkpoint, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+async def crawl_async(seeds, on_save=None, max_concurrency=MAX_CONCURRENCY,
+                      per_host_concurrency=PER_HOST_CONCURRENCY, host_delay=CRAWL_DELAY,
+                      checkpoint_path=None, resume=False):
+    """Breadth-first crawl of (start_url, allowed_domain) seeds.
+
+    Pages are fetched concurrently on a thread pool, bounded globally and
+    per host; parsing and saving happen on the event loop one page at a
+    time. Every seed keeps its own MAX_PAGES budget and MAX_DEPTH limit.
+
+    A URL only counts as crawled once a response arrives. Timeouts, 429s
+    and 5xx responses are retried up to MAX_RETRIES times. With a
+    checkpoint_path, the frontier, retry counts and per-seed progress are
+    saved every CHECKPOINT_INTERVAL seconds and on exit; resume=True
+    picks an unfinished checkpoint back up instead of starting from seeds.
+    """
+    loop = asyncio.get_running_loop()
+    frontier = Frontier()
+    saved_per_seed = defaultdict(int)
+    attempts = {}
+    failed = set()
+    stats = {"fetched": 0, "unchanged": 0, "failed": 0, "retried": 0, "saved": 0}
+    suppressed_before = near_duplicates.suppressed
+    in_flight = {}
+    started = time.time()
+
+    checkpoint = load_checkpoint(checkpoint_path) if checkpoint_path and resume else None
+    if checkpoint is not None and not checkpoint["complete"]:
+        seeds = [tuple(seed) for seed in checkpoint["seeds"]]
+        saved_per_seed.update({int(seed): count for seed, count in checkpoint["saved_per_seed"].items()})
+        attempts.update(checkpoint["attempts"])
+        failed.update(checkpoint["failed"])
+        frontier.enqueued.update(failed)
+        for url, depth, seed in checkpoint["queued"]:
+            frontier.push(url, depth, seed)
+        print(f"Resuming crawl with {len(frontier)} queued URLs")
+    else:
+        for seed, (start_url, allowed_domain) in enumerate(seeds):
+            frontier.push(start_url, 0, seed)
+
+    def write_checkpoint(complete):
+        queued = list(frontier.entries()) + [entry[1:] for entry in in_flight.values()]
+        save_checkpoint(checkpoint_path, {
+            "seeds": seeds,
+            "queued": queued,
+            "saved_per_seed": saved_per_seed,
+            "attempts": attempts,
+            "failed": sorted(failed),
+            "complete": complete,
+        })
+        # Crawled URLs reach the seen log only now that the checkpoint
+        # holds their links. A crash in between at worst fetches a page twice.
+        flush_seen_sets()
+
+    last_checkpoint = time.time()
+    complete = False
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            while len(frontier) or in_flight:
+                now = loop.time()
+                while len(in_flight) < max_concurrency:
+                    ready = frontier.pop_ready(now, per_host_concurrency)
+                    if ready is None:
+                        break
+                    host, (url, depth, seed) = ready
+                    if saved_per_seed[seed] >= MAX_PAGES:
+                        continue
+                    if normalize_url(url) in seen_urls:
+                        continue
+                    frontier.start(host, now, host_delay)
+                    future = loop.run_in_executor(executor, fetch_url, url)
+                    in_flight[future] = (host, url, depth, seed)
+
+                timeout = frontier.next_ready_in(loop.time(), per_host_concurrency)
+                if not in_flight:
+                    if timeout is not None:
+                        await asyncio.sleep(timeout)
+                    continue
+
+                done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    host, url, depth, seed = in_flight.pop(future)
+                    frontier.finish(host)
+                    status, html, page_validators = future.result()
+                    normalized = normalize_url(url)
+                    if status not in (200, 304) and is_retryable(status):
+                        attempts[normalized] = attempts.get(normalized, 0) + 1
+                        if attempts[normalized] <= MAX_RETRIES:
+                            frontier.requeue(url, depth, seed)
+                            stats["retried"] += 1
+                        else:
+                            # Left out of seen_urls so a later crawl tries again
+                            failed.add(normalized)
+                            stats["failed"] += 1
+                        continue
+
+                    attempts.pop(normalized, None)
+                    # With checkpoints, logged with the next one (see write_checkpoint)
+                    save_crawled_url(normalized, defer=checkpoint_path is not None)
+                    allowed_domain = seeds[seed][1] if depth + 1 < MAX_DEPTH else None
+                    if status == 304:
+                        stats["unchanged"] += 1
+                        # An unchanged page still links to pages that may have changed
+                        if allowed_domain is not None:
+                            for link in unchanged_links(normalized, allowed_domain):
+                                frontier.push(link, depth + 1, seed)
+                        continue
+                    if html is None:
+                        stats["failed"] += 1
+                        continue
+                    stats["fetched"] += 1
+                    if saved_per_seed[seed] >= MAX_PAGES:
+                        continue
+                    try:
+                        doc_id = get_next_doc_id()
+                        text, relevant, links = parse_page(html, url, allowed_domain)
+                        if relevant and store_text(url, text, doc_id, on_save):
+                            saved_per_seed[seed] += 1
+                            stats["saved"] += 1
+                        for link in links:
+                            frontier.push(link, depth + 1, seed)
+                        record_validators(normalized, page_validators, links if allowed_domain is not None else None)
+                    except Exception as e:
+                        print(f"Error processing {url}: {e}")
+
+                if checkpoint_path and time.time() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                    write_checkpoint(complete=False)
+                    last_checkpoint = time.time()
+        complete = True
+    finally:
+        # Also runs on Ctrl-C, so --resume has the frontier as it was
+        if checkpoint_path:
+            write_checkpoint(complete)
+
+    stats["near_duplicates"] = near_duplicates.suppressed - suppressed_before
+    stats["elapsed"] = time.time() - started
+    return stats
+
+def crawl_all(seed_urls, on_save=None, **limits):
+    """Crawl every seed URL, each restricted to its own domain"""
+    seeds = [(url, urlparse(url).netloc) for url in seed_urls]
+    return asyncio.run(crawl_async(seeds, on_save, **limits))
+
+def crawl(start_url, allowed_domain, on_save=None):
+    return asyncio.run(crawl_async([(start_url, allowed_domain)], on_save))
+
+# Module settings callers may change before crawl_with_workers; passed to
+# each worker, which may not inherit them (the "spawn" start method)
+WORKER_SETTINGS = ("DATA_DIR", "url_log_file", "hash_log_file", "simhash_log_file", "store_file",
+                   "validator_log_file", "MAX_PAGES", "MAX_DEPTH", "CRAWL_DELAY", "PER_HOST_CONCURRENCY",
+                   "WORKER_BATCH", "MAX_RETRIES", "MIN_WORDS", "NEAR_DUP_DISTANCE", "DEDUP_MODE",
+                   "DEDUP_CAPACITY", "DEDUP_FP_RATE")
+
+def load_worker_dedup_state():
+    """Load seen_urls, seen_hashes, near_duplicates and validators from the
+    parent's files, for reading only: the parent owns the logs.
+
+    Sets inherited from a forked parent are dropped, not closed: closing
+    flushes them, which would write the parent's files from every worker.
+    """
+    global seen_urls, seen_hashes, near_duplicates
+    seen_urls = open_seen_set(url_log_file, read_only=True)
+    seen_hashes = open_seen_set(hash_log_file, read_only=True)
+    near_duplicates = SimHashIndex(simhash_log_file, NEAR_DUP_DISTANCE or 0, read_only=True)
+    load_existing_validators()
+
+def crawl_worker(worker_number, settings=None):
+    """One worker process: claim URLs from the shared store, fetch, parse and save them.
+
+    Loads seen_urls, seen_hashes and near_duplicates from disk and only
+    reads them; the parent adds what the workers crawled once they are
+    done. Near-duplicates are caught against earlier crawls and this
+    worker's own pages, not against other workers' pages. The store hands
+    out URLs within the per-host limits, so workers never fetch from one
+    host faster than a single crawl would.
+    """
+    globals().update(settings or {})
+    load_worker_dedup_state()
+    store = CrawlStore(store_file, DATA_DIR)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    saved = 0
+    with ThreadPoolExecutor(max_workers=WORKER_BATCH) as executor:
+        while True:
+            batch = store.claim(owner, WORKER_BATCH, MAX_PAGES, PER_HOST_CONCURRENCY, CRAWL_DELAY)
+            if not batch:
+                if not store.has_pending(MAX_PAGES):
+                    break
+                # Every host with queued URLs is busy or waiting out its
+                # delay, or other workers hold leases and may queue more links
+                time.sleep(max(CRAWL_DELAY, 0.05))
+                continue
+            unseen = []
+            for row in batch:
+                if row[0] in seen_urls:
+                    # Crawled before; only its lease needs releasing
+                    store.finish(row[0], row[1], row[3], None, None, [], row[2] + 1, MAX_PAGES)
+                else:
+                    unseen.append(row)
+            pages = executor.map(fetch_url, [url for _, url, *_ in unseen])
+            for (normalized, url, depth, seed, allowed_domain), (status, html, page_validators) in zip(unseen, pages):
+                if status not in (200, 304) and is_retryable(status):
+                    store.retry(normalized, MAX_RETRIES)
+                    continue
+                if status == 304:
+                    links = unchanged_links(normalized, allowed_domain) if depth + 1 < MAX_DEPTH else []
+                    store.finish(normalized, url, seed, None, None, [(normalize_url(link), link) for link in links],
+                                 depth + 1, MAX_PAGES)
+                    continue
+                if html is None:
+                    store.mark_failed(normalized)
+                    continue
+                text, relevant, links = parse_page(html, url, allowed_domain if depth + 1 < MAX_DEPTH else None)
+                content_hash = None
+                fingerprint = 0
+                if relevant and len(text.split()) >= MIN_WORDS:
+                    content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+                    fingerprint = simhash(text)
+                if content_hash is None or content_hash in seen_hashes or is_near_duplicate(fingerprint):
+                    text = None
+                links = [(normalize_url(link), link) for link in links]
+                doc_number = store.finish(normalized, url, seed, text, content_hash, links, depth + 1, MAX_PAGES,
+                                          fingerprint)
+                record_validators(normalized, page_validators,
+                                  [link for _, link in links] if depth + 1 < MAX_DEPTH else None)
+                if doc_number is not None:
+                    near_duplicates.add(fingerprint)
+                    print(f"[worker {worker_number}] Saved: doc_{doc_number}.txt")
+                    saved += 1
+    store.close()
+    print(f"[worker {worker_number}] Saved {saved} pages, suppressed {near_duplicates.suppressed} near-duplicates")
+    return saved
+
+def crawl_with_workers(seed_urls, workers):
+    """Crawl with several processes sharing one frontier and dedup store"""
+    load_existing_urls()
+    load_existing_hashes()
+    load_existing_simhashes()
+    store = CrawlStore(store_file, DATA_DIR, get_starting_doc_id())
+    store.add_seeds([(normalize_url(url), url, urlparse(url).netloc) for url in seed_urls])
+    store.close()
+
+    settings = {name: globals()[name] for name in WORKER_SETTINGS}
+    processes = [multiprocessing.Process(target=crawl_worker, args=(number, settings)) for number in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    store = CrawlStore(store_file, DATA_DIR)
+    for normalized in store.done_urls():
         save_crawled_url(normalized)
-        html = fetch_page(url)
-        if html is not None:
-            doc_id = get_next_doc_id()
-            saved = save_text(url, html, doc_id)  # Check if saved
-            if saved:
-                local_count += 1
-            new_links = parse_links(html, url, allowed_domain)
-            for link in new_links:
-                normalized_link = normalize_url(link)
-                if (normalized_link not in seen_urls and 
-                link not in visited and link not in queue):
-                    queue.append(link)
-                    depth[link] = current_depth + 1
-        time.sleep(CRAWL_DELAY)
+    for content_hash in store.content_hashes():
+        save_content_hash(content_hash)
+    for fingerprint in store.fingerprints():
+        near_duplicates.add(fingerprint)
+    flush_seen_sets()
+    counts = store.counts()
+    store.close()
+    return counts
 
 def get_starting_doc_id():
     if not os.path.exists(DATA_DIR):
@@ -475,6 +979,14 @@ def get_starting_doc_id():
 doc_counter = get_starting_doc_id()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Automotive search engine crawler")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="crawl with this many worker processes sharing data/crawl_state.db "
+                             "(which always picks up where the last run stopped)")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the frontier saved in data/crawl_checkpoint.json.gz")
+    args = parser.parse_args()
+
     print(f" Starting Automotive Search Engine Crawler")
     print(f" Total seed URLs: {len(SEED_URLS)}")
     print(f" Max pages per domain: {MAX_PAGES}")
@@ -483,22 +995,24 @@ if __name__ == "__main__":
     # Load existing data
     load_existing_urls()
     load_existing_hashes() 
+    load_existing_validators()
+    load_existing_simhashes()
     print(f"Found {len(seen_urls)} previously crawled URLs")
     print(f"Found {len(seen_hashes)} unique content hashes") 
     
-    total_docs_saved = 0
-    
-    for i, seed_url in enumerate(SEED_URLS, 1):
-        print(f"\n[{i}/{len(SEED_URLS)}] Crawling {seed_url}")
-        print("-" * 50)
-        
-        domain = urlparse(seed_url).netloc
-        
-        try:
-            crawl(seed_url, domain)
-        except Exception as e:
-            print(f"Error crawling {seed_url}: {e}")
-            continue
+    if args.workers:
+        counts = crawl_with_workers(SEED_URLS, args.workers)
+        print(f"\nWorkers finished: {counts.get('done', 0)} pages done, {counts.get('failed', 0)} failed")
+    else:
+        stats = crawl_all(SEED_URLS, checkpoint_path=checkpoint_file, resume=args.resume)
+        pages_per_sec = stats["fetched"] / stats["elapsed"] if stats["elapsed"] else 0
+        print(f"\nFetched {stats['fetched']} pages ({stats['failed']} failed, {stats['retried']} retries, "
+              f"{stats['unchanged']} unchanged) in {stats['elapsed']:.1f}s "
+              f"({pages_per_sec:.1f} pages/sec)")
+        report = fetch_report()
+        print(f"Transferred {report['wire_bytes']} bytes ({report['decoded_bytes']} decoded), "
+              f"connection reuse {report['connection_reuse_ratio']:.0%}, "
+              f"304 hit rate {report['not_modified_rate']:.0%}")
     
     # Count total documents
     total_docs = len([f for f in os.listdir(DATA_DIR) if f.endswith('.txt')])
@@ -507,3 +1021,6 @@ if __name__ == "__main__":
     print(f"Total unique documents: {total_docs}")
     print(f"Total URLs crawled: {len(seen_urls)}")
     print(f"Total unique content hashes: {len(seen_hashes)}")
+    print(f"Near-duplicate pages suppressed: {near_duplicates.suppressed}")
+    print(f"Dedup memory ({DEDUP_MODE}): {seen_urls.memory_bytes() + seen_hashes.memory_bytes()} bytes")
+    flush_seen_sets()
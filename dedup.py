@@ -0,0 +1,347 @@
+import os
+import re
+import math
+import struct
+import hashlib
+from array import array
+from collections import Counter, defaultdict
+
+# Seen-set and SimHash files are a header followed by one little-endian u64
+# record per added key, appended as keys arrive. Bloom mode also keeps a snapshot of
+# its bit array next to the log so it does not replay every digest on load.
+SEEN_MAGIC = b"MOBISEEN"
+SEEN_VERSION = 1
+SEEN_HEADER = "<8sI"
+SIMHASH_MAGIC = b"MOBISIMH"
+BLOOM_MAGIC = b"MOBIBLOM"
+BLOOM_HEADER = "<8sIQIQQ"
+DIGEST = struct.Struct("<Q")
+SHINGLE_SIZE = 3
+SIMHASH_TOKEN = re.compile(r'\w+')
+
+
+def digest(key):
+    """64-bit digest of a URL or content hash.
+
+    Two distinct keys share a digest with probability about n^2 / 2^65,
+    roughly 3 in a million after 10M keys.
+    """
+    value = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    # 0 marks an empty slot in DigestSet
+    return value or 1
+
+
+def open_digest_log(path, magic, skip=0, read_only=False):
+    """Open (or create) an append-only file of u64 records.
+
+    Returns (values after the first skip records, file open for appending,
+    total record count). With read_only, the file is neither created nor
+    truncated and no file is returned, so another process may own it.
+    """
+    header_size = struct.calcsize(SEEN_HEADER)
+    if not os.path.exists(path):
+        if read_only:
+            return [], None, 0
+        log = open(path, "wb")
+        log.write(struct.pack(SEEN_HEADER, magic, SEEN_VERSION))
+        log.flush()
+        return [], log, 0
+    with open(path, "rb") as f:
+        data = f.read()
+    found_magic, version = struct.unpack_from(SEEN_HEADER, data, 0)
+    if found_magic != magic or version != SEEN_VERSION:
+        raise ValueError(f"{path} is not a version {SEEN_VERSION} {magic!r} file")
+    # Ignore a torn final record from a crash mid-write
+    records = (len(data) - header_size) // DIGEST.size
+    end = header_size + records * DIGEST.size
+    values = [value for (value,) in DIGEST.iter_unpack(data[header_size + skip * DIGEST.size:end])]
+    if read_only:
+        return values, None, records
+    log = open(path, "r+b")
+    log.seek(end)
+    log.truncate()
+    return values, log, records
+
+
+class DigestSet:
+    """Exact set of 64-bit digests in an open-addressing table (about 12-16 bytes per key)"""
+
+    MAX_LOAD = 0.7
+
+    def __init__(self, capacity=1024):
+        size = 1 << max(10, math.ceil(math.log2(capacity / self.MAX_LOAD)))
+        self.table = array("Q", bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _slot(self, value):
+        table = self.table
+        mask = self.mask
+        i = value & mask
+        while True:
+            current = table[i]
+            if current == value or current == 0:
+                return i
+            i = (i + 1) & mask
+
+    def contains_digest(self, value):
+        return self.table[self._slot(value)] == value
+
+    def add_digest(self, value):
+        """Add a digest; return True if it was not present"""
+        i = self._slot(value)
+        if self.table[i] == value:
+            return False
+        self.table[i] = value
+        self.count += 1
+        if self.count > self.MAX_LOAD * len(self.table):
+            self._grow()
+        return True
+
+    def _grow(self):
+        old = self.table
+        self.table = array("Q", bytes(16 * len(old)))
+        self.mask = len(self.table) - 1
+        for value in old:
+            if value:
+                self.table[self._slot(value)] = value
+
+    def memory_bytes(self):
+        return self.table.itemsize * len(self.table)
+
+
+class BloomFilter:
+    """Bloom filter sized for capacity keys at a target false-positive rate.
+
+    A lookup can wrongly report a key as present with probability fp_rate
+    once capacity keys are in; it never misses a key that was added.
+    At 0.1% that costs about 14.4 bits per key.
+    """
+
+    def __init__(self, capacity, fp_rate):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.num_bits = max(64, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, value):
+        # Double hashing: the two 32-bit halves of the digest generate all k positions
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        num_bits = self.num_bits
+        return [(h1 + i * h2) % num_bits for i in range(self.num_hashes)]
+
+    def contains_digest(self, value):
+        bits = self.bits
+        for p in self._positions(value):
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+    def add_digest(self, value):
+        bits = self.bits
+        added = False
+        for p in self._positions(value):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def memory_bytes(self):
+        return len(self.bits)
+
+
+class SeenSet:
+    """Set of strings (normalized URLs, content hashes) stored as 64-bit digests.
+
+    mode="exact" keeps every digest; mode="bloom" keeps a Bloom filter with
+    a bounded false-positive rate. With a path, every new key is appended
+    to the log file immediately, or at the next flush() if it was added
+    with defer=True. With read_only, the set is loaded from path but
+    never writes to it or to the Bloom snapshot: new keys stay in memory.
+    """
+
+    def __init__(self, path=None, mode="exact", capacity=1_000_000, fp_rate=0.001, read_only=False):
+        self.path = path
+        self.mode = mode
+        self.read_only = read_only
+        if mode == "bloom":
+            self.members = BloomFilter(capacity, fp_rate)
+        elif mode == "exact":
+            self.members = DigestSet()
+        else:
+            raise ValueError(f"Unknown dedup mode: {mode}")
+        self.logged = 0
+        self.log = None
+        self.deferred = []
+        if path is not None:
+            self._open_log()
+
+    def __contains__(self, key):
+        return self.members.contains_digest(digest(key))
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, key, defer=False):
+        value = digest(key)
+        if self.members.add_digest(value) and self.log is not None:
+            if defer:
+                self.deferred.append(value)
+                return
+            self.log.write(DIGEST.pack(value))
+            self.log.flush()
+            self.logged += 1
+
+    def update(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def memory_bytes(self):
+        return self.members.memory_bytes()
+
+    def _open_log(self):
+        replay_from = 0
+        if self.mode == "bloom":
+            replay_from = self._load_snapshot()
+        values, self.log, self.logged = open_digest_log(self.path, SEEN_MAGIC, replay_from, self.read_only)
+        for value in values:
+            self.members.add_digest(value)
+
+    def _snapshot_path(self):
+        return self.path + ".bloom"
+
+    def _load_snapshot(self):
+        path = self._snapshot_path()
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, capacity, num_hashes, count, logged = struct.unpack_from(BLOOM_HEADER, data, 0)
+        bloom = self.members
+        bits = data[struct.calcsize(BLOOM_HEADER):]
+        if magic != BLOOM_MAGIC or version != SEEN_VERSION or capacity != bloom.capacity \
+                or num_hashes != bloom.num_hashes or len(bits) != len(bloom.bits):
+            # Sized differently (or unreadable): rebuild from the full log instead
+            return 0
+        bloom.bits[:] = bits
+        bloom.count = count
+        return logged
+
+    def flush(self):
+        """Log the deferred keys and write the Bloom snapshot"""
+        if self.deferred and self.log is not None:
+            self.log.write(b"".join(DIGEST.pack(value) for value in self.deferred))
+            self.log.flush()
+            self.logged += len(self.deferred)
+        self.deferred = []
+        if self.path is None or self.mode != "bloom" or self.read_only:
+            return
+        bloom = self.members
+        tmp_path = self._snapshot_path() + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(struct.pack(BLOOM_HEADER, BLOOM_MAGIC, SEEN_VERSION, bloom.capacity,
+                                bloom.num_hashes, bloom.count, self.logged))
+            f.write(bloom.bits)
+        os.replace(tmp_path, self._snapshot_path())
+
+    def close(self):
+        self.flush()
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+
+def simhash(text):
+    """64-bit SimHash over word shingles of the text.
+
+    Pages that share most of their shingles get fingerprints a few bits
+    apart, so near-duplicates can be found by Hamming distance.
+    """
+    tokens = SIMHASH_TOKEN.findall(text.lower())
+    # Distinct shingles only, so repeated boilerplate does not outvote the content
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(max(1, len(tokens) - SHINGLE_SIZE + 1))}
+    hashes = [digest(shingle) for shingle in shingles]
+    half = len(hashes) / 2
+    fingerprint = 0
+    # Tally one byte of every hash at a time, so the per-bit vote costs
+    # 256 * 8 steps per byte instead of 64 steps per shingle
+    for byte in range(8):
+        counts = Counter((value >> (8 * byte)) & 0xFF for value in hashes)
+        for bit in range(8):
+            ones = sum(count for value, count in counts.items() if value >> bit & 1)
+            if ones > half:
+                fingerprint |= 1 << (8 * byte + bit)
+    return fingerprint
+
+
+class SimHashIndex:
+    """SimHash fingerprints searchable by Hamming distance.
+
+    Each fingerprint is split into max_distance + 1 bit blocks. Two
+    fingerprints within max_distance bits of each other must agree exactly
+    on at least one block, so a lookup only compares against fingerprints
+    sharing a block instead of scanning all of them.
+    """
+
+    def __init__(self, path=None, max_distance=3, read_only=False):
+        self.max_distance = max_distance
+        blocks = max_distance + 1
+        width = 64 // blocks
+        self.blocks = []
+        for block in range(blocks):
+            start = block * width
+            end = 64 if block == blocks - 1 else start + width
+            self.blocks.append((start, (1 << (end - start)) - 1))
+        self.tables = [defaultdict(list) for _ in self.blocks]
+        self.count = 0
+        self.suppressed = 0
+        self.log = None
+        if path is not None:
+            values, self.log, _ = open_digest_log(path, SIMHASH_MAGIC, read_only=read_only)
+            for value in values:
+                self._insert(value)
+
+    def __len__(self):
+        return self.count
+
+    def find(self, fingerprint):
+        """Return a stored fingerprint within max_distance bits, or None"""
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            for candidate in table.get((fingerprint >> shift) & mask, ()):
+                if bin(candidate ^ fingerprint).count("1") <= self.max_distance:
+                    return candidate
+        return None
+
+    def __contains__(self, fingerprint):
+        shift, mask = self.blocks[0]
+        return fingerprint in self.tables[0].get((fingerprint >> shift) & mask, ())
+
+    def add(self, fingerprint):
+        if fingerprint in self:
+            return
+        self._insert(fingerprint)
+        if self.log is not None:
+            self.log.write(DIGEST.pack(fingerprint))
+            self.log.flush()
+
+    def _insert(self, fingerprint):
+        for (shift, mask), table in zip(self.blocks, self.tables):
+            table[(fingerprint >> shift) & mask].append(fingerprint)
+        self.count += 1
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
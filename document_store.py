@@ -0,0 +1,164 @@
+import os
+import mmap
+import struct
+from array import array
+from collections.abc import MutableMapping, Sequence
+
+DOCUMENTS_FILE = "documents.bin"
+
+# Packed document file layout (little endian):
+#   header   magic, format version, data fingerprint, doc count, table offset
+#   bodies   UTF-8 text of every document, back to back
+#   table    per doc: doc_id, url, body offset, body length in bytes
+DOCUMENTS_MAGIC = b"MOBIDOCS"
+DOCUMENTS_VERSION = 1
+DOCUMENTS_HEADER = "<8sI32sIQ"
+
+
+def pack_string(value):
+    data = value.encode("utf-8")
+    return struct.pack("<I", len(data)) + data
+
+
+def unpack_string(buffer, offset):
+    (length,) = struct.unpack_from("<I", buffer, offset)
+    offset += 4
+    return bytes(buffer[offset:offset + length]).decode("utf-8"), offset + length
+
+
+class StoredDocument(Sequence):
+    """[url, text] of a stored document; the text is read from the file on access"""
+
+    __slots__ = ("_store", "_number")
+
+    def __init__(self, store, number):
+        self._store = store
+        self._number = number
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, i):
+        if i == 0 or i == -2:
+            return self._store._urls[self._number]
+        if i == 1 or i == -1:
+            return self._store._body(self._number)
+        raise IndexError(i)
+
+
+class DocumentStore(MutableMapping):
+    """doc_id -> [url, text] over a packed, memory-mapped document file.
+
+    Only doc_ids, URLs and body offsets are held in memory. Bodies stay in
+    the mapped file, so processes serving the same file share them through
+    the page cache. Documents added or replaced after loading live in an
+    in-memory overlay until the store is saved again.
+    """
+
+    def __init__(self, buffer, doc_numbers, urls, offsets, lengths):
+        self._buffer = buffer
+        self._doc_numbers = doc_numbers
+        self._urls = urls
+        self._offsets = offsets
+        self._lengths = lengths
+        self._overlay = {}
+        self._removed = set()
+
+    def _body(self, number):
+        offset = self._offsets[number]
+        return self._buffer[offset:offset + self._lengths[number]].decode("utf-8")
+
+    def __getitem__(self, doc_id):
+        if doc_id in self._overlay:
+            return self._overlay[doc_id]
+        if doc_id in self._removed or doc_id not in self._doc_numbers:
+            raise KeyError(doc_id)
+        return StoredDocument(self, self._doc_numbers[doc_id])
+
+    def __setitem__(self, doc_id, value):
+        self._overlay[doc_id] = value
+        self._removed.discard(doc_id)
+
+    def __delitem__(self, doc_id):
+        if doc_id not in self:
+            raise KeyError(doc_id)
+        self._overlay.pop(doc_id, None)
+        if doc_id in self._doc_numbers:
+            self._removed.add(doc_id)
+
+    def __contains__(self, doc_id):
+        if doc_id in self._overlay:
+            return True
+        return doc_id in self._doc_numbers and doc_id not in self._removed
+
+    def __iter__(self):
+        for doc_id in self._doc_numbers:
+            if doc_id not in self._removed and doc_id not in self._overlay:
+                yield doc_id
+        yield from self._overlay
+
+    def __len__(self):
+        added = sum(1 for doc_id in self._overlay if doc_id not in self._doc_numbers)
+        return len(self._doc_numbers) - len(self._removed) + added
+
+    def copy(self):
+        """A store over the same file whose writes do not show in this one"""
+        store = DocumentStore(self._buffer, self._doc_numbers, self._urls, self._offsets, self._lengths)
+        store._overlay = dict(self._overlay)
+        store._removed = set(self._removed)
+        return store
+
+
+def save_documents(documents, fingerprint, path=DOCUMENTS_FILE):
+    """Write documents (any doc_id -> [url, text] mapping) as a packed file"""
+    table = bytearray()
+    header_size = struct.calcsize(DOCUMENTS_HEADER)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(bytes(header_size))
+        offset = header_size
+        for doc_id in documents:
+            url, text = documents[doc_id]
+            body = (text or "").encode("utf-8")
+            f.write(body)
+            table += pack_string(doc_id)
+            table += pack_string(url)
+            table += struct.pack("<QI", offset, len(body))
+            offset += len(body)
+        f.write(table)
+        f.seek(0)
+        f.write(struct.pack(DOCUMENTS_HEADER, DOCUMENTS_MAGIC, DOCUMENTS_VERSION, fingerprint,
+                            len(documents), offset))
+    # Swap in the finished file; processes mapping the old one keep a complete copy
+    os.replace(tmp_path, path)
+
+
+def load_documents_store(fingerprint, path=DOCUMENTS_FILE):
+    """Map a saved document file, or return None if it is missing, stale or from another format version"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+    if len(buffer) < struct.calcsize(DOCUMENTS_HEADER):
+        return None
+    magic, version, saved_fingerprint, count, offset = struct.unpack_from(DOCUMENTS_HEADER, buffer, 0)
+    if magic != DOCUMENTS_MAGIC or version != DOCUMENTS_VERSION or saved_fingerprint != fingerprint:
+        return None
+
+    doc_numbers = {}
+    urls = []
+    offsets = array("Q")
+    lengths = array("I")
+    for number in range(count):
+        doc_id, offset = unpack_string(buffer, offset)
+        url, offset = unpack_string(buffer, offset)
+        body_offset, body_length = struct.unpack_from("<QI", buffer, offset)
+        offset += 12
+        doc_numbers[doc_id] = number
+        urls.append(url)
+        offsets.append(body_offset)
+        lengths.append(body_length)
+    return DocumentStore(buffer, doc_numbers, urls, offsets, lengths)
@@ -0,0 +1,268 @@
+from itertools import chain
+
+import numpy as np
+
+from analysis import analyze
+
+# Groups of interchangeable expressions. A query word or phrase equal to
+# one member also matches the others, except those with words the index
+# does not have.
+SYNONYMS = (
+    ("ev", "electric vehicle"),
+    ("bev", "battery electric vehicle"),
+    ("phev", "plug in hybrid"),
+    ("hev", "hybrid electric vehicle"),
+    ("ice", "internal combustion engine"),
+    ("adas", "advanced driver assistance"),
+    ("awd", "all wheel drive"),
+    ("suv", "sport utility vehicle"),
+    ("mpg", "miles per gallon"),
+    ("fsd", "full self driving"),
+)
+# Words shorter than this are never corrected; longer than LONG_WORD they
+# may be two edits away from the intended word instead of one
+MIN_FUZZY_LENGTH = 4
+LONG_WORD = 8
+MAX_EDIT_DISTANCE = 2
+# Only the first PREFIX_LENGTH letters are used to find candidates (as in
+# SymSpell), which caps the deletes stored per word at 29
+PREFIX_LENGTH = 7
+# Words in fewer documents are never offered as corrections: mostly typos
+# themselves, and most of a vocabulary
+MIN_FUZZY_DOC_FREQ = 2
+# Bounds on the work and the terms one query can add: corrections kept per
+# word, candidates checked per word, and words or phrases expanded per query
+MAX_CORRECTIONS = 3
+MAX_CANDIDATES = 64
+MAX_EXPANSIONS = 4
+
+
+def _deletes(word, distance):
+    """{string: fewest deletes} for the strings made by deleting up to
+    distance letters from word"""
+    found = {word: 0}
+    edge = [word]
+    for depth in range(1, distance + 1):
+        edge = [w[:i] + w[i + 1:] for w in edge if len(w) > 1 for i in range(len(w))]
+        for delete in edge:
+            found.setdefault(delete, depth)
+    return found
+
+
+def edit_distance(first, second, limit):
+    """Edit distance counting a swap of adjacent letters as one edit
+    (optimal string alignment), or limit + 1 if it is more than limit"""
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(second) + 1))
+    for i, a in enumerate(first, 1):
+        current = [i] + [0] * len(second)
+        for j, b in enumerate(second, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a != b))
+            if i > 1 and j > 1 and a == second[j - 2] and first[i - 2] == b:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+class QueryExpander:
+    """Spelling correction and synonyms for query trees (see query_parser.py).
+
+    Corrections come from a SymSpell index: every string a few deletes
+    away from a vocabulary word, stored as a sorted array of string
+    hashes. Words within the edit distance of a query word share one of
+    those strings, so a lookup is a binary search per delete of the query
+    word, never a scan of the vocabulary. Built from an index's
+    vocabulary and kept in step with it by update(): words that become
+    frequent enough go into a small overlay of deletes, and words that
+    fall below MIN_FUZZY_DOC_FREQ are skipped at lookup.
+    """
+
+    def __init__(self, vocabulary, synonyms=SYNONYMS, max_expansions=MAX_EXPANSIONS):
+        """vocabulary maps each indexed term to its document frequency"""
+        self.vocabulary = vocabulary
+        self.max_expansions = max_expansions
+        # delete -> {word: deletes made}, for words correctable since the build
+        self.added = {}
+        # Most frequent first, so smaller ids are the likelier corrections
+        self.words = sorted((word for word, count in vocabulary.items() if count >= MIN_FUZZY_DOC_FREQ),
+                            key=lambda word: (-vocabulary[word], word))
+        self.lengths = np.array([len(word) for word in self.words], dtype=np.int32)
+        hashes = []
+        ids = []
+        depths = []
+        for word_id, word in enumerate(self.words):
+            # Only words LONG_WORD or longer are looked up two edits away,
+            # and shorter words are more than two edits from those
+            distance = MAX_EDIT_DISTANCE if len(word) >= LONG_WORD - MAX_EDIT_DISTANCE else 1
+            deletes = _deletes(word[:PREFIX_LENGTH], distance)
+            hashes.extend(map(hash, deletes))
+            depths.extend(deletes.values())
+            ids.extend([word_id] * len(deletes))
+        order = np.argsort(np.array(hashes, dtype=np.int64), kind="stable")
+        self.hashes = np.array(hashes, dtype=np.int64)[order]
+        self.ids = np.array(ids, dtype=np.int32)[order]
+        # Deletes made from the vocabulary word: more than the distance
+        # looked up cannot lead to a word within it
+        self.depths = np.array(depths, dtype=np.int8)[order]
+
+        self.groups = [[terms for terms in dict.fromkeys(tuple(analyze(member)) for member in group) if terms]
+                       for group in synonyms]
+        self.synonym_terms = {term for members in self.groups for terms in members for term in terms}
+        self._match_synonyms()
+
+    def _match_synonyms(self):
+        # Members match each other only if the index has all their words
+        synonyms = {}
+        for members in self.groups:
+            indexed = [terms for terms in members if all(term in self.vocabulary for term in terms)]
+            for terms in members:
+                others = tuple(_node(other) for other in indexed if other != terms)
+                if others:
+                    synonyms[terms] = others
+        self.synonyms = synonyms
+        self.longest_synonym = max(map(len, synonyms), default=0)
+
+    def memory_bytes(self):
+        return self.hashes.nbytes + self.ids.nbytes + self.depths.nbytes + self.lengths.nbytes
+
+    def update(self, word, doc_freq):
+        """Record that word is now in doc_freq documents (0 if no longer indexed)"""
+        before = self.vocabulary.get(word, 0)
+        if doc_freq:
+            self.vocabulary[word] = doc_freq
+        else:
+            self.vocabulary.pop(word, None)
+        if before < MIN_FUZZY_DOC_FREQ <= doc_freq:
+            # Possibly in the table already, from before it fell below;
+            # corrections() drops the duplicate
+            distance = MAX_EDIT_DISTANCE if len(word) >= LONG_WORD - MAX_EDIT_DISTANCE else 1
+            for delete, depth in _deletes(word[:PREFIX_LENGTH], distance).items():
+                self.added.setdefault(delete, {})[word] = depth
+        if word in self.synonym_terms and (not before) != (not doc_freq):
+            self._match_synonyms()
+
+    def copy(self):
+        """An expander for a copy of the index; updates to either do not show in the other"""
+        expander = object.__new__(QueryExpander)
+        expander.__dict__.update(self.__dict__)
+        expander.vocabulary = dict(self.vocabulary)
+        expander.added = {delete: dict(words) for delete, words in self.added.items()}
+        return expander
+
+    def corrections(self, word):
+        """Up to MAX_CORRECTIONS vocabulary words closest to word, most frequent first"""
+        if len(word) < MIN_FUZZY_LENGTH or not word.isalpha():
+            return []
+        limit = 1 if len(word) < LONG_WORD else MAX_EDIT_DISTANCE
+        deletes = _deletes(word[:PREFIX_LENGTH], limit)
+        keys = np.array([hash(delete) for delete in deletes], dtype=np.int64)
+        starts = np.searchsorted(self.hashes, keys, "left")
+        ends = np.searchsorted(self.hashes, keys, "right")
+        word_ids = []
+        if (ends - starts).any():
+            matched = np.concatenate([np.arange(s, e) for s, e in zip(starts.tolist(), ends.tolist())])
+            word_ids = np.unique(self.ids[matched[self.depths[matched] <= limit]])
+            word_ids = word_ids[np.abs(self.lengths[word_ids] - len(word)) <= limit].tolist()
+        added = sorted({candidate for delete in deletes for candidate, depth in self.added.get(delete, {}).items()
+                        if depth <= limit and abs(len(candidate) - len(word)) <= limit})
+        vocabulary = self.vocabulary
+        checked = set()
+        best = limit + 1
+        found = []
+        for candidate in chain((self.words[word_id] for word_id in word_ids), added):
+            # Skip words that fell below MIN_FUZZY_DOC_FREQ since the build
+            if candidate in checked or vocabulary.get(candidate, 0) < MIN_FUZZY_DOC_FREQ:
+                continue
+            checked.add(candidate)
+            if len(checked) > MAX_CANDIDATES:
+                break
+            distance = edit_distance(word, candidate, min(limit, best))
+            if distance < best:
+                best = distance
+                found = [candidate]
+            elif distance == best and distance <= limit:
+                found.append(candidate)
+        # Frequencies may have changed since the table was ordered
+        found.sort(key=lambda candidate: (-vocabulary[candidate], candidate))
+        return found[:MAX_CORRECTIONS]
+
+    def expand(self, tree):
+        """tree with unknown words replaced by their corrections and
+        synonyms added. A word or phrase with synonyms becomes
+        ("alt", (itself, *synonyms)); an unknown word with several
+        corrections becomes ("alt", corrections)."""
+        return None if tree is None else self._expand(tree, [self.max_expansions])
+
+    def _expand(self, node, budget):
+        kind, value = node
+        if kind == "word":
+            return self._expand_word(node, budget)
+        if kind == "phrase":
+            return self._expand_phrase(node, budget)
+        if kind == "seq":
+            return kind, self._expand_seq(value, budget)
+        if kind in ("and", "or"):
+            return kind, tuple(self._expand(child, budget) for child in value)
+        if kind == "not":
+            return kind, self._expand(value, budget)
+        return node
+
+    def _expand_word(self, node, budget):
+        word = node[1]
+        if budget[0] <= 0:
+            return node
+        synonyms = self.synonyms.get((word,))
+        if synonyms:
+            budget[0] -= 1
+            return "alt", (node,) + synonyms
+        if word in self.vocabulary:
+            return node
+        found = self.corrections(word)
+        if not found:
+            return node
+        budget[0] -= 1
+        return ("word", found[0]) if len(found) == 1 else ("alt", tuple(("word", term) for term in found))
+
+    def _expand_phrase(self, node, budget):
+        words = node[1]
+        synonyms = self.synonyms.get(words)
+        if synonyms and budget[0] > 0:
+            budget[0] -= 1
+            return "alt", (node,) + synonyms
+        corrected = []
+        for word in words:
+            if word not in self.vocabulary and budget[0] > 0:
+                found = self.corrections(word)
+                if found:
+                    budget[0] -= 1
+                    word = found[0]
+            corrected.append(word)
+        return "phrase", tuple(corrected)
+
+    def _expand_seq(self, children, budget):
+        expanded = []
+        i = 0
+        while i < len(children):
+            # A run of plain words that is a synonym, longest first
+            for length in range(min(self.longest_synonym, len(children) - i), 1, -1):
+                run = children[i:i + length]
+                synonyms = (all(child[0] == "word" for child in run)
+                            and self.synonyms.get(tuple(child[1] for child in run)))
+                if synonyms and budget[0] > 0:
+                    budget[0] -= 1
+                    expanded.append(("alt", (("seq", run),) + synonyms))
+                    i += length
+                    break
+            else:
+                expanded.append(self._expand(children[i], budget))
+                i += 1
+        return tuple(expanded)
+
+
+def _node(terms):
+    return ("word", terms[0]) if len(terms) == 1 else ("phrase", terms)
@@ -1,143 +1,990 @@
 import os
 import re
+import mmap
+import struct
+import hashlib
+import heapq
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import MutableMapping
 from math import log
+from urllib.parse import urlparse
+
+import numpy as np
+
+from analysis import ANALYZER
+from document_store import DOCUMENTS_FILE, save_documents, load_documents_store, pack_string, unpack_string
+from expansion import QueryExpander, SYNONYMS
+from metrics import stage
+from postings import PostingsReader, encode_postings
+from query_parser import parse
 
 # CONFIGURATION
 DATA_DIR = "data"
-INDEX_FILE = "index.json"
-STOP_WORDS = {
-    # Articles
-    "the", "a", "an",
-    
-    # Conjunctions
-    "and", "or", "but", "if", "because",
-    
-    # Prepositions
-    "in", "on", "at", "to", "for", "of", "with", "by", "from",
-    "about", "into", "through", "during", "before", "after",
-    "above", "below", "between", "under",
-    
-    # Be verbs
-    "is", "are", "was", "were", "be", "been", "being",
-    
-    # Have verbs
-    "have", "has", "had",
-    
-    # Do verbs
-    "do", "does", "did",
-    
-    # Pronouns
-    "i", "you", "he", "she", "it", "we", "they",
-    "this", "that", "these", "those",
-    "my", "your", "his", "her", "its", "our", "their",
-    
-    # Common words
-    "will", "would", "could", "should", "can", "may", "might",
-    "just", "also", "very", "really", "only", "even",
-    "more", "most", "other", "some", "any", "all", "each",
-    "no", "not", "so", "than", "too", "now", "here", "there"
-}
-
-# DO NOT include: car, vehicle, electric, battery, engine, motor, etc.
-# These are words you WANT to find!
+INDEX_FILE = "index.bin"
+
+# Binary index layout (little endian):
+#   header      magic, format version, data fingerprint, doc count, term count
+#   doc table   per doc: doc_id, token length, term numbers
+#   term dict   per term: term, postings offset, document frequency,
+#               highest tf / doc length of the term in any document
+#   postings    per term: compressed blocks keyed by dense doc numbers
+#               (the doc's place in the doc table), see postings.py
+INDEX_MAGIC = b"MOBIIDX\0"
+INDEX_VERSION = 5
+HEADER_FORMAT = "<8sI32sII"
+
 AUTOMOTIVE_KEYWORDS = [
     'electric', 'vehicle', 'car', 'battery', 
     'automobile', 'automotive', 'ev', 'tesla', 
     'ford', 'gm', 'toyota', 'nissan', 'charging',
     'motor', 'engineering', 'technology'
 ]
+AUTOMOTIVE_PATTERN = re.compile("(?=(" + "|".join(map(re.escape, AUTOMOTIVE_KEYWORDS)) + "))")
+MIN_KEYWORD_HITS = 5
 BLOCKED_DOMAINS = ['quotes.toscrape.com', 'toscrape.com']
 
+# Results scoring below MIN_SCORE are dropped; search returns at most MAX_RESULTS by default
+MIN_SCORE = 0.001
+MAX_RESULTS = 50
+# Multi-word queries rerank their best PROXIMITY_DEPTH results by how close
+# the query words are; adjacent words multiply a score by up to 1 + PROXIMITY_WEIGHT
+PROXIMITY_DEPTH = 100
+PROXIMITY_WEIGHT = 0.5
 
-def load_documents():
+
+def _load_files(filenames):
     documents = {}
-    for filename in os.listdir("data"):
-        if filename.endswith(".txt"):
-            filepath = os.path.join(DATA_DIR, filename)
-            with open("data/"+ filename, "r", encoding="utf-8") as f:
-                content = f.read()
-            parts = content.split('\n\n', 1)
-            if any(domain in parts[0] for domain in BLOCKED_DOMAINS):
-                continue
-            if len(parts) == 2 and is_valid_automotive_content(parts[1]):
-                documents[filename.replace('.txt', '')] = parts
-    return documents 
+    for filename in filenames:
+        with open(os.path.join(DATA_DIR, filename), "r", encoding="utf-8") as f:
+            content = f.read()
+        parts = content.split('\n\n', 1)
+        if len(parts) == 2 and is_indexable(parts[0], parts[1]):
+            documents[filename.replace('.txt', '')] = parts
+    return documents
+
+def _load_and_index_files(filenames):
+    documents = _load_files(filenames)
+    return documents, build_inverted_index(documents)
+
+def _chunks(workers):
+    filenames = [filename for filename in os.listdir(DATA_DIR) if filename.endswith(".txt")]
+    # Several chunks per worker so one slow chunk does not hold up the rest
+    size = max(1, -(-len(filenames) // (workers * 4)))
+    return [filenames[i:i + size] for i in range(0, len(filenames), size)]
+
+def _map_chunks(function, workers):
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(workers)
+    if workers == 1 or len(chunks) <= 1:
+        return [function(chunk) for chunk in chunks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(function, chunks))
+
+def load_documents(workers=None):
+    """Read and filter DATA_DIR across workers processes (default: one per core)"""
+    documents = {}
+    for chunk_documents in _map_chunks(_load_files, workers):
+        documents.update(chunk_documents)
+    return documents
+
+def load_and_index_documents(workers=None):
+    """load_documents() and build_inverted_index() in one pass.
+
+    Each worker indexes its own chunk of files and the partial indexes are
+    merged, so the build scales with the number of cores.
+    """
+    documents = {}
+    index = {"postings": {}, "doc_lengths": {}, "doc_terms": {}, "max_tf": {}, "hosts": {}, "blocked": set()}
+    for chunk_documents, chunk_index in _map_chunks(_load_and_index_files, workers):
+        documents.update(chunk_documents)
+        merge_index(index, chunk_index)
+    return documents, index
+
+def merge_index(index, other):
+    """Add the postings of other, which must cover different documents, into index"""
+    postings = index["postings"]
+    max_tf = index["max_tf"]
+    for word, word_postings in other["postings"].items():
+        if word in postings:
+            postings[word].update(word_postings)
+            max_tf[word] = max(max_tf[word], other["max_tf"][word])
+        else:
+            postings[word] = word_postings
+            max_tf[word] = other["max_tf"][word]
+    index["doc_lengths"].update(other["doc_lengths"])
+    index["doc_terms"].update(other["doc_terms"])
+    for host, doc_ids in other["hosts"].items():
+        index["hosts"].setdefault(host, set()).update(doc_ids)
+    index["blocked"].update(other["blocked"])
+
+def is_indexable(url, text):
+    if any(domain in url for domain in BLOCKED_DOMAINS):
+        return False
+    return is_valid_automotive_content(text)
 
 def is_valid_automotive_content(text):
-    text_lower = text.lower()
-    keyword_count = sum(text_lower.count(keyword) for keyword in AUTOMOTIVE_KEYWORDS)
-    return keyword_count >= 5
+    # One scan for all keywords, stopping at the fifth hit. No keyword is a
+    # prefix of another or overlaps itself, so this counts the same as
+    # summing text.count(keyword) over the keywords.
+    matches = AUTOMOTIVE_PATTERN.finditer(text.lower())
+    return sum(1 for _ in zip(range(MIN_KEYWORD_HITS), matches)) == MIN_KEYWORD_HITS
 
 def process_text(text):
-    lower = text.lower()
-    words = re.findall(r'[a-z]+', lower)
-    result = []
-    for word in words:
-        if word not in STOP_WORDS:
-            result.append(word)
-    return result
+    """Index terms of text; see analysis.py"""
+    return ANALYZER.analyze(text)
 
 def build_inverted_index(documents):
-    index = defaultdict(list)
+    # postings: word -> {doc_id: [positions]}, so the term frequency of a
+    # word in a document is just the length of its position list.
+    # doc_terms is the forward index used to take a document back out.
+    # max_tf bounds tf / doc length per word, which bounds its score in search.
+    # hosts (host -> doc_ids) serves site: filters, and blocked holds the
+    # doc_ids on BLOCKED_DOMAINS so search can exclude them without
+    # looking at URLs.
+    index = {"postings": {}, "doc_lengths": {}, "doc_terms": {}, "max_tf": {}, "hosts": {}, "blocked": set()}
     for doc_id, content in documents.items():
-        text = content[1]
-        words = process_text(text)
-        unique_words = set(words)
-        for word in unique_words:
-            index[word].append(doc_id)
+        _add_postings(index, doc_id, content[0], content[1])
     return index
 
-def calculate_tf_idf(word, words_list, inverted_index, total_docs):
-    tf = words_list.count(word) / len(words_list) if words_list else 0
-    
-    docs_with_word = inverted_index.get(word, [])
-    idf = log(total_docs / (len(docs_with_word) + 1))  
-    
-    return tf * idf
+def _url_host(url):
+    return (urlparse(url).hostname or "").lower()
+
+def _add_postings(index, doc_id, url, text):
+    postings = index["postings"]
+    words = process_text(text)
+    positions = defaultdict(list)
+    for position, word in enumerate(words):
+        positions[word].append(position)
+    max_tf = index["max_tf"]
+    for word, word_positions in positions.items():
+        word_postings = postings.get(word, {})
+        word_postings[doc_id] = word_positions
+        postings[word] = word_postings
+        max_tf[word] = max(max_tf.get(word, 0), len(word_positions) / len(words))
+    index["doc_lengths"][doc_id] = len(words)
+    index["doc_terms"][doc_id] = list(positions)
+    index["hosts"].setdefault(_url_host(url), set()).add(doc_id)
+    if _is_blocked(url):
+        index["blocked"].add(doc_id)
+
+def _remove_postings(index, doc_id, url):
+    postings = index["postings"]
+    for word in index["doc_terms"][doc_id]:
+        word_postings = postings[word]
+        del word_postings[doc_id]
+        if word_postings:
+            postings[word] = word_postings
+        else:
+            del postings[word]
+            # A bound left over from a removed document is still an upper
+            # bound, so max_tf is only dropped along with the word
+            del index["max_tf"][word]
+    del index["doc_lengths"][doc_id]
+    del index["doc_terms"][doc_id]
+    host = _url_host(url)
+    index["hosts"][host].discard(doc_id)
+    if not index["hosts"][host]:
+        del index["hosts"][host]
+    index["blocked"].discard(doc_id)
+
+def add_document(index, documents, doc_id, url, text):
+    """Index a new document, or re-index doc_id if it is already present"""
+    changed = []
+    if doc_id in index["doc_lengths"]:
+        changed = index["doc_terms"][doc_id]
+        _remove_postings(index, doc_id, documents[doc_id][0])
+    _add_postings(index, doc_id, url, text)
+    documents[doc_id] = [url, text]
+    _update_expander(index, changed + index["doc_terms"][doc_id])
 
-def search(query, documents, inverted_index):
-    query_words = process_text(query)
-    candidate_docs = set()
+def update_document(index, documents, doc_id, url, text):
+    add_document(index, documents, doc_id, url, text)
 
+def delete_document(index, documents, doc_id):
+    if doc_id in index["doc_lengths"]:
+        changed = index["doc_terms"][doc_id]
+        _remove_postings(index, doc_id, documents[doc_id][0])
+        _update_expander(index, changed)
+    documents.pop(doc_id, None)
+
+def _update_expander(index, words):
+    # Only the document frequencies of the document's words changed
+    expander = index.get("expander")
+    if expander is not None:
+        postings = index["postings"]
+        for word in set(words):
+            expander.update(word, doc_freq(postings, word))
+
+def copy_index(index):
+    """An index equal to index that add/update/delete_document can change
+    without changing index. A mapped index's copy maps the same file and
+    copies only what was written since loading; an in-memory index is
+    copied down to its postings dicts (position lists are shared, since
+    updates replace them rather than change them)."""
+    postings = index["postings"]
+    copied = {
+        "postings": (postings.copy() if isinstance(postings, _MappedTable)
+                     else {word: dict(word_postings) for word, word_postings in postings.items()}),
+        "doc_lengths": dict(index["doc_lengths"]),
+        "doc_terms": index["doc_terms"].copy(),
+        "max_tf": dict(index["max_tf"]),
+        "hosts": {host: set(doc_ids) for host, doc_ids in index["hosts"].items()},
+        "blocked": set(index["blocked"]),
+    }
+    if "expander" in index:
+        copied["expander"] = index["expander"].copy()
+    return copied
+
+def calculate_tf_idf(term_freq, doc_length, doc_freq, total_docs):
+    tf = term_freq / doc_length if doc_length else 0
+    idf = log(total_docs / (doc_freq + 1))
+    return tf * idf
+
+def _document_score(doc_id, query_words, postings, doc_lengths, doc_freqs, total_docs):
+    score = 0.0
     for word in query_words:
-        candidate_docs.update(inverted_index.get(word, []))
-    
-    # More flexible matching
-    results = []
-    for doc_id, doc_content in documents.items():
-        url = documents[doc_id][0]
-        
-        # Skip results from blocked domains
-        if any(domain in url for domain in BLOCKED_DOMAINS):
-            continue
+        positions = postings[word].get(doc_id)
+        if positions is not None:
+            score += calculate_tf_idf(len(positions), doc_lengths[doc_id], doc_freqs[word], total_docs)
+    return score
+
+def _is_blocked(url):
+    # Only while indexing; search uses the index's blocked set
+    return any(domain in url for domain in BLOCKED_DOMAINS)
 
-        doc_text = documents[doc_id][1]
-        doc_words = process_text(doc_content[1])
-        total_score = 0
-        
-        for word in query_words:
-            score = calculate_tf_idf(word, doc_words, inverted_index, len(documents))
-            total_score += score
-        
-        if total_score >= 0.001:
-            results.append({
-                 "doc_id": doc_id,
-                  "url": doc_content[0],
-                 "score": total_score
-            })
-    results.sort(key=lambda x: x["score"], reverse=True)
+def hit_order(hit):
+    """Sort key for (score, doc_id, url) hits: best first, ties by doc_id"""
+    return -hit[0], hit[1]
 
+def ranked_results(hits):
+    results = [{"doc_id": doc_id, "url": url, "score": score} for score, doc_id, url in hits]
     if results:
         max_score = results[0]["score"]
         if max_score > 0:
             for result in results:
                 # Convert to percentage, round to integer
                 result["score"] = round((result["score"] / max_score) * 100)
-    
-    results = results[:50]
     return results
 
+def normalize_query(query):
+    """Parse query (see query_parser.py) and reduce its words to processed terms.
+
+    Words that process to nothing are dropped, a word that splits into
+    several ("e-tron") stands for each of them, and groups left with a
+    single member are replaced by it. The result is hashable, and queries
+    that match the same way compare equal, so "The Tesla" and "tesla"
+    share a cache entry. None if nothing searchable is left.
+    """
+    tree = parse(query)
+    return None if tree is None else _normalize(tree)
+
+def _normalize(node):
+    kind, value = node
+    if kind == "word":
+        words = process_text(value)
+        return ("word", words[0]) if len(words) == 1 else _normalize_group("seq", [("word", word) for word in words])
+    if kind == "phrase":
+        words = tuple(process_text(value))
+        return ("phrase", words) if words else None
+    if kind == "site":
+        return node
+    if kind == "not":
+        child = _normalize(value)
+        return None if child is None else ("not", child)
+    return _normalize_group(kind, [_normalize(child) for child in value])
+
+def _normalize_group(kind, children):
+    flat = []
+    for child in children:
+        if child is None:
+            continue
+        # Side-by-side runs nest only where a word split into several
+        if kind == "seq" and child[0] == "seq":
+            flat.extend(child[1])
+        else:
+            flat.append(child)
+    if len(flat) <= 1:
+        return flat[0] if flat else None
+    return kind, tuple(flat)
+
+def query_expander(inverted_index, synonyms=None):
+    """The QueryExpander for the vocabulary of inverted_index, built on first
+    use (with synonyms, default expansion.SYNONYMS) and kept with the index.
+    add_document and delete_document keep it up to date."""
+    expander = inverted_index.get("expander")
+    if expander is None:
+        postings = inverted_index["postings"]
+        expander = QueryExpander({word: doc_freq(postings, word) for word in postings},
+                                 SYNONYMS if synonyms is None else synonyms)
+        inverted_index["expander"] = expander
+    return expander
+
+def query_terms(tree):
+    """Terms to score for a normalized query: its words and phrase words, except under NOT.
+
+    Terms that expansion added come after the query's own, so proximity
+    pairs up the words as typed first.
+    """
+    if tree is None:
+        return []
+    added = []
+    return _query_terms(tree, added) + added
+
+def _query_terms(node, added):
+    kind, value = node
+    if kind == "word":
+        return [value]
+    if kind == "phrase":
+        return list(value)
+    if kind == "alt":
+        for child in value[1:]:
+            added += _query_terms(child, added)
+        return _query_terms(value[0], added)
+    if kind in ("and", "or", "seq"):
+        return [term for child in value for term in _query_terms(child, added)]
+    return []
+
+def _doc_positions(postings, word, doc_ids):
+    """{doc_id: positions} of word for those doc_ids that contain it"""
+    if isinstance(postings, MappedPostings):
+        found = postings.positions(word, doc_ids)
+        if found is not None:
+            return found
+    word_postings = postings[word]
+    return {doc_id: word_postings[doc_id] for doc_id in doc_ids if doc_id in word_postings}
+
+def phrase_documents(inverted_index, phrase):
+    """doc_ids in which the words of phrase occur at consecutive positions.
+
+    Intersects the postings of the phrase words first, then their position
+    lists in each remaining document; document text is never scanned.
+    """
+    postings = inverted_index["postings"]
+    if any(word not in postings for word in phrase):
+        return set()
+    if isinstance(postings, MappedPostings):
+        matches = postings.phrase_documents(phrase)
+        if matches is not None:
+            return matches
+    positions = {word: postings[word] for word in set(phrase)}
+    doc_sets = sorted((word_postings.keys() for word_postings in positions.values()), key=len)
+    candidates = set(doc_sets[0]).intersection(*doc_sets[1:])
+    matches = set()
+    for doc_id in candidates:
+        # Phrase start positions consistent with every word seen so far
+        starts = set(positions[phrase[0]][doc_id])
+        for offset, word in enumerate(phrase[1:], 1):
+            starts.intersection_update(position - offset for position in positions[word][doc_id])
+            if not starts:
+                break
+        if starts:
+            matches.add(doc_id)
+    return matches
+
+def doc_freq(postings, word):
+    """Number of documents containing word, without decoding a mapped postings list"""
+    if isinstance(postings, MappedPostings):
+        return postings.doc_freq(word)
+    return len(postings.get(word, ()))
+
+def _word_documents(postings, word, candidates=None):
+    """doc_ids containing word, only among candidates unless that is None.
+
+    Probes from the smaller side: a few candidates are looked up in a long
+    postings list (on a mapped index, decoding only the blocks the skip
+    table points them to) instead of the list being read in full.
+    """
+    if word not in postings:
+        return set()
+    if isinstance(postings, MappedPostings):
+        found = postings.documents(word, candidates)
+        if found is not None:
+            return found
+    word_postings = postings[word]
+    if candidates is None:
+        return set(word_postings)
+    if len(candidates) < len(word_postings):
+        return {doc_id for doc_id in candidates if doc_id in word_postings}
+    return {doc_id for doc_id in word_postings if doc_id in candidates}
+
+def _site_hosts(inverted_index, domain):
+    return [doc_ids for host, doc_ids in inverted_index["hosts"].items()
+            if host == domain or host.endswith("." + domain)]
+
+def _optional(node):
+    # Plain words, and what expansion put in place of plain words
+    kind, value = node
+    if kind == "word":
+        return True
+    if kind == "alt":
+        return _optional(value[0])
+    if kind == "seq":
+        return all(_optional(child) for child in value)
+    return False
+
+def _seq_constraint(node):
+    # Side by side, everything but plain words must hold. The words only
+    # decide on their own, or when all that is required are exclusions.
+    words = tuple(child for child in node[1] if _optional(child))
+    required = tuple(child for child in node[1] if not _optional(child))
+    if not required:
+        return "or", words
+    if words and all(child[0] == "not" for child in required):
+        required = (("or", words),) + required
+    return "and", required
+
+def _restricts(node):
+    """False if node matches exactly the documents containing some query term,
+    which the scorers find on their own"""
+    if node[0] == "word":
+        return False
+    if node[0] in ("or", "seq", "alt"):
+        return any(_restricts(child) for child in node[1])
+    return True
+
+def _estimate(node, inverted_index):
+    """Upper bound on the number of documents matching node"""
+    kind, value = node
+    postings = inverted_index["postings"]
+    if kind == "word":
+        return doc_freq(postings, value)
+    if kind == "phrase":
+        return min(doc_freq(postings, word) for word in value)
+    if kind == "site":
+        return sum(len(doc_ids) for doc_ids in _site_hosts(inverted_index, value))
+    if kind in ("or", "alt"):
+        return sum(_estimate(child, inverted_index) for child in value)
+    if kind == "and":
+        return min((_estimate(child, inverted_index) for child in value if child[0] != "not"),
+                   default=len(inverted_index["doc_lengths"]))
+    if kind == "seq":
+        return _estimate(_seq_constraint(node), inverted_index)
+    return len(inverted_index["doc_lengths"])
+
+def match_query(tree, inverted_index, candidates=None):
+    """doc_ids matching a normalized query, only among candidates unless that is None.
+
+    AND evaluates its operands rarest first, each one only at the
+    documents that passed the ones before, so the work shrinks with the
+    most selective operand rather than growing with the longest list.
+    """
+    kind, value = tree
+    postings = inverted_index["postings"]
+    if kind == "seq":
+        return match_query(_seq_constraint(tree), inverted_index, candidates)
+    if kind == "word" or (kind == "phrase" and len(value) == 1):
+        return _word_documents(postings, value if kind == "word" else value[0], candidates)
+    if kind in ("phrase", "site"):
+        if kind == "phrase":
+            matches = phrase_documents(inverted_index, list(value))
+        else:
+            matches = set().union(*_site_hosts(inverted_index, value))
+        return matches if candidates is None else matches & candidates
+    if kind in ("or", "alt"):
+        return set().union(*(match_query(child, inverted_index, candidates) for child in value))
+    if kind == "not":
+        everything = set(inverted_index["doc_lengths"]) if candidates is None else candidates
+        return everything - match_query(value, inverted_index, candidates)
+
+    included = sorted((child for child in value if child[0] != "not"),
+                      key=lambda child: _estimate(child, inverted_index))
+    for child in included:
+        candidates = match_query(child, inverted_index, candidates)
+        if not candidates:
+            return set()
+    if candidates is None:
+        candidates = set(inverted_index["doc_lengths"])
+    for child in value:
+        if child[0] == "not" and candidates:
+            candidates = candidates - match_query(child[1], inverted_index, candidates)
+    return candidates
+
+def _closest_distance(first, second):
+    # Both position lists are sorted: walk them together
+    i = j = 0
+    best = None
+    while i < len(first) and j < len(second):
+        distance = abs(first[i] - second[j])
+        if best is None or distance < best:
+            best = distance
+        if first[i] < second[j]:
+            i += 1
+        else:
+            j += 1
+    return best
+
+def proximity_rerank(hits, words, postings):
+    """Boost hits whose documents have consecutive query words close together.
+
+    For each pair of consecutive distinct query words, a document gains
+    1 / (distance between their closest occurrences), so adjacent words
+    give the full PROXIMITY_WEIGHT. The score is multiplied by
+    1 + PROXIMITY_WEIGHT * (average gain over the pairs).
+    """
+    doc_ids = [doc_id for _, doc_id, _ in hits]
+    with stage("postings"):
+        positions = {word: _doc_positions(postings, word, doc_ids) for word in words}
+    pairs = list(zip(words, words[1:]))
+    reranked = []
+    for score, doc_id, url in hits:
+        gain = 0.0
+        for first, second in pairs:
+            first_positions = positions[first].get(doc_id)
+            second_positions = positions[second].get(doc_id)
+            if first_positions and second_positions:
+                gain += 1 / max(1, _closest_distance(first_positions, second_positions))
+        reranked.append((score * (1 + PROXIMITY_WEIGHT * gain / len(pairs)), doc_id, url))
+    with stage("sort"):
+        reranked.sort(key=hit_order)
+    return reranked
+
+def plan_query(query, inverted_index, top_k):
+    """(terms, allowed, depth) for scoring query, see rank_query"""
+    with stage("tokenize"):
+        tree = query_expander(inverted_index).expand(normalize_query(query))
+        terms = query_terms(tree)
+    with stage("postings"):
+        allowed = match_query(tree, inverted_index) if tree is not None and _restricts(tree) else None
+    depth = max(top_k, PROXIMITY_DEPTH) if len(_proximity_words(terms, inverted_index)) > 1 else top_k
+    return terms, allowed, depth
+
+def finish_query(terms, hits, inverted_index, top_k):
+    """Rerank scored hits by proximity and format the top_k, see rank_query"""
+    words = _proximity_words(terms, inverted_index)
+    if len(words) > 1:
+        with stage("score"):
+            hits = proximity_rerank(hits, words, inverted_index["postings"])
+    with stage("sort"):
+        return ranked_results(hits[:top_k])
+
+def _proximity_words(terms, inverted_index):
+    return [word for word in dict.fromkeys(terms) if word in inverted_index["postings"]]
+
+def rank_query(query, inverted_index, top_k, top_hits):
+    """Run query through a scorer and apply its filters and proximity.
+
+    top_hits(terms, depth, allowed) must return the best depth
+    (score, doc_id, url) hits for terms, sorted by hit_order, counting
+    only doc_ids in allowed unless allowed is None. Multi-word queries
+    take the best PROXIMITY_DEPTH hits (at least top_k) and rerank them by
+    proximity, so every page of results is cut from the same ranking.
+    """
+    if top_k <= 0:
+        return []
+    terms, allowed, depth = plan_query(query, inverted_index, top_k)
+    with stage("score"):
+        hits = top_hits(terms, depth, allowed)
+    return finish_query(terms, hits, inverted_index, top_k)
+
+def search(query, documents, inverted_index, top_k=MAX_RESULTS):
+    """Return the top_k documents for query, best first.
+
+    query may use the syntax in query_parser.py: quoted phrases, AND, OR,
+    NOT or -word, parentheses and site:host. Documents with the query
+    words close together rank higher (see rank_query).
+    """
+    return rank_query(query, inverted_index, top_k,
+                      lambda terms, depth, allowed: _max_score_hits(terms, documents, inverted_index, depth, allowed))
+
+def search_exhaustive(query, documents, inverted_index, top_k=MAX_RESULTS):
+    """Score every matching document; the reference that search() must agree with"""
+    return rank_query(query, inverted_index, top_k,
+                      lambda terms, depth, allowed: _exhaustive_hits(terms, documents, inverted_index, depth, allowed))
+
+def _max_score_hits(terms, documents, inverted_index, top_k, allowed):
+    """Top hits by TF-IDF with MaxScore pruning.
+
+    Query terms are visited from the highest score upper bound down, and
+    every document met is scored in full. Once the bounds of the terms
+    left cannot lift an unseen document past the current k-th best score,
+    the rest of the postings are skipped. The result is the same as
+    scoring every matching document.
+    """
+    query_words = [word for word in terms if word in inverted_index["postings"]]
+    postings = inverted_index["postings"]
+    doc_lengths = inverted_index["doc_lengths"]
+    max_tf = inverted_index["max_tf"]
+    blocked = inverted_index["blocked"]
+    total_docs = len(documents)
+
+    doc_freqs = {word: doc_freq(postings, word) for word in query_words}
+    with stage("postings"):
+        if allowed is not None and len(allowed) < sum(doc_freqs.values()):
+            # The filter passes fewer documents than the postings hold: score
+            # those, fetching only their postings
+            word_postings = {word: _doc_positions(postings, word, allowed) for word in doc_freqs}
+        else:
+            word_postings = {word: postings[word] for word in doc_freqs}
+
+    # A word repeated in the query counts once per occurrence. Words with a
+    # negative idf can only lower a score, so their bound is 0.
+    bounds = defaultdict(float)
+    for word in query_words:
+        bounds[word] += max(0.0, calculate_tf_idf(max_tf[word], 1, doc_freqs[word], total_docs))
+    words = sorted(bounds, key=bounds.get, reverse=True)
+    remaining = [0.0] * (len(words) + 1)
+    for i in range(len(words) - 1, -1, -1):
+        remaining[i] = remaining[i + 1] + bounds[words[i]]
+
+    # Min-heap of the best (score, inverted doc_id) pairs found so far
+    heap = []
+    scored = set()
+    threshold = MIN_SCORE
+    for i, word in enumerate(words):
+        # A document not scored yet only appears under words[i:]
+        if remaining[i] < threshold:
+            break
+        for doc_id in word_postings[word]:
+            if doc_id in scored:
+                continue
+            scored.add(doc_id)
+            if allowed is not None and doc_id not in allowed:
+                continue
+            score = _document_score(doc_id, query_words, word_postings, doc_lengths, doc_freqs, total_docs)
+            if score < threshold or doc_id in blocked:
+                continue
+            entry = (score, _Descending(doc_id))
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            else:
+                heapq.heappushpop(heap, entry)
+            if len(heap) == top_k:
+                threshold = max(MIN_SCORE, heap[0][0])
+
+    with stage("sort"):
+        top = sorted(heap, reverse=True)
+    return [(score, entry.value, documents[entry.value][0]) for score, entry in top]
+
+def _exhaustive_hits(terms, documents, inverted_index, top_k, allowed):
+    postings = inverted_index["postings"]
+    doc_lengths = inverted_index["doc_lengths"]
+    total_docs = len(documents)
+
+    scores = defaultdict(float)
+    for word in terms:
+        word_postings = postings.get(word)
+        if not word_postings:
+            continue
+        frequency = len(word_postings)
+        for doc_id, positions in word_postings.items():
+            scores[doc_id] += calculate_tf_idf(len(positions), doc_lengths[doc_id], frequency, total_docs)
+
+    blocked = inverted_index["blocked"]
+    hits = [(score, doc_id, documents[doc_id][0]) for doc_id, score in scores.items()
+            if score >= MIN_SCORE and (allowed is None or doc_id in allowed) and doc_id not in blocked]
+    hits.sort(key=hit_order)
+    return hits[:top_k]
+
+class _Descending:
+    """Wraps a doc_id so that heap ties between equal scores keep the smaller doc_id"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+def data_fingerprint():
+    # Changes whenever a document is added, removed or rewritten in DATA_DIR,
+    # or analysis changes the terms documents are indexed under
+    digest = hashlib.sha256(ANALYZER.signature)
+    for filename in sorted(os.listdir(DATA_DIR)):
+        if filename.endswith(".txt"):
+            stat = os.stat(os.path.join(DATA_DIR, filename))
+            digest.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.digest()
+
+def save_index(index, documents, fingerprint, path=INDEX_FILE, documents_path=DOCUMENTS_FILE):
+    """Write the index to path and the document bodies to documents_path"""
+    save_documents(documents, fingerprint, documents_path)
+    doc_ids = list(index["doc_lengths"])
+    doc_numbers = {doc_id: number for number, doc_id in enumerate(doc_ids)}
+    terms = sorted(index["postings"])
+    term_numbers = {term: number for number, term in enumerate(terms)}
+
+    doc_table = bytearray()
+    for doc_id in doc_ids:
+        doc_terms = index["doc_terms"][doc_id]
+        doc_table += pack_string(doc_id)
+        doc_table += struct.pack("<II", index["doc_lengths"][doc_id], len(doc_terms))
+        doc_table += struct.pack(f"<{len(doc_terms)}I", *(term_numbers[term] for term in doc_terms))
+
+    postings_data = bytearray()
+    term_dict = bytearray()
+    for term in terms:
+        word_postings = index["postings"][term]
+        term_dict += pack_string(term)
+        term_dict += struct.pack("<QId", len(postings_data), len(word_postings), index["max_tf"][term])
+        entries = sorted((doc_numbers[doc_id], positions) for doc_id, positions in word_postings.items())
+        postings_data += encode_postings([number for number, _ in entries],
+                                         [len(positions) for _, positions in entries],
+                                         [position for _, positions in entries for position in positions])
+
+    header = struct.pack(HEADER_FORMAT, INDEX_MAGIC, INDEX_VERSION, fingerprint, len(doc_ids), len(terms))
+
+    # Write next to the old file and swap it in, so a running process that
+    # still maps the old index keeps reading a complete file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(doc_table)
+        f.write(term_dict)
+        f.write(postings_data)
+    os.replace(tmp_path, path)
+
+class _MappedTable(MutableMapping):
+    """Mapping over entries of a memory-mapped index file.
+
+    Entries are decoded on access. Writes go to an in-memory overlay, so
+    incremental updates work on a mapped index without rewriting the file.
+    """
+
+    def __init__(self, buffer, offsets):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._overlay = {}
+        self._removed = set()
+
+    def _decode(self, entry):
+        raise NotImplementedError
+
+    def _copy_value(self, value):
+        return value
+
+    def copy(self):
+        """A table over the same file whose writes do not show in this one"""
+        table = object.__new__(type(self))
+        table.__dict__.update(self.__dict__)
+        table._overlay = {key: self._copy_value(value) for key, value in self._overlay.items()}
+        table._removed = set(self._removed)
+        return table
+
+    def __getitem__(self, key):
+        if key in self._overlay:
+            return self._overlay[key]
+        if key in self._removed or key not in self._offsets:
+            raise KeyError(key)
+        return self._decode(self._offsets[key])
+
+    def __setitem__(self, key, value):
+        self._overlay[key] = value
+        self._removed.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._overlay.pop(key, None)
+        if key in self._offsets:
+            self._removed.add(key)
+
+    def __contains__(self, key):
+        if key in self._overlay:
+            return True
+        return key in self._offsets and key not in self._removed
+
+    def __iter__(self):
+        for key in self._offsets:
+            if key not in self._removed and key not in self._overlay:
+                yield key
+        yield from self._overlay
+
+    def __len__(self):
+        added = sum(1 for key in self._overlay if key not in self._offsets)
+        return len(self._offsets) - len(self._removed) + added
+
+class MappedPostings(_MappedTable):
+    """word -> {doc_id: [positions]}"""
+
+    def __init__(self, buffer, offsets, doc_ids):
+        super().__init__(buffer, offsets)
+        self.doc_ids = doc_ids
+        self._doc_numbers = {doc_id: number for number, doc_id in enumerate(doc_ids)}
+
+    def reader(self, word):
+        """PostingsReader over the word's saved postings (doc numbers index
+        doc_ids), or None if the word is missing or was changed since loading"""
+        if word in self._overlay or word in self._removed or word not in self._offsets:
+            return None
+        return PostingsReader(self._buffer, *self._offsets[word])
+
+    def doc_freq(self, word):
+        """Number of documents containing word"""
+        if word in self._overlay or word in self._removed or word not in self._offsets:
+            return len(self[word]) if word in self else 0
+        return self._offsets[word][1]
+
+    def _decode_for(self, reader, doc_numbers, with_positions=True):
+        """Decode the blocks of reader that may hold doc_numbers, or the
+        whole list if that is most of it"""
+        blocks = np.unique(np.searchsorted(reader.last_docs, doc_numbers)).tolist()
+        if blocks and blocks[-1] == reader.num_blocks:
+            blocks.pop()
+        if 2 * len(blocks) >= reader.num_blocks:
+            return reader.decode(with_positions)
+        empty = np.zeros(0, dtype=np.int64)
+        if not blocks:
+            return empty, empty, (empty if with_positions else None)
+        parts = [reader.decode_block(block, with_positions) for block in blocks]
+        doc_numbers, tfs = (np.concatenate([part[i] for part in parts]) for i in range(2))
+        return doc_numbers, tfs, np.concatenate([part[2] for part in parts]) if with_positions else None
+
+    def documents(self, word, doc_ids=None):
+        """doc_ids containing word, or those of doc_ids that do, decoding
+        only the blocks they fall in; None if word was changed since loading"""
+        reader = self.reader(word)
+        if reader is None:
+            return None
+        if doc_ids is None:
+            found = reader.decode(with_positions=False)[0]
+        else:
+            wanted = np.array(sorted(self._doc_numbers[doc_id] for doc_id in doc_ids if doc_id in self._doc_numbers),
+                              dtype=np.int64)
+            doc_numbers = self._decode_for(reader, wanted, with_positions=False)[0]
+            found = wanted[np.isin(wanted, doc_numbers, assume_unique=True)]
+        doc_ids = self.doc_ids
+        return {doc_ids[doc_number] for doc_number in found.tolist()}
+
+    def positions(self, word, doc_ids):
+        """{doc_id: positions} of word for those doc_ids that contain it,
+        decoding only the blocks they fall in; None if word was changed
+        since loading"""
+        reader = self.reader(word)
+        if reader is None:
+            return None
+        wanted = [(self._doc_numbers[doc_id], doc_id) for doc_id in doc_ids if doc_id in self._doc_numbers]
+        doc_numbers, tfs, positions = self._decode_for(reader, [doc_number for doc_number, _ in wanted])
+        ends = np.cumsum(tfs)
+        found = {}
+        for doc_number, doc_id in wanted:
+            i = int(np.searchsorted(doc_numbers, doc_number))
+            if i < len(doc_numbers) and doc_numbers[i] == doc_number:
+                found[doc_id] = positions[ends[i] - tfs[i]:ends[i]].tolist()
+        return found
+
+    def phrase_documents(self, phrase):
+        """doc_ids with the words of phrase at consecutive positions, by
+        intersecting (doc number, position - offset) keys of the words,
+        rarest first; None if a word was changed since loading"""
+        readers = [self.reader(word) for word in phrase]
+        if any(reader is None for reader in readers):
+            return None
+        order = sorted(range(len(phrase)), key=lambda offset: readers[offset].doc_freq)
+        common = None
+        keys = None
+        for offset in order:
+            reader = readers[offset]
+            if common is None:
+                doc_numbers, tfs, positions = reader.decode()
+            else:
+                doc_numbers, tfs, positions = self._decode_for(reader, common.tolist())
+            word_keys = (np.repeat(doc_numbers, tfs) << 32) + positions - offset
+            keys = word_keys if keys is None else np.intersect1d(keys, word_keys, assume_unique=True)
+            common = np.unique(keys >> 32)
+            if not len(common):
+                return set()
+        return {self.doc_ids[doc_number] for doc_number in common.tolist()}
+
+    def _copy_value(self, word_postings):
+        # Updates change a word's postings dict in place
+        return dict(word_postings)
+
+    def _decode(self, entry):
+        doc_numbers, tfs, positions = PostingsReader(self._buffer, *entry).decode()
+        positions = positions.tolist()
+        doc_ids = self.doc_ids
+        word_postings = {}
+        start = 0
+        for doc_number, end in zip(doc_numbers.tolist(), np.cumsum(tfs).tolist()):
+            word_postings[doc_ids[doc_number]] = positions[start:end]
+            start = end
+        return word_postings
+
+class MappedDocTerms(_MappedTable):
+    """doc_id -> [terms]"""
+
+    def __init__(self, buffer, offsets, terms):
+        super().__init__(buffer, offsets)
+        self._terms = terms
+
+    def _decode(self, entry):
+        offset, count = entry
+        return [self._terms[number] for number in struct.unpack_from(f"<{count}I", self._buffer, offset)]
+
+def build_index_files(path=INDEX_FILE, documents_path=DOCUMENTS_FILE, workers=None):
+    """Index DATA_DIR from scratch and save it; returns the fingerprint to load it with"""
+    fingerprint = data_fingerprint()
+    documents, index = load_and_index_documents(workers)
+    save_index(index, documents, fingerprint, path, documents_path)
+    return fingerprint
+
+def load_index(fingerprint, path=INDEX_FILE, documents_path=DOCUMENTS_FILE):
+    """Map a saved index and document store, or return None if either is missing, stale or from another format version"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+    if len(buffer) < struct.calcsize(HEADER_FORMAT):
+        return None
+    magic, version, saved_fingerprint, num_docs, num_terms = struct.unpack_from(HEADER_FORMAT, buffer, 0)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION or saved_fingerprint != fingerprint:
+        return None
+    offset = struct.calcsize(HEADER_FORMAT)
+    # Bodies stay on disk; search only needs the URLs
+    documents = load_documents_store(fingerprint, documents_path)
+    if documents is None:
+        return None
+
+    doc_ids = []
+    doc_lengths = {}
+    doc_term_offsets = {}
+    for _ in range(num_docs):
+        doc_id, offset = unpack_string(buffer, offset)
+        doc_lengths[doc_id], term_count = struct.unpack_from("<II", buffer, offset)
+        offset += 8
+        doc_term_offsets[doc_id] = (offset, term_count)
+        offset += 4 * term_count
+        doc_ids.append(doc_id)
+
+    term_offsets = {}
+    max_tf = {}
+    for _ in range(num_terms):
+        term, offset = unpack_string(buffer, offset)
+        postings_offset, doc_freq, max_tf[term] = struct.unpack_from("<QId", buffer, offset)
+        term_offsets[term] = (postings_offset, doc_freq)
+        offset += 20
+
+    # Postings offsets are stored relative to the start of their section,
+    # and each term's postings end where the next term's begin
+    ends = [postings_offset + offset for postings_offset, _ in term_offsets.values()][1:] + [len(buffer)]
+    for (term, (postings_offset, doc_freq)), end in zip(term_offsets.items(), ends):
+        term_offsets[term] = (postings_offset + offset, doc_freq, end)
+
+    hosts = {}
+    blocked = set()
+    for doc_id in doc_ids:
+        url = documents[doc_id][0]
+        hosts.setdefault(_url_host(url), set()).add(doc_id)
+        if _is_blocked(url):
+            blocked.add(doc_id)
+
+    return documents, {
+        "postings": MappedPostings(buffer, term_offsets, doc_ids),
+        "doc_lengths": doc_lengths,
+        "doc_terms": MappedDocTerms(buffer, doc_term_offsets, list(term_offsets)),
+        "max_tf": max_tf,
+        "hosts": hosts,
+        "blocked": blocked,
+    }
+
 if __name__ == "__main__":
     print("\n🚀 STARTING INDEXER DIAGNOSTIC...")
     
@@ -149,7 +996,7 @@ if __name__ == "__main__":
     # 2. Test Indexing
     print("   Building index...", end=" ")
     index = build_inverted_index(docs)
-    print(f"✅ Done. ({len(index)} unique terms mapped)")
+    print(f"✅ Done. ({len(index['postings'])} unique terms mapped)")
 
     # 3. Test Search
     test_q = "electric"
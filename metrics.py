@@ -0,0 +1,176 @@
+import os
+import sys
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+STAGES = ("tokenize", "postings", "score", "sort", "render")
+SAMPLE_INTERVAL = 0.005
+# Distinct stacks written out per slow query
+SLOW_QUERY_STACKS = 5
+
+_local = threading.local()
+
+
+class Histogram:
+    """Prometheus-style histogram: counts per bucket, sum and count"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def lines(self, name, labels=""):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        prefix = labels + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+        braces = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{braces} {total}")
+        lines.append(f"{name}_count{braces} {cumulative}")
+        return lines
+
+
+@contextmanager
+def stage(name):
+    """Charge the time spent inside to stage name of the query being timed
+    on this thread, if any. Time in a nested stage goes to that one only."""
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        yield
+        return
+    outer = _local.stage
+    now = time.perf_counter()
+    if outer is not None:
+        timings[outer] += now - _local.since
+    _local.stage, _local.since = name, now
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        timings[name] += now - _local.since
+        _local.stage, _local.since = outer, now
+
+
+class SearchMetrics:
+    """Latency histograms of whole searches and of each stage in STAGES"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.stages = {name: Histogram() for name in STAGES}
+
+    @contextmanager
+    def timed(self):
+        """Time one search on this thread; stage() calls inside add to it"""
+        _local.timings = timings = defaultdict(float)
+        _local.stage = None
+        started = time.perf_counter()
+        try:
+            yield timings
+        finally:
+            _local.timings = None
+            self.latency.observe(time.perf_counter() - started)
+            for name, seconds in timings.items():
+                self.stages[name].observe(seconds)
+
+    def lines(self):
+        lines = ["# HELP mobisearch_search_seconds Time to answer a search request",
+                 "# TYPE mobisearch_search_seconds histogram"]
+        lines += self.latency.lines("mobisearch_search_seconds")
+        lines += ["# HELP mobisearch_search_stage_seconds Time spent in each stage of a search request",
+                  "# TYPE mobisearch_search_stage_seconds histogram"]
+        for name, histogram in self.stages.items():
+            lines += histogram.lines("mobisearch_search_stage_seconds", f'stage="{name}"')
+        return lines
+
+
+def exposition(search_metrics, values):
+    """Prometheus text format for search_metrics and for values, a list
+    of (name, "counter" or "gauge", help, value)"""
+    lines = search_metrics.lines()
+    for name, kind, help_text, value in values:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def _stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}")
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+class SlowQueryProfiler:
+    """Samples the stack of every thread inside profile() and logs the
+    samples of those that took threshold seconds or more.
+
+    One daemon thread takes the samples every interval seconds, while at
+    least one query is being profiled.
+    """
+
+    def __init__(self, threshold, interval=SAMPLE_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._sample, name="slow-query-profiler", daemon=True)
+        self.thread.start()
+
+    def _sample(self):
+        while True:
+            self.wake.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for thread_id, samples in self.active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_stack(frame)] += 1
+                if not self.active:
+                    self.wake.clear()
+
+    @contextmanager
+    def profile(self, label):
+        thread_id = threading.get_ident()
+        samples = Counter()
+        with self.lock:
+            self.active[thread_id] = samples
+            self.wake.set()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                del self.active[thread_id]
+            if elapsed >= self.threshold:
+                self._report(label, elapsed, samples)
+
+    def _report(self, label, elapsed, samples):
+        lines = [f"Slow query {label!r}: {elapsed * 1000:.1f} ms, {sum(samples.values())} stack samples"]
+        for stack, count in samples.most_common(SLOW_QUERY_STACKS):
+            lines.append(f"  {count} samples:")
+            lines += [f"    {frame}" for frame in stack]
+        logger.warning("\n".join(lines))
@@ -0,0 +1,166 @@
+import struct
+from bisect import bisect_left
+
+import numpy as np
+
+# A term's postings are sorted by doc number and cut into blocks of
+# BLOCK_SIZE postings. Layout of one term (little endian):
+#   header      block count, byte lengths of the doc and tf sections
+#   skip table  per block: last doc number, and where the block starts in
+#               each of the three sections
+#   sections    doc number gaps, tfs, position gaps, each as varints
+# Position gaps restart at every document. Keeping each section
+# contiguous lets a whole list decode in a few array operations, while
+# the skip table lets a single block decode on its own.
+BLOCK_SIZE = 128
+TERM_HEADER = struct.Struct("<III")
+SKIP_ENTRY = struct.Struct("<IIII")
+# Shorter inputs decode faster in a plain loop than through NumPy
+SMALL_VARINTS = 64
+
+
+def encode_varints(values):
+    """LEB128 varints of non-negative integers below 2^35"""
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    for bits in (7, 14, 21, 28):
+        sizes += values >= (1 << bits)
+    starts = np.cumsum(sizes) - sizes
+    out = np.zeros(int(sizes.sum()), dtype=np.uint8)
+    for byte in range(5):
+        has_byte = sizes > byte
+        if not has_byte.any():
+            break
+        chunk = (values[has_byte] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        # Every byte but the last of a value has the continuation bit set
+        more = (sizes[has_byte] > byte + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[has_byte] + byte] = chunk | more
+    return out.tobytes()
+
+
+def decode_varints(data):
+    """Inverse of encode_varints; data is any bytes-like object"""
+    if len(data) < SMALL_VARINTS:
+        values = []
+        value = shift = 0
+        for byte in bytes(data):
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                values.append(value)
+                value = shift = 0
+            else:
+                shift += 7
+        return np.array(values, dtype=np.int64)
+    data = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty(len(ends), dtype=np.int64)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    shifts = np.arange(len(data), dtype=np.int64) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.int64) << (7 * shifts)
+    return np.add.reduceat(parts, starts)
+
+
+def encode_postings(doc_numbers, tfs, positions):
+    """Encode one term's postings.
+
+    doc_numbers must be increasing; positions holds each document's
+    increasing positions back to back, tfs[i] of them for document i.
+    """
+    doc_numbers = np.asarray(doc_numbers, dtype=np.int64)
+    tfs = np.asarray(tfs, dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.int64)
+    position_starts = np.concatenate(([0], np.cumsum(tfs)))
+
+    doc_gaps = np.diff(doc_numbers, prepend=0)
+    position_gaps = np.diff(positions, prepend=0)
+    # The first position of every document is stored as is
+    first_positions = position_starts[:-1][tfs > 0]
+    position_gaps[first_positions] = positions[first_positions]
+
+    num_blocks = -(-len(doc_numbers) // BLOCK_SIZE)
+    skips = bytearray()
+    sections = [bytearray(), bytearray(), bytearray()]
+    for block in range(num_blocks):
+        start = block * BLOCK_SIZE
+        end = min(start + BLOCK_SIZE, len(doc_numbers))
+        skips += SKIP_ENTRY.pack(int(doc_numbers[end - 1]), *(len(section) for section in sections))
+        # The first gap of a block is taken from the previous block's last doc
+        sections[0] += encode_varints(doc_gaps[start:end])
+        sections[1] += encode_varints(tfs[start:end])
+        sections[2] += encode_varints(position_gaps[position_starts[start]:position_starts[end]])
+    docs, block_tfs, block_positions = (bytes(section) for section in sections)
+    return TERM_HEADER.pack(num_blocks, len(docs), len(block_tfs)) + bytes(skips) + docs + block_tfs + block_positions
+
+
+class PostingsReader:
+    """Decodes one term's postings from a buffer written by encode_postings"""
+
+    __slots__ = ("buffer", "doc_freq", "num_blocks", "last_docs", "starts", "sections")
+
+    def __init__(self, buffer, offset, doc_freq, end):
+        self.buffer = buffer
+        self.doc_freq = doc_freq
+        self.num_blocks, docs_length, tfs_length = TERM_HEADER.unpack_from(buffer, offset)
+        offset += TERM_HEADER.size
+        skips = struct.unpack_from(f"<{4 * self.num_blocks}I", buffer, offset)
+        self.last_docs = skips[0::4]
+        # Per section: block start offsets, then the section end
+        offset += SKIP_ENTRY.size * self.num_blocks
+        docs_end = offset + docs_length
+        tfs_end = docs_end + tfs_length
+        self.sections = ((offset, docs_end), (docs_end, tfs_end), (tfs_end, end))
+        self.starts = (skips[1::4], skips[2::4], skips[3::4])
+
+    def _section(self, section, block=None):
+        start, end = self.sections[section]
+        if block is None:
+            return self.buffer[start:end]
+        starts = self.starts[section]
+        block_end = start + starts[block + 1] if block + 1 < self.num_blocks else end
+        return self.buffer[start + starts[block]:block_end]
+
+    def _decode(self, block, with_positions):
+        doc_numbers = np.cumsum(decode_varints(self._section(0, block)))
+        if block:
+            doc_numbers += self.last_docs[block - 1]
+        tfs = decode_varints(self._section(1, block))
+        if not with_positions:
+            return doc_numbers, tfs, None
+        return doc_numbers, tfs, _positions(decode_varints(self._section(2, block)), tfs)
+
+    def decode(self, with_positions=True):
+        """(doc numbers, tfs, positions or None) of the whole list.
+
+        positions holds each document's positions back to back, tfs[i] of
+        them for document i.
+        """
+        return self._decode(None, with_positions)
+
+    def decode_block(self, block, with_positions=True):
+        """(doc numbers, tfs, positions or None) of one block"""
+        return self._decode(block, with_positions)
+
+    def find_block(self, doc_number):
+        """Index of the first block that may hold doc_number or a later doc, or num_blocks"""
+        return bisect_left(self.last_docs, doc_number)
+
+    def tf(self, doc_number):
+        """tf of doc_number in this list, or 0, decoding only the block it would be in"""
+        block = self.find_block(doc_number)
+        if block == self.num_blocks:
+            return 0
+        doc_numbers, tfs, _ = self.decode_block(block, with_positions=False)
+        i = np.searchsorted(doc_numbers, doc_number)
+        if i < len(doc_numbers) and doc_numbers[i] == doc_number:
+            return int(tfs[i])
+        return 0
+
+
+def _positions(gaps, tfs):
+    # Prefix sums over all the gaps, then rebase each document's run
+    totals = np.cumsum(gaps)
+    ends = np.cumsum(tfs)
+    before = np.zeros(len(tfs), dtype=np.int64)
+    before[1:] = totals[ends[:-1] - 1]
+    return totals - np.repeat(before, tfs)
@@ -0,0 +1,115 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+from indexer import normalize_query, search, MAX_RESULTS
+
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+CACHE_TTL = 600
+
+
+def query_key(query):
+    """Normalized query, so "The Tesla" and "tesla" share an entry"""
+    return normalize_query(query)
+
+
+def _result_bytes(results):
+    size = sys.getsizeof(results)
+    for result in results:
+        size += sys.getsizeof(result)
+        size += sum(sys.getsizeof(value) for value in result.values())
+    return size
+
+
+class QueryCache:
+    """LRU cache of search results with a TTL and a memory cap.
+
+    Entries hold the top k results for a query. A later request for fewer
+    results is served from the prefix, since the top n of the top k are
+    the top n. invalidate() drops everything and bumps the version, and
+    must be called whenever the index changes.
+    """
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, top_k):
+        """Cached results for key, or None if missing, expired or too short"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                results, cached_k, expires, size = entry
+                if expires < time.monotonic():
+                    self._remove(key)
+                # Fewer than cached_k results means the query has no more
+                elif top_k <= cached_k or len(results) < cached_k:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return results[:top_k]
+            self.misses += 1
+            return None
+
+    def put(self, key, top_k, results, version):
+        """Store results computed against index version"""
+        size = _result_bytes(results)
+        with self.lock:
+            # The index changed while these results were being computed
+            if version != self.version or size > self.max_bytes:
+                return
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (results, top_k, time.monotonic() + self.ttl, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        self.bytes -= self.entries.pop(key)[3]
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.version += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "version": self.version,
+            }
+
+
+def cached_search(cache, query, documents, inverted_index, top_k=MAX_RESULTS, search_function=None, version=None):
+    """search() through the cache; search_function(query, top_k) replaces it if given.
+
+    version, if given, identifies the index searched (e.g. Snapshot.version):
+    results are only shared between searches of the same version, so a
+    request still reading an old index never fills or reads entries of a
+    newer one.
+    """
+    key = query_key(query) if version is None else (version, query_key(query))
+    results = cache.get(key, top_k)
+    if results is None:
+        # Bumped by invalidate(); put() drops results computed before it
+        generation = cache.version
+        if search_function is None:
+            results = search(query, documents, inverted_index, top_k)
+        else:
+            results = search_function(query, top_k)
+        cache.put(key, top_k, results, generation)
+    # Callers get their own dicts, so the cached entry cannot be modified
+    return [dict(result) for result in results]
@@ -0,0 +1,105 @@
+import re
+
+# Query syntax:
+#   tesla battery                plain words: any may match, all are scored
+#   "solid state battery"        phrase: must occur, words scored
+#   -model, NOT model            exclusion
+#   site:en.wikipedia.org        only pages on that host or its subdomains
+#   tesla AND supercharger       both required
+#   tesla OR ford                either
+#   (tesla OR ford) AND battery  grouping
+# Operators are upper case, so "and", "or", "not" stay ordinary (stop) words.
+# Within a run of items without operators, phrases, exclusions, site:
+# filters and groups are required, and the plain words only decide which
+# documents match if there is nothing else to require.
+TOKEN = re.compile(r'\s*(-?)(?:"([^"]*)"?|(\()|(\))|site:(\S+)|([^\s()"]+))')
+
+
+def _tokens(query):
+    for match in TOKEN.finditer(query):
+        negated, phrase, open_paren, close_paren, site, word = match.groups()
+        if phrase is not None:
+            yield negated, "phrase", phrase
+        elif open_paren:
+            yield negated, "(", None
+        elif close_paren:
+            yield "", ")", None
+        elif site is not None:
+            yield negated, "site", site.lower()
+        elif word in ("AND", "OR", "NOT") and not negated:
+            yield "", word, None
+        elif word.strip("-"):
+            yield negated, "word", word
+
+
+class _Parser:
+    def __init__(self, query):
+        self.tokens = list(_tokens(query))
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i][1] if self.i < len(self.tokens) else None
+
+    def parse(self):
+        node = self.parse_or()
+        # A stray ")" ends the expression early; parse what follows too
+        while self.i < len(self.tokens):
+            self.i += 1
+            rest = self.parse_or()
+            if rest is not None:
+                node = rest if node is None else ("seq", [node, rest])
+        return node
+
+    def parse_or(self):
+        children = self._collect(self.parse_and, "OR")
+        return children[0] if len(children) == 1 else ("or", children) if children else None
+
+    def parse_and(self):
+        children = self._collect(self.parse_seq, "AND")
+        return children[0] if len(children) == 1 else ("and", children) if children else None
+
+    def _collect(self, parse_operand, operator):
+        children = []
+        while True:
+            child = parse_operand()
+            if child is not None:
+                children.append(child)
+            if self.peek() != operator:
+                return children
+            self.i += 1
+
+    def parse_seq(self):
+        children = []
+        while self.peek() not in (None, ")", "AND", "OR"):
+            child = self.parse_unary()
+            if child is not None:
+                children.append(child)
+        return children[0] if len(children) == 1 else ("seq", children) if children else None
+
+    def parse_unary(self):
+        negated, kind, value = self.tokens[self.i]
+        self.i += 1
+        if kind == "NOT":
+            if self.peek() in (None, ")", "AND", "OR"):
+                return None
+            child = self.parse_unary()
+            return None if child is None else ("not", child)
+        if kind == "(":
+            child = self.parse_or()
+            if self.peek() == ")":
+                self.i += 1
+        else:
+            child = (kind, value)
+        if child is None:
+            return None
+        return ("not", child) if negated else child
+
+
+def parse(query):
+    """Parse a query into a tree of tuples, or None if it is empty.
+
+    Leaves are ("word", text), ("phrase", text) and ("site", host); inner
+    nodes are ("and", children), ("or", children), ("seq", children) for
+    items written side by side, and ("not", child).
+    """
+    return _Parser(query).parse()
@@ -0,0 +1,60 @@
+import threading
+from contextlib import contextmanager
+
+
+class Snapshot:
+    """Everything a search reads: documents, index, matrix and suggester.
+
+    Never modified once published, except that the suggester's past
+    queries are refreshed in place (Suggester.refresh_queries); a rebuild
+    publishes a new one.
+    """
+
+    def __init__(self, documents, index, matrix=None, suggester=None):
+        self.documents = documents
+        self.index = index
+        self.matrix = matrix
+        self.suggester = suggester
+        self.version = 0
+        self.readers = 0
+        self.retired = False
+
+    def close(self):
+        if self.matrix is not None:
+            self.matrix.close()
+
+
+class SnapshotHolder:
+    """The published Snapshot, replaced atomically by publish().
+
+    Requests read through acquire(), which pins the snapshot that was
+    current when they started, so a request never mixes two snapshots. A
+    replaced snapshot is closed once its last reader is done.
+    """
+
+    def __init__(self, snapshot):
+        self.lock = threading.Lock()
+        self.current = snapshot
+
+    @contextmanager
+    def acquire(self):
+        with self.lock:
+            snapshot = self.current
+            snapshot.readers += 1
+        try:
+            yield snapshot
+        finally:
+            with self.lock:
+                snapshot.readers -= 1
+                done = snapshot.retired and not snapshot.readers
+            if done:
+                snapshot.close()
+
+    def publish(self, snapshot):
+        with self.lock:
+            old, self.current = self.current, snapshot
+            snapshot.version = old.version + 1
+            old.retired = True
+            done = not old.readers
+        if done:
+            old.close()
@@ -0,0 +1,168 @@
+import os
+import threading
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+from indexer import doc_freq
+
+SUGGESTIONS = 8
+# Prefixes with more completions than this have their best ones stored
+# up front, so no lookup ranks more than this many entries
+PRECOMPUTED_OVER = 256
+MAX_LOGGED_QUERIES = 10_000
+MAX_QUERY_LENGTH = 100
+# Search counts of past queries, kept across restarts
+QUERY_LOG_FILE = "query_log.tsv"
+
+
+def _after(prefix):
+    # Smallest string above every string that starts with prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def normalize(query):
+    # Case and spacing do not make queries different
+    return " ".join(query.lower().split())
+
+
+class PrefixIndex:
+    """Completions of a prefix from a sorted array of strings, most frequent first.
+
+    The strings starting with a prefix are one contiguous range of the
+    array, found by binary search, and ranked by weight (ties in string
+    order). Ranges longer than PRECOMPUTED_OVER are ranked at build time.
+    """
+
+    def __init__(self, weights, limit=SUGGESTIONS):
+        self.entries = sorted(weights)
+        self.limit = limit
+        # Rank of each entry by (-weight, string): unique, so the best of a
+        # range are simply its smallest ranks
+        order = sorted(range(len(self.entries)), key=lambda i: -weights[self.entries[i]])
+        self.ranks = np.empty(len(self.entries), dtype=np.int64)
+        self.ranks[order] = np.arange(len(self.entries))
+        self.top = {}
+        self._precompute()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _best(self, lo, hi, k):
+        ranks = self.ranks[lo:hi]
+        if len(ranks) > k:
+            picked = np.argpartition(ranks, k)[:k]
+            picked = picked[np.argsort(ranks[picked])]
+        else:
+            picked = np.argsort(ranks)
+        return [self.entries[lo + i] for i in picked.tolist()]
+
+    def _precompute(self):
+        ranges = [("", 0, len(self.entries))]
+        while ranges:
+            prefix, lo, hi = ranges.pop()
+            if hi - lo <= PRECOMPUTED_OVER:
+                continue
+            self.top[prefix] = self._best(lo, hi, self.limit)
+            depth = len(prefix)
+            # An entry equal to the prefix sorts first and has no longer prefix
+            if len(self.entries[lo]) == depth:
+                lo += 1
+            while lo < hi:
+                child = self.entries[lo][:depth + 1]
+                end = bisect_left(self.entries, _after(child), lo, hi)
+                ranges.append((child, lo, end))
+                lo = end
+
+    def complete(self, prefix, k=SUGGESTIONS):
+        """Up to k entries starting with prefix, best first"""
+        k = min(k, self.limit)
+        if prefix in self.top:
+            return self.top[prefix][:k]
+        lo = bisect_left(self.entries, prefix)
+        hi = bisect_left(self.entries, _after(prefix), lo) if prefix else len(self.entries)
+        return self._best(lo, hi, k)
+
+
+class Suggester:
+    """Typeahead over the index vocabulary and popular past queries.
+
+    Past queries starting with the typed text come first, ranked by how
+    often they were searched. The rest are the typed text with its last
+    word completed from the vocabulary, ranked by document frequency.
+    Built from a snapshot; build a new one whenever the index is rebuilt.
+    The past queries can be refreshed in between with refresh_queries().
+    """
+
+    def __init__(self, index, queries=None, limit=SUGGESTIONS):
+        postings = index["postings"]
+        self.limit = limit
+        self.terms = PrefixIndex({word: doc_freq(postings, word) for word in postings}, limit)
+        self.queries = PrefixIndex(dict(queries or {}), limit)
+
+    def refresh_queries(self, queries):
+        """Rank past queries by new counts. The table is replaced in one
+        assignment, so a suggest() running meanwhile sees the old or new one."""
+        self.queries = PrefixIndex(dict(queries), self.limit)
+
+    def suggest(self, text, limit=SUGGESTIONS):
+        typed = normalize(text)
+        if not typed:
+            return []
+        limit = min(limit, self.limit)
+        suggestions = self.queries.complete(typed, limit)
+        # After a trailing space the last word is finished
+        head, _, last = typed.rpartition(" ")
+        if len(suggestions) < limit and last.isalnum() and not text[-1].isspace():
+            for term in self.terms.complete(last, limit):
+                suggestion = f"{head} {term}" if head else term
+                if suggestion not in suggestions:
+                    suggestions.append(suggestion)
+        return suggestions[:limit]
+
+
+class QueryLog:
+    """How often each query was searched, for Suggester.
+
+    Given a path, starts from the counts saved there, and save() writes
+    them back (one "count<TAB>query" line each).
+    """
+
+    def __init__(self, max_queries=MAX_LOGGED_QUERIES, path=None):
+        self.max_queries = max_queries
+        self.path = path
+        self.counts = Counter()
+        # Searches recorded, so callers can tell whether counts changed
+        self.recorded = 0
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    count, _, query = line.rstrip("\n").partition("\t")
+                    if count.isdigit() and query:
+                        self.counts[query] = int(count)
+
+    def record(self, query):
+        query = normalize(query)
+        if not query or len(query) > MAX_QUERY_LENGTH:
+            return
+        with self.lock:
+            self.counts[query] += 1
+            self.recorded += 1
+            # Let the log grow to twice its size, then keep the most searched
+            if len(self.counts) > 2 * self.max_queries:
+                self.counts = Counter(dict(self.counts.most_common(self.max_queries)))
+
+    def popular(self):
+        """{query: count} of the most searched queries"""
+        with self.lock:
+            return dict(self.counts.most_common(self.max_queries))
+
+    def save(self):
+        """Write the most searched queries to path"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # normalize() leaves no tabs or newlines in a query
+            f.writelines(f"{count}\t{query}\n" for query, count in self.popular().items())
+        os.replace(tmp_path, self.path)
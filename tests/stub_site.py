@@ -0,0 +1,111 @@
+"""Local stub HTTP servers for crawling, used by the crawler tests and
+benchmarks/crawl_benchmark.py.
+
+Each server is one simulated host serving automotive pages. A page at
+PATH links to PATH_0 ... PATH_n and back to /cars/seed, so a page's depth
+is the number of "_" in its path. Servers count the requests per path
+and the most requests they served at once, and answer 503 to a path
+while server.failures[path] is above zero.
+"""
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import crawler
+
+SEED_PATH = "/cars/seed"
+WORDS = ["electric", "vehicle", "battery", "charging", "motor", "torque", "range", "tesla",
+         "hybrid", "engine", "lithium", "grid", "supercharger", "toyota", "ford", "nissan"]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests[self.path] += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            time.sleep(server.latency)
+            self._respond()
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _respond(self):
+        server = self.server
+        with server.lock:
+            failing = server.failures.get(self.path, 0) > 0
+            if failing:
+                server.failures[self.path] -= 1
+        if failing:
+            self._send(503, b"")
+            return
+        port = server.server_address[1]
+        etag = f'"{port}-{self.path}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"")
+            return
+        links = "".join(f'<a href="{self.path}_{n}">link</a>' for n in range(server.links_per_page))
+        rng = random.Random(f"{port}{self.path}")
+        words = " ".join(rng.choice(WORDS) for _ in range(200))
+        body = (f"<html><body><main class='content'><h1>Page {self.path}</h1>"
+                f"<p>{port} {self.path} {words}</p>{links}<a href='{SEED_PATH}'>home</a>"
+                f"</main></body></html>").encode("utf-8")
+        self._send(200, body, {"Content-Type": "text/html", "ETag": etag})
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_servers(hosts, links_per_page, latency):
+    servers = []
+    for _ in range(hosts):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        server.links_per_page = links_per_page
+        server.latency = latency
+        server.lock = threading.Lock()
+        server.requests = Counter()
+        server.failures = {}
+        server.active = 0
+        server.peak = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+def seed_urls(servers):
+    return [f"http://127.0.0.1:{server.server_address[1]}{SEED_PATH}" for server in servers]
+
+
+def reset_crawler(data_dir, keep_validators=False):
+    """Point the crawler's files at data_dir and forget what earlier crawls saw"""
+    crawler.DATA_DIR = data_dir
+    crawler.url_log_file = os.path.join(data_dir, "crawled_urls.bin")
+    crawler.hash_log_file = os.path.join(data_dir, "content_hashes.bin")
+    crawler.simhash_log_file = os.path.join(data_dir, "simhashes.bin")
+    crawler.validator_log_file = os.path.join(data_dir, "http_validators.txt")
+    crawler.store_file = os.path.join(data_dir, "crawl_state.db")
+    crawler.seen_urls = crawler.SeenSet()
+    crawler.seen_hashes = crawler.SeenSet()
+    crawler.near_duplicates = crawler.SimHashIndex(max_distance=crawler.NEAR_DUP_DISTANCE or 0)
+    crawler.doc_counter = 0
+    crawler.sessions.clear()
+    for key in crawler.fetch_stats:
+        crawler.fetch_stats[key] = 0
+    if not keep_validators:
+        crawler.validators = {}
+        crawler.outlinks = {}
@@ -0,0 +1,63 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import indexer
+from analysis import Analyzer, stem
+
+
+@pytest.fixture
+def analyzer():
+    return Analyzer(stemming=False)
+
+
+@pytest.mark.parametrize("text, terms", [
+    ("F-150", ["f150"]),
+    ("f150", ["f150"]),
+    ("Ford F-150 Lightning", ["ford", "f150", "lightning"]),
+    ("ID.4", ["id4"]),
+    ("MX-30", ["mx30"]),
+    ("EV6 and 4Runner", ["ev6", "4runner"]),
+    ("e-tron", ["e", "tron"]),
+    ("well-known", ["well", "known"]),
+    ("2023.Tesla", ["tesla"]),
+])
+def test_model_names(analyzer, text, terms):
+    assert analyzer.analyze(text) == terms
+
+
+def test_sentence_ends_split(analyzer):
+    assert analyzer.analyze("launched in 2023.The Lightning") == ["launched", "lightning"]
+    assert analyzer.analyze("range.Charging") == ["range", "charging"]
+
+
+def test_numbers_and_stop_words_are_dropped(analyzer):
+    assert analyzer.analyze("The 2024 model has 320 miles of range") == ["model", "miles", "range"]
+    assert analyzer.analyze("1,500 3.5 10-20") == []
+
+
+def test_same_terms_for_repeated_tokens(analyzer):
+    # The second analysis comes from the token cache
+    assert analyzer.analyze("ID.4 batteries") == analyzer.analyze("ID.4 batteries") == ["id4", "batteries"]
+
+
+def test_stemming():
+    stemming = Analyzer(stemming=True)
+    assert stemming.analyze("batteries chargers buses F-150s") == ["battery", "charger", "buse", "f150s"]
+    assert Analyzer(stemming=False).analyze("batteries chargers") == ["batteries", "chargers"]
+    assert [stem(word) for word in ("gas", "class", "bus", "tires", "gases")] == ["gas", "class", "bus", "tire",
+                                                                                "gase"]
+
+
+def test_signature_changes_the_data_fingerprint(tmp_path, monkeypatch):
+    (tmp_path / "doc_0.txt").write_text("https://example.com\n\nF-150", encoding="utf-8")
+    monkeypatch.setattr(indexer, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(indexer, "ANALYZER", Analyzer(stemming=False))
+    unstemmed = indexer.data_fingerprint()
+    assert indexer.data_fingerprint() == unstemmed
+    monkeypatch.setattr(indexer, "ANALYZER", Analyzer(stemming=True))
+    assert Analyzer(stemming=True).signature != Analyzer(stemming=False).signature
+    assert indexer.data_fingerprint() != unstemmed
@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import crawl_store
+from crawl_store import CrawlStore
+
+MAX_PAGES = 10
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CrawlStore(str(tmp_path / "crawl_state.db"), str(tmp_path))
+    store.add_seeds([("http://a.example/", "http://a.example/", "a.example"),
+                     ("http://b.example/", "http://b.example/", "b.example")])
+    yield store
+    store.close()
+
+
+def claim(store, owner="worker", limit=8, per_host=4, delay=0.0):
+    return store.claim(owner, limit, MAX_PAGES, per_host, delay)
+
+
+def test_claim_leases_each_url_once(store):
+    rows = claim(store)
+    assert sorted(row[1] for row in rows) == ["http://a.example/", "http://b.example/"]
+    assert claim(store, "other") == []
+    assert store.has_pending(MAX_PAGES)
+
+
+def test_finish_saves_the_document_and_queues_links(store, tmp_path):
+    normalized, url, depth, seed, allowed_domain = claim(store, limit=1)[0]
+    links = [(f"http://{allowed_domain}/{n}", f"http://{allowed_domain}/{n}") for n in range(3)]
+    doc_number = store.finish(normalized, url, seed, "some text", "hash-1", links, depth + 1, MAX_PAGES, 2**64 - 1)
+    assert doc_number == 0
+    assert (tmp_path / "doc_0.txt").read_text(encoding="utf-8") == f"{url}\n\nsome text"
+    assert store.fingerprints() == [2**64 - 1]
+    assert store.content_hashes() == ["hash-1"]
+    assert store.done_urls() == [normalized]
+    assert store.counts() == {"done": 1, "queued": 4}
+
+    # The same content again is not saved
+    other = claim(store, limit=1)[0]
+    assert store.finish(other[0], other[1], other[3], "some text", "hash-1", [], 1, MAX_PAGES) is None
+
+
+def test_claim_keeps_per_host_limits(store):
+    store.finish("http://a.example/", "http://a.example/", 0, None, None,
+                 [(f"http://a.example/{n}", f"http://a.example/{n}") for n in range(10)], 1, MAX_PAGES)
+    store.finish("http://b.example/", "http://b.example/", 1, None, None, [], 1, MAX_PAGES)
+    # One URL per host per claim, at most per_host live leases per host
+    assert len(claim(store, "w1", per_host=2)) == 1
+    assert len(claim(store, "w2", per_host=2)) == 1
+    assert claim(store, "w3", per_host=2) == []
+    # A delay keeps the next claim from the host waiting even with leases free
+    assert len(claim(store, "w4", per_host=4, delay=60)) == 1
+    assert claim(store, "w5", per_host=4) == []
+
+
+def test_failed_fetches_are_retried_then_given_up(store):
+    normalized = "http://a.example/"
+    claim(store)
+    for attempt in range(2):
+        store.retry(normalized, max_retries=2)
+        assert [row[0] for row in claim(store)] == [normalized]
+    store.retry(normalized, max_retries=2)
+    assert claim(store) == []
+    assert store.counts() == {"failed": 1, "in_progress": 1}
+
+
+def test_expired_leases_are_claimed_again(store, monkeypatch):
+    first = {row[0] for row in claim(store)}
+    assert claim(store, "other") == []
+    # The worker holding them dies and its leases run out
+    monkeypatch.setattr(crawl_store.time, "time", lambda: 2e10)
+    assert {row[0] for row in claim(store, "other")} == first
+
+
+def test_seeds_stop_at_max_pages(store):
+    for n in range(MAX_PAGES + 1):
+        rows = [row for row in claim(store) if row[3] == 0]
+        if not rows:
+            break
+        normalized, url, depth, seed, domain = rows[0]
+        store.finish(normalized, url, seed, f"text {n}", f"hash {n}", [(f"{url}{n}", f"{url}{n}")], 1, MAX_PAGES)
+    assert n == MAX_PAGES
+    assert all(row[3] == 1 for row in claim(store))
@@ -0,0 +1,154 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import crawler
+from stub_site import SEED_PATH, reset_crawler, seed_urls, start_servers
+
+HOSTS = 3
+LINKS_PER_PAGE = 5
+
+
+class Interrupted(BaseException):
+    """Stands in for Ctrl-C; crawl_async only catches Exception"""
+
+
+@pytest.fixture
+def servers():
+    servers = start_servers(HOSTS, LINKS_PER_PAGE, latency=0.02)
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawler, "MAX_PAGES", 1000)
+    monkeypatch.setattr(crawler, "MAX_DEPTH", 2)
+    reset_crawler(str(tmp_path))
+    return str(tmp_path)
+
+
+def crawl(servers, **limits):
+    return crawler.crawl_all(seed_urls(servers), **limits)
+
+
+def requests(servers):
+    return [(server.server_address[1], path, count) for server in servers
+            for path, count in server.requests.items()]
+
+
+def test_crawls_to_max_depth_and_fetches_each_url_once(servers, data_dir):
+    stats = crawl(servers)
+    fetched = requests(servers)
+    # The seed and its links, whose own links are past MAX_DEPTH
+    assert sorted(path for _, path, _ in fetched) == sorted(
+        ([SEED_PATH] + [f"{SEED_PATH}_{n}" for n in range(LINKS_PER_PAGE)]) * HOSTS)
+    assert all(count == 1 for _, _, count in fetched)
+    assert stats["fetched"] == stats["saved"] == HOSTS * (LINKS_PER_PAGE + 1)
+
+
+def test_deeper_crawls_follow_more_links(servers, data_dir, monkeypatch):
+    monkeypatch.setattr(crawler, "MAX_DEPTH", 3)
+    crawl(servers)
+    depths = [path.count("_") for _, path, _ in requests(servers)]
+    assert max(depths) == 2
+    assert len(depths) == HOSTS * (1 + LINKS_PER_PAGE + LINKS_PER_PAGE ** 2)
+    assert all(count == 1 for _, _, count in requests(servers))
+
+
+def test_per_host_concurrency_is_bounded(servers, data_dir, monkeypatch):
+    monkeypatch.setattr(crawler, "MAX_DEPTH", 3)
+    for server in servers:
+        server.latency = 0.05
+    crawl(servers, max_concurrency=32, per_host_concurrency=2)
+    peaks = [server.peak for server in servers]
+    assert max(peaks) == 2
+
+
+def test_server_errors_are_retried(servers, data_dir, monkeypatch):
+    monkeypatch.setattr(crawler, "MAX_RETRIES", 2)
+    flaky, broken = servers[0], servers[1]
+    flaky.failures[f"{SEED_PATH}_1"] = 2
+    broken.failures[f"{SEED_PATH}_2"] = 10
+    stats = crawl(servers)
+    assert flaky.requests[f"{SEED_PATH}_1"] == 3
+    assert broken.requests[f"{SEED_PATH}_2"] == 3
+    assert stats["retried"] == 4
+    assert stats["failed"] == 1
+    assert stats["saved"] == HOSTS * (LINKS_PER_PAGE + 1) - 1
+    # The page that never answered is not remembered as crawled
+    assert crawler.normalize_url(f"http://127.0.0.1:{broken.server_address[1]}{SEED_PATH}_2") \
+        not in crawler.seen_urls
+
+
+def test_resume_continues_without_refetching(servers, data_dir, monkeypatch):
+    checkpoint = os.path.join(data_dir, "crawl_checkpoint.json.gz")
+    crawler.load_existing_urls()
+    saved = []
+
+    def interrupt(doc_id, url, text):
+        saved.append(url)
+        # Stop on a page past the link depth, whose links are not needed
+        if len(saved) >= 4 and url.count("_") == 1:
+            raise Interrupted()
+
+    # One fetch at a time, so no response is lost in flight
+    with pytest.raises(Interrupted):
+        crawl(servers, max_concurrency=1, checkpoint_path=checkpoint, on_save=interrupt)
+    first = sum(count for _, _, count in requests(servers))
+    assert first < HOSTS * (LINKS_PER_PAGE + 1)
+
+    # A new process: only the files on disk carry over
+    reset_crawler(data_dir)
+    crawler.load_existing_urls()
+    crawler.doc_counter = crawler.get_starting_doc_id()
+    stats = crawl(servers, max_concurrency=1, checkpoint_path=checkpoint, resume=True)
+    assert stats["fetched"] == HOSTS * (LINKS_PER_PAGE + 1) - first
+    assert all(count == 1 for _, _, count in requests(servers))
+    assert len(requests(servers)) == HOSTS * (LINKS_PER_PAGE + 1)
+    assert len([name for name in os.listdir(data_dir) if name.startswith("doc_")]) == HOSTS * (LINKS_PER_PAGE + 1)
+
+
+def test_workers_share_bloom_dedup_files(servers, data_dir, monkeypatch):
+    monkeypatch.setattr(crawler, "DEDUP_MODE", "bloom")
+    monkeypatch.setattr(crawler, "DEDUP_CAPACITY", 1_000_000)
+    # A Bloom snapshot from an earlier crawl, which every worker loads
+    earlier = crawler.open_seen_set(crawler.url_log_file)
+    earlier.add("https://example.com/earlier")
+    earlier.close()
+    with open(crawler.url_log_file + ".bloom", "rb") as f:
+        snapshot = f.read()
+    # Forked workers inherit the patch, so any of them flushing shows up here
+    flush = crawler.SeenSet.flush
+    flush_log = os.path.join(data_dir, "flushed_by")
+
+    def record_flushes(seen):
+        with open(flush_log, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        flush(seen)
+
+    monkeypatch.setattr(crawler.SeenSet, "flush", record_flushes)
+
+    counts = crawler.crawl_with_workers(seed_urls(servers), 8)
+
+    pages = HOSTS * (LINKS_PER_PAGE + 1)
+    assert counts["done"] == pages
+    assert len([name for name in os.listdir(data_dir) if name.startswith("doc_")]) == pages
+    crawler.seen_urls.close()
+    reopened = crawler.open_seen_set(crawler.url_log_file)
+    assert reopened.logged == pages + 1
+    assert "https://example.com/earlier" in reopened
+    assert all(crawler.normalize_url(f"{url}_{n}") in reopened
+               for url in seed_urls(servers) for n in range(LINKS_PER_PAGE))
+    reopened.close()
+    # Only the parent wrote the logs and snapshot, once the workers were done
+    with open(flush_log) as f:
+        assert {int(pid) for pid in f} == {os.getpid()}
+    with open(crawler.url_log_file + ".bloom", "rb") as f:
+        assert f.read() != snapshot
+    assert not os.path.exists(crawler.url_log_file + ".bloom.tmp")
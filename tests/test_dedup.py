@@ -0,0 +1,167 @@
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import crawler
+from crawler import DEDUP_FP_RATE, NEAR_DUP_DISTANCE
+from dedup import DIGEST, SEEN_HEADER, SeenSet, SimHashIndex, simhash
+
+PAGE = ("The 2024 Ford F-150 Lightning pairs a dual-motor electric drivetrain with "
+        "an extended-range battery good for an EPA-estimated 320 miles. Towing is "
+        "rated at 10,000 pounds, and the Pro Power Onboard system can run a house "
+        "through an outage for several days. Pricing starts at about 50,000 dollars "
+        "before incentives, and the XLT and Lariat trims add a larger touchscreen. "
+        "Inside, the cabin keeps the familiar layout of the gasoline truck, with a "
+        "column shifter that frees up room for a fold-flat work surface between the "
+        "front seats. The front trunk holds 400 liters of cargo behind a powered lid "
+        "and includes drain plugs, so it doubles as a cooler for tailgate parties. "
+        "On the highway, the independent rear suspension gives a noticeably smoother "
+        "ride than the leaf springs found on most full-size pickups, although the "
+        "extra weight shows when braking hard with a loaded bed. Charging from ten "
+        "to eighty percent takes roughly forty minutes on a fast charger, and the "
+        "included home station adds about thirty miles of range per hour. Owners "
+        "can schedule charging through the app, precondition the cabin on cold "
+        "mornings and receive over-the-air updates that have already improved the "
+        "range estimates shown on the dashboard.")
+
+
+def open_set(path, mode, capacity=1000):
+    return SeenSet(str(path), mode, capacity, DEDUP_FP_RATE)
+
+
+@pytest.mark.parametrize("mode", ["exact", "bloom"])
+def test_sets_survive_close_and_reopen(tmp_path, mode):
+    path = tmp_path / "seen.bin"
+    seen = open_set(path, mode)
+    seen.add("https://a.example/")
+    seen.add("https://b.example/", defer=True)
+    seen.close()
+
+    seen = open_set(path, mode)
+    assert "https://a.example/" in seen
+    assert "https://b.example/" in seen
+    assert "https://c.example/" not in seen
+    assert len(seen) == seen.logged == 2
+    seen.close()
+
+
+@pytest.mark.parametrize("mode", ["exact", "bloom"])
+def test_deferred_adds_wait_for_flush(tmp_path, mode):
+    path = tmp_path / "seen.bin"
+    seen = open_set(path, mode)
+    seen.add("https://a.example/", defer=True)
+    assert "https://a.example/" in seen
+    assert os.path.getsize(path) == struct.calcsize(SEEN_HEADER)
+    seen.flush()
+    assert os.path.getsize(path) == struct.calcsize(SEEN_HEADER) + DIGEST.size
+    seen.close()
+
+
+def test_bloom_snapshot_skips_replaying_logged_keys(tmp_path):
+    path = tmp_path / "seen.bin"
+    seen = open_set(path, "bloom")
+    seen.update(f"https://a.example/{n}" for n in range(10))
+    seen.close()
+    # Keys logged after the snapshot are replayed on top of it
+    seen = open_set(path, "bloom")
+    seen.add("https://a.example/late")
+    seen.log.close()
+    seen.log = None
+
+    seen = open_set(path, "bloom")
+    assert all(f"https://a.example/{n}" in seen for n in range(10))
+    assert "https://a.example/late" in seen
+    assert len(seen) == seen.logged == 11
+    seen.close()
+
+
+def test_snapshot_with_another_capacity_replays_the_whole_log(tmp_path):
+    path = tmp_path / "seen.bin"
+    seen = open_set(path, "bloom", capacity=1000)
+    seen.update(f"https://a.example/{n}" for n in range(50))
+    seen.close()
+
+    seen = open_set(path, "bloom", capacity=5000)
+    assert len(seen.members.bits) != os.path.getsize(str(path) + ".bloom")
+    assert all(f"https://a.example/{n}" in seen for n in range(50))
+    assert len(seen) == seen.logged == 50
+    seen.close()
+
+
+@pytest.mark.parametrize("mode", ["exact", "bloom"])
+def test_torn_final_record_is_ignored(tmp_path, mode):
+    path = tmp_path / "seen.bin"
+    seen = open_set(path, mode)
+    seen.add("https://a.example/")
+    seen.log.close()
+    seen.log = None
+    with open(path, "ab") as f:
+        # A crash partway through writing the next digest
+        f.write(b"\x01\x02\x03")
+
+    seen = open_set(path, mode)
+    assert "https://a.example/" in seen
+    assert seen.logged == 1
+    assert os.path.getsize(path) == struct.calcsize(SEEN_HEADER) + DIGEST.size
+    seen.add("https://b.example/")
+    seen.close()
+
+    seen = open_set(path, mode)
+    assert "https://b.example/" in seen
+    assert seen.logged == 2
+    seen.close()
+
+
+def test_bloom_false_positive_rate_stays_near_target():
+    capacity = 20_000
+    seen = SeenSet(None, "bloom", capacity, DEDUP_FP_RATE)
+    seen.update(f"https://a.example/{n}" for n in range(capacity))
+    assert all(f"https://a.example/{n}" in seen for n in range(capacity))
+    trials = 200_000
+    false_positives = sum(f"https://b.example/{n}" in seen for n in range(trials))
+    assert false_positives / trials < 2 * DEDUP_FP_RATE
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def test_one_word_edit_is_a_near_duplicate():
+    edited = PAGE.replace("several days", "three days")
+    assert edited != PAGE
+    assert distance(simhash(PAGE), simhash(edited)) <= NEAR_DUP_DISTANCE
+    index = SimHashIndex(max_distance=NEAR_DUP_DISTANCE)
+    index.add(simhash(PAGE))
+    assert index.find(simhash(edited)) == simhash(PAGE)
+
+
+def test_unrelated_text_is_not_a_near_duplicate():
+    other = ("Mazda's MX-30 is a compact crossover with rear-hinged freestyle doors, "
+             "a cork-trimmed console and a small battery. A rotary range extender "
+             "arrives later for buyers who want more than 100 miles between charges, "
+             "while the cabin uses recycled fabrics and a floating center display.")
+    assert distance(simhash(PAGE), simhash(other)) > NEAR_DUP_DISTANCE
+    index = SimHashIndex(max_distance=NEAR_DUP_DISTANCE)
+    index.add(simhash(PAGE))
+    assert index.find(simhash(other)) is None
+
+
+def test_load_existing_simhashes_round_trips(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawler, "simhash_log_file", str(tmp_path / "simhashes.bin"))
+    monkeypatch.setattr(crawler, "near_duplicates", SimHashIndex(max_distance=NEAR_DUP_DISTANCE))
+    fingerprints = [simhash(PAGE), 0, 2**64 - 1]
+    index = crawler.load_existing_simhashes()
+    for fingerprint in fingerprints + [simhash(PAGE)]:
+        index.add(fingerprint)
+    assert len(index) == 3
+
+    reloaded = crawler.load_existing_simhashes()
+    assert reloaded is crawler.near_duplicates
+    assert len(reloaded) == 3
+    assert all(fingerprint in reloaded for fingerprint in fingerprints)
+    assert crawler.is_near_duplicate(simhash(PAGE.replace("several days", "three days")))
+    reloaded.close()
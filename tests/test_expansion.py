@@ -0,0 +1,54 @@
+import os
+import random
+import string
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from expansion import QueryExpander, MIN_FUZZY_DOC_FREQ
+from indexer import add_document, build_inverted_index, copy_index, delete_document, query_expander
+
+SYNONYMS = (("ev", "electric vehicle"),)
+
+
+def random_vocabulary(rng, size):
+    return {"".join(rng.choices("aeiorstn", k=rng.randint(4, 9))): rng.randint(1, 5) for _ in range(size)}
+
+
+def test_updates_match_a_rebuild():
+    rng = random.Random(1)
+    vocabulary = random_vocabulary(rng, 400)
+    expander = QueryExpander(dict(vocabulary), SYNONYMS)
+    for word in rng.sample(sorted(vocabulary), 150) + list(random_vocabulary(rng, 100)):
+        vocabulary[word] = rng.choice([0, 1, MIN_FUZZY_DOC_FREQ, 7])
+        expander.update(word, vocabulary[word])
+        if not vocabulary[word]:
+            del vocabulary[word]
+    rebuilt = QueryExpander(vocabulary, SYNONYMS)
+    for word in rng.sample(sorted(vocabulary), 200):
+        i = rng.randrange(len(word))
+        typo = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+        assert expander.corrections(typo) == rebuilt.corrections(typo)
+
+
+def test_synonyms_follow_the_vocabulary():
+    expander = QueryExpander({"ev": 3, "electric": 3}, SYNONYMS)
+    assert ("ev",) not in expander.synonyms
+    expander.update("vehicle", 2)
+    assert expander.synonyms[("ev",)] == (("phrase", ("electric", "vehicle")),)
+    expander.update("vehicle", 0)
+    assert ("ev",) not in expander.synonyms
+
+
+def test_documents_update_the_expander_of_their_index():
+    documents = {f"doc_{n}": [f"https://example.org/{n}", "toyota hybrid battery"] for n in range(3)}
+    index = build_inverted_index(documents)
+    expander = query_expander(index)
+    copied = copy_index(index)
+    for n in range(2):
+        add_document(copied, documents, f"new_{n}", f"https://example.org/new/{n}", "supercharger network")
+    assert copied["expander"] is not expander
+    assert copied["expander"].corrections("supercharjer") == ["supercharger"]
+    assert expander.corrections("supercharjer") == []
+    delete_document(copied, documents, "new_0")
+    assert copied["expander"].corrections("supercharjer") == []
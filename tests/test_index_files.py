@@ -0,0 +1,152 @@
+import os
+import random
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import indexer
+from document_store import DOCUMENTS_HEADER
+from indexer import (HEADER_FORMAT, INDEX_VERSION, add_document, build_inverted_index, copy_index, delete_document,
+                     load_index, save_index, search, search_exhaustive)
+from postings import BLOCK_SIZE
+
+WORDS = ["electric", "battery", "charging", "tesla", "hybrid", "torque", "lithium", "range", "F-150", "ID.4"]
+FINGERPRINT = bytes(range(32))
+
+
+def make_documents(num_docs=3 * BLOCK_SIZE, seed=0):
+    rng = random.Random(seed)
+    hosts = ["en.wikipedia.org", "www.motortrend.com", "quotes.toscrape.com"]
+    documents = {}
+    for number in range(num_docs):
+        # "range" is in every document, so its postings span several blocks
+        text = " ".join(rng.choices(WORDS, k=rng.randint(5, 40))) + " range"
+        documents[f"doc_{number}"] = [f"https://{hosts[number % 3]}/page/{number}", text]
+    return documents
+
+
+@pytest.fixture
+def saved(tmp_path):
+    documents = make_documents()
+    index = build_inverted_index(documents)
+    paths = str(tmp_path / "index.bin"), str(tmp_path / "documents.bin")
+    save_index(index, documents, FINGERPRINT, *paths)
+    return documents, index, paths
+
+
+def test_load_returns_what_was_saved(saved):
+    documents, index, paths = saved
+    loaded_documents, loaded = load_index(FINGERPRINT, *paths)
+
+    assert {doc_id: list(loaded_documents[doc_id]) for doc_id in loaded_documents} == documents
+    assert {word: loaded["postings"][word] for word in loaded["postings"]} == index["postings"]
+    assert len(loaded["postings"]) == len(index["postings"])
+    assert loaded["doc_lengths"] == index["doc_lengths"]
+    assert {doc_id: loaded["doc_terms"][doc_id] for doc_id in loaded["doc_terms"]} == index["doc_terms"]
+    assert loaded["max_tf"] == index["max_tf"]
+    assert loaded["hosts"] == index["hosts"]
+    assert loaded["blocked"] == index["blocked"]
+    assert index["postings"]["range"].keys() == documents.keys()
+
+
+def test_mapped_lookups_match_dicts(saved):
+    documents, index, paths = saved
+    postings = load_index(FINGERPRINT, *paths)[1]["postings"]
+    # Scattered over every block, and a few that do not contain the word
+    doc_ids = [f"doc_{number}" for number in range(0, len(documents), 37)] + ["doc_missing"]
+    for word in ("range", "tesla", "f150"):
+        word_postings = index["postings"][word]
+        assert postings.doc_freq(word) == len(word_postings)
+        assert postings.documents(word) == set(word_postings)
+        assert postings.documents(word, doc_ids) == {doc_id for doc_id in doc_ids if doc_id in word_postings}
+        assert postings.positions(word, doc_ids) == {doc_id: word_postings[doc_id] for doc_id in doc_ids
+                                                     if doc_id in word_postings}
+
+
+def test_searches_agree_after_loading(saved):
+    documents, index, paths = saved
+    loaded_documents, loaded = load_index(FINGERPRINT, *paths)
+    for query in ("tesla battery", '"electric range"', "f150 -hybrid", "lithium OR torque", "site:motortrend.com id4"):
+        expected = search_exhaustive(query, documents, index, 20)
+        assert search(query, loaded_documents, loaded, 20) == expected
+        assert search_exhaustive(query, loaded_documents, loaded, 20) == expected
+
+
+def test_incremental_updates_on_a_loaded_index(saved):
+    documents, index, paths = saved
+    loaded_documents, loaded = load_index(FINGERPRINT, *paths)
+    for target_documents, target in ((documents, index), (loaded_documents, loaded)):
+        add_document(target, target_documents, "doc_new", "https://example.org/new", "supercharger tesla range")
+        add_document(target, target_documents, "doc_1", "https://example.org/1", "solid state battery")
+        delete_document(target, target_documents, "doc_2")
+    assert {word: loaded["postings"][word] for word in loaded["postings"]} == index["postings"]
+    assert {doc_id: loaded["doc_terms"][doc_id] for doc_id in loaded["doc_terms"]} == index["doc_terms"]
+    for query in ("supercharger", "solid state battery", "tesla range"):
+        assert search(query, loaded_documents, loaded, 20) == search_exhaustive(query, documents, index, 20)
+
+
+def _rewrite(path, offset, value):
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(struct.pack("<I", value))
+
+
+def test_other_format_version_is_not_loaded(saved):
+    _, _, paths = saved
+    # The version follows the 8-byte magic in both files
+    _rewrite(paths[0], 8, INDEX_VERSION + 1)
+    assert load_index(FINGERPRINT, *paths) is None
+    _rewrite(paths[0], 8, INDEX_VERSION)
+    assert load_index(FINGERPRINT, *paths) is not None
+
+    (documents_version,) = struct.unpack_from("<I", open(paths[1], "rb").read(struct.calcsize(DOCUMENTS_HEADER)), 8)
+    _rewrite(paths[1], 8, documents_version + 1)
+    assert load_index(FINGERPRINT, *paths) is None
+
+
+def test_stale_or_missing_files_are_not_loaded(saved, tmp_path):
+    _, _, paths = saved
+    assert load_index(bytes(32), *paths) is None
+    assert load_index(FINGERPRINT, str(tmp_path / "missing.bin"), paths[1]) is None
+    with open(paths[0], "r+b") as f:
+        f.truncate(struct.calcsize(HEADER_FORMAT) - 1)
+    assert load_index(FINGERPRINT, *paths) is None
+
+
+def test_build_index_files_round_trip(tmp_path, monkeypatch):
+    documents = make_documents(50)
+    for doc_id, (url, text) in documents.items():
+        # Loading keeps only automotive pages off blocked domains
+        (tmp_path / f"{doc_id}.txt").write_text(f"{url}\n\nelectric vehicle car battery tesla {text}", encoding="utf-8")
+    monkeypatch.setattr(indexer, "DATA_DIR", str(tmp_path))
+    paths = str(tmp_path / "index.bin"), str(tmp_path / "documents.bin")
+    fingerprint = indexer.build_index_files(*paths, workers=1)
+    loaded_documents, loaded = load_index(fingerprint, *paths)
+    expected = {doc_id for doc_id, (url, _) in documents.items() if "toscrape" not in url}
+    assert set(loaded_documents) == expected == set(loaded["doc_lengths"])
+
+
+@pytest.mark.parametrize("mapped", [False, True])
+def test_copies_change_independently(saved, mapped):
+    documents, index, paths = saved
+    if mapped:
+        documents, index = load_index(FINGERPRINT, *paths)
+    before = search_exhaustive("battery tesla", documents, index)
+    docs_copy, index_copy = documents.copy(), copy_index(index)
+    add_document(index_copy, docs_copy, "doc_new", "https://example.org/new", "supercharger tesla battery")
+    add_document(index_copy, docs_copy, "doc_1", "https://example.org/1", "solid state battery")
+    delete_document(index_copy, docs_copy, "doc_2")
+    assert search_exhaustive("battery tesla", documents, index) == before
+    assert "doc_new" not in documents and "doc_2" in index["doc_lengths"]
+
+    # A copy of the copy starts from its changes and leaves it alone too
+    again_docs, again = docs_copy.copy(), copy_index(index_copy)
+    delete_document(again, again_docs, "doc_new")
+    assert "doc_new" in index_copy["postings"]["supercharger"]
+    rebuilt = build_inverted_index({doc_id: list(docs_copy[doc_id]) for doc_id in docs_copy})
+    assert {word: index_copy["postings"][word] for word in index_copy["postings"]} == rebuilt["postings"]
+    assert dict(index_copy["doc_lengths"]) == rebuilt["doc_lengths"]
+    assert index_copy["hosts"] == rebuilt["hosts"]
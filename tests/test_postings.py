@@ -0,0 +1,83 @@
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from postings import BLOCK_SIZE, SMALL_VARINTS, PostingsReader, decode_varints, encode_postings, encode_varints
+
+# The largest value of each varint length, and the smallest of the next
+EDGES = [0, 1, 127, 128, 2**14 - 1, 2**14, 2**21 - 1, 2**21, 2**28 - 1, 2**28, 2**35 - 1]
+
+
+def test_varint_lengths():
+    assert [len(encode_varints([value])) for value in EDGES] == [1, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+
+
+@pytest.mark.parametrize("count", [0, 1, SMALL_VARINTS - 1, SMALL_VARINTS, 1000])
+def test_varint_round_trip(count):
+    # Short inputs decode in a loop and long ones with NumPy
+    rng = random.Random(count)
+    values = [rng.choice(EDGES) for _ in range(count)]
+    assert decode_varints(encode_varints(values)).tolist() == values
+    assert decode_varints(memoryview(encode_varints(values))).tolist() == values
+
+
+def make_postings(num_docs, seed=0):
+    rng = random.Random(seed)
+    doc_numbers = sorted(rng.sample(range(num_docs * 50), num_docs))
+    tfs = [rng.choice([1, 1, 2, 5, 300]) for _ in doc_numbers]
+    positions = []
+    for tf in tfs:
+        positions += sorted(rng.sample(range(100_000), tf))
+    return doc_numbers, tfs, positions
+
+
+def reader_for(doc_numbers, tfs, positions, padding=b"xyz"):
+    # Stored after other data, as in index.bin
+    data = padding + encode_postings(doc_numbers, tfs, positions)
+    return PostingsReader(data, len(padding), len(doc_numbers), len(data))
+
+
+@pytest.mark.parametrize("num_docs", [1, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 1, 3 * BLOCK_SIZE + 7])
+def test_postings_round_trip(num_docs):
+    doc_numbers, tfs, positions = make_postings(num_docs, num_docs)
+    reader = reader_for(doc_numbers, tfs, positions)
+    assert reader.num_blocks == -(-num_docs // BLOCK_SIZE)
+
+    decoded = reader.decode()
+    assert decoded[0].tolist() == doc_numbers
+    assert decoded[1].tolist() == tfs
+    assert decoded[2].tolist() == positions
+    assert reader.decode(with_positions=False)[2] is None
+
+
+@pytest.mark.parametrize("num_docs", [BLOCK_SIZE, BLOCK_SIZE + 1, 3 * BLOCK_SIZE + 7])
+def test_blocks_decode_on_their_own(num_docs):
+    doc_numbers, tfs, positions = make_postings(num_docs, num_docs)
+    reader = reader_for(doc_numbers, tfs, positions)
+    ends = np.cumsum([0] + tfs).tolist()
+    for block in range(reader.num_blocks):
+        start = block * BLOCK_SIZE
+        end = min(start + BLOCK_SIZE, num_docs)
+        block_docs, block_tfs, block_positions = reader.decode_block(block)
+        assert block_docs.tolist() == doc_numbers[start:end]
+        assert block_tfs.tolist() == tfs[start:end]
+        assert block_positions.tolist() == positions[ends[start]:ends[end]]
+        assert reader.last_docs[block] == doc_numbers[end - 1]
+
+
+def test_find_block_and_tf():
+    doc_numbers, tfs, positions = make_postings(2 * BLOCK_SIZE + 3)
+    reader = reader_for(doc_numbers, tfs, positions)
+    for i in (0, BLOCK_SIZE - 1, BLOCK_SIZE, 2 * BLOCK_SIZE, len(doc_numbers) - 1):
+        assert reader.find_block(doc_numbers[i]) == i // BLOCK_SIZE
+        assert reader.tf(doc_numbers[i]) == tfs[i]
+    missing = set(range(doc_numbers[-1] + 2)) - set(doc_numbers)
+    assert all(reader.tf(doc_number) == 0 for doc_number in sorted(missing)[:200])
+    assert reader.find_block(doc_numbers[-1] + 1) == reader.num_blocks
+    assert reader.tf(doc_numbers[-1] + 1) == 0
+
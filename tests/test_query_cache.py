@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from query_cache import QueryCache, cached_search
+
+
+def searcher(label):
+    return lambda query, top_k: [{"url": f"{label}/{query}"}]
+
+
+def test_results_are_cached_per_normalized_query():
+    cache = QueryCache()
+    first = cached_search(cache, "The Tesla", {}, {}, search_function=searcher("a"))
+    assert cached_search(cache, "tesla", {}, {}, search_function=searcher("b")) == first
+    assert cache.stats()["hits"] == 1
+
+
+def test_versions_never_share_entries():
+    cache = QueryCache()
+    old = cached_search(cache, "tesla", {}, {}, search_function=searcher("old"), version=1)
+    # A request pinned to the new index while the old one's entries remain
+    new = cached_search(cache, "tesla", {}, {}, search_function=searcher("new"), version=2)
+    assert new != old
+    assert cached_search(cache, "tesla", {}, {}, search_function=searcher("other"), version=1) == old
+    assert cached_search(cache, "tesla", {}, {}, search_function=searcher("other"), version=2) == new
+
+
+def test_invalidate_drops_entries_computed_before_it():
+    cache = QueryCache()
+    version = cache.version
+    cache.invalidate()
+    cache.put("tesla", 10, [{"url": "stale"}], version)
+    assert cache.get("tesla", 10) is None
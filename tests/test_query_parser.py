@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from indexer import normalize_query
+from query_parser import parse
+
+
+@pytest.mark.parametrize("query, tree", [
+    ("", None),
+    ("   ", None),
+    ("tesla", ("word", "tesla")),
+    ("tesla battery", ("seq", [("word", "tesla"), ("word", "battery")])),
+    ('"solid state battery"', ("phrase", "solid state battery")),
+    ('"unclosed phrase', ("phrase", "unclosed phrase")),
+    ("-model", ("not", ("word", "model"))),
+    ("NOT model", ("not", ("word", "model"))),
+    ("site:EN.Wikipedia.org", ("site", "en.wikipedia.org")),
+    ("tesla AND supercharger", ("and", [("word", "tesla"), ("word", "supercharger")])),
+    ("tesla OR ford battery", ("or", [("word", "tesla"), ("seq", [("word", "ford"), ("word", "battery")])])),
+    ("a OR b AND c", ("or", [("word", "a"), ("and", [("word", "b"), ("word", "c")])])),
+    ("(tesla OR ford) AND battery", ("and", [("or", [("word", "tesla"), ("word", "ford")]), ("word", "battery")])),
+    ("-(tesla OR ford)", ("not", ("or", [("word", "tesla"), ("word", "ford")]))),
+    # Lower case operators are words; dangling operators are dropped
+    ("tesla and ford", ("seq", [("word", "tesla"), ("word", "and"), ("word", "ford")])),
+    ("tesla AND", ("word", "tesla")),
+    ("NOT", None),
+    ("(tesla", ("word", "tesla")),
+    ("tesla) ford", ("seq", [("word", "tesla"), ("word", "ford")])),
+    ("- --", None),
+])
+def test_parse(query, tree):
+    assert parse(query) == tree
+
+
+@pytest.mark.parametrize("query, normalized", [
+    ("The Tesla", ("word", "tesla")),
+    ("the", None),
+    ("e-tron", ("seq", (("word", "e"), ("word", "tron")))),
+    ("F-150 towing", ("seq", (("word", "f150"), ("word", "towing")))),
+    ('"the model 3"', ("phrase", ("model",))),
+    ("tesla -the", ("word", "tesla")),
+    ("(tesla) AND (the)", ("word", "tesla")),
+])
+def test_normalize_query(query, normalized):
+    assert normalize_query(query) == normalized
+
+
+def test_equivalent_queries_normalize_alike():
+    assert normalize_query("The TESLA battery") == normalize_query("tesla   battery")
+    assert normalize_query("tesla battery") != normalize_query("battery tesla")
@@ -0,0 +1,94 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+MODELS = ["tesla model 3", "ford mustang mach-e", "nissan leaf", "toyota bz4x", "gm hummer ev"]
+NEW_PAGES = 15
+
+
+def page(number):
+    model = MODELS[number % len(MODELS)]
+    return (f"https://www.motortrend.com/cars/{number}",
+            f"The {model} is an electric car. Its battery pack and charging speed set the range "
+            f"of this electric vehicle, review number {number}.")
+
+
+def write_page(number):
+    url, text = page(number)
+    with open(os.path.join("data", f"doc_{number}.txt"), "w", encoding="utf-8") as f:
+        f.write(f"{url}\n\n{text}")
+    return f"doc_{number}", url, text
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    # app indexes ./data when it is imported; give it a small corpus of its own
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(tmp_path_factory.mktemp("app"))
+        os.makedirs("data")
+        for number in range(10):
+            write_page(number)
+        yield importlib.import_module("app")
+
+
+def test_searches_during_a_recrawl_see_one_snapshot(app, monkeypatch):
+    published = []
+    publish = app.engine.publish
+    monkeypatch.setattr(app.engine, "publish", lambda snapshot: (published.append(snapshot), publish(snapshot)))
+    monkeypatch.setitem(app.app.config, "RECRAWL_PUBLISH_SECONDS", 0.01)
+
+    def crawl(on_save=None):
+        for number in range(10, 10 + NEW_PAGES):
+            on_save(*write_page(number))
+            time.sleep(0.01)
+
+    monkeypatch.setattr(app, "crawl_seed_urls", crawl)
+    done = threading.Event()
+    errors = []
+
+    def search_until_done():
+        while not done.is_set():
+            with app.engine.acquire() as snapshot:
+                version = snapshot.version
+                documents = set(snapshot.documents)
+                first = app.rank(snapshot, "tesla", 100)
+                time.sleep(0.005)
+                second = app.rank(snapshot, "tesla", 100)
+                if first != second or snapshot.version != version or set(snapshot.documents) != documents:
+                    errors.append(("changed under a search", version))
+                if {result["doc_id"] for result in first} != {doc_id for doc_id in documents
+                                                               if int(doc_id[len("doc_"):]) % len(MODELS) == 0}:
+                    errors.append(("results from another snapshot", version))
+
+    searchers = [threading.Thread(target=search_until_done) for _ in range(3)]
+    with app.engine.acquire() as pinned:
+        before = app.rank(pinned, "tesla", 100)
+        for searcher in searchers:
+            searcher.start()
+        app.run_recrawl()
+        done.set()
+        for searcher in searchers:
+            searcher.join()
+        # A search that started before the recrawl still reads its own snapshot
+        assert app.rank(pinned, "tesla", 100) == before
+        assert len(pinned.documents) == 10
+
+    assert errors == []
+    assert app.recrawl_status["state"] == "succeeded"
+    assert app.recrawl_status["pages_indexed"] == NEW_PAGES
+    # Pages were published as they came in, without building a matrix for each publish
+    increments, final = published[:-1], published[-1]
+    assert increments
+    assert all(snapshot.matrix is None and snapshot.suggester is pinned.suggester for snapshot in increments)
+    assert final.matrix is not None and final.suggester is not pinned.suggester
+    with app.engine.acquire() as snapshot:
+        assert snapshot is final
+        assert len(snapshot.documents) == 10 + NEW_PAGES
+        assert {result["doc_id"] for result in app.rank(snapshot, "nissan leaf", 100)} == {
+            f"doc_{number}" for number in range(10 + NEW_PAGES) if number % len(MODELS) == 2}
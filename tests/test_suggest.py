@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from suggest import QueryLog, Suggester
+
+INDEX = {"postings": {"tesla": {"doc_1": [0]}, "toyota": {"doc_1": [1], "doc_2": [0]}}}
+
+
+def test_query_log_survives_a_restart(tmp_path):
+    path = str(tmp_path / "query_log.tsv")
+    log = QueryLog(path=path)
+    for query in ("Tesla  Model", "tesla model", "toyota prius"):
+        log.record(query)
+    log.save()
+    assert QueryLog(path=path).popular() == {"tesla model": 2, "toyota prius": 1}
+
+
+def test_missing_query_log_starts_empty(tmp_path):
+    assert QueryLog(path=str(tmp_path / "query_log.tsv")).popular() == {}
+
+
+def test_refresh_queries_reranks_past_queries():
+    suggester = Suggester(INDEX, {"tesla model": 1})
+    assert suggester.suggest("t") == ["tesla model", "toyota", "tesla"]
+    suggester.refresh_queries({"tesla model": 1, "toyota prius": 5})
+    assert suggester.suggest("t") == ["toyota prius", "tesla model", "toyota", "tesla"]
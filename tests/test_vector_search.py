@@ -0,0 +1,171 @@
+import os
+import random
+import sys
+from math import log
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from indexer import (_exhaustive_hits, add_document, build_inverted_index, delete_document, load_index, plan_query,
+                     save_index, search_exhaustive)
+from vector_search import BM25_B, BM25_K1, DocumentMatrix, ShardedMatrix, _doc_numbers
+
+WORDS = ["electric", "battery", "charging", "tesla", "hybrid", "torque", "lithium", "range", "F-150", "ID.4"]
+HOSTS = ["en.wikipedia.org", "www.motortrend.com", "quotes.toscrape.com"]
+QUERIES = ["tesla battery", "range", '"electric range"', "f150 -hybrid", "lithium OR torque",
+           "site:motortrend.com id4", "charging hybrid torque", "unknownword"]
+FINGERPRINT = bytes(range(32))
+
+
+def make_documents(num_docs=300, seed=0):
+    rng = random.Random(seed)
+    documents = {}
+    for number in range(num_docs):
+        text = " ".join(rng.choices(WORDS, k=rng.randint(5, 40)))
+        documents[f"doc_{number}"] = [f"https://{HOSTS[number % 3]}/page/{number}", text]
+    return documents
+
+
+@pytest.fixture
+def collection():
+    documents = make_documents()
+    return documents, build_inverted_index(documents)
+
+
+def raw_hits(matrix, documents, index, query, top_k=20):
+    terms, allowed, _ = plan_query(query, index, top_k)
+    expected = _exhaustive_hits(terms, documents, index, top_k, allowed)
+    hits = matrix.top_hits(terms, top_k, _doc_numbers(allowed, matrix.doc_numbers_by_id))
+    return hits, expected
+
+
+def assert_same_hits(hits, expected):
+    assert [(doc_id, url) for _, doc_id, url in hits] == [(doc_id, url) for _, doc_id, url in expected]
+    assert [score for score, _, _ in hits] == pytest.approx([score for score, _, _ in expected])
+
+
+def assert_matches_exhaustive(matrix, documents, index):
+    for query in QUERIES:
+        assert matrix.search(query, 20) == search_exhaustive(query, documents, index, 20)
+        assert_same_hits(*raw_hits(matrix, documents, index, query))
+
+
+def test_tf_idf_matches_search_exhaustive(collection):
+    documents, index = collection
+    assert_matches_exhaustive(DocumentMatrix(index, documents), documents, index)
+
+
+def test_bm25_scores(collection):
+    documents, index = collection
+    matrix = DocumentMatrix(index, documents)
+    postings = index["postings"]
+    doc_lengths = index["doc_lengths"]
+    average = sum(doc_lengths.values()) / len(doc_lengths)
+    expected = np.zeros(len(matrix.doc_ids))
+    for term in ("tesla", "battery"):
+        frequency = len(postings[term])
+        idf = log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+        for doc_id, positions in postings[term].items():
+            tf = len(positions)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[doc_id] / average)
+            expected[matrix.doc_numbers_by_id[doc_id]] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+    assert matrix.score(["tesla", "battery"], "bm25") == pytest.approx(expected)
+
+    hits = matrix.top_hits(["tesla", "battery"], 10, ranking="bm25")
+    best = sorted(((expected[n], doc_id) for n, doc_id in enumerate(matrix.doc_ids)
+                   if doc_id not in index["blocked"]), key=lambda hit: (-hit[0], hit[1]))[:10]
+    assert [doc_id for _, doc_id, _ in hits] == [doc_id for _, doc_id in best]
+    with pytest.raises(ValueError):
+        matrix.score(["tesla"], "cosine")
+
+
+def test_allowed_and_blocked_documents(collection):
+    documents, index = collection
+    matrix = DocumentMatrix(index, documents)
+    assert index["blocked"]
+    hits = matrix.top_hits(["range"], len(documents))
+    assert hits
+    assert not {doc_id for _, doc_id, _ in hits} & index["blocked"]
+
+    allowed = {f"doc_{number}" for number in range(0, 300, 7)} | {"doc_missing"}
+    hits = matrix.top_hits(["range"], len(documents), _doc_numbers(allowed, matrix.doc_numbers_by_id))
+    assert hits
+    assert {doc_id for _, doc_id, _ in hits} <= allowed - index["blocked"]
+    assert matrix.top_hits(["range"], 10, _doc_numbers(set(), matrix.doc_numbers_by_id)) == []
+
+
+@pytest.mark.parametrize("ranking", ["tfidf", "bm25"])
+def test_search_batch_matches_search(collection, ranking):
+    documents, index = collection
+    matrix = DocumentMatrix(index, documents)
+    assert matrix.search_batch(QUERIES, 20, ranking) == [matrix.search(query, 20, ranking) for query in QUERIES]
+
+
+def test_search_batch_in_several_chunks(collection, monkeypatch):
+    documents, index = collection
+    matrix = DocumentMatrix(index, documents)
+    expected = matrix.search_batch(QUERIES, 20)
+    # Room for two queries per chunk
+    monkeypatch.setattr("vector_search.BATCH_CELLS", 2 * len(documents))
+    assert matrix.search_batch(QUERIES, 20) == expected
+
+
+def test_mapped_and_mutated_index(collection, tmp_path):
+    documents, index = collection
+    paths = str(tmp_path / "index.bin"), str(tmp_path / "documents.bin")
+    save_index(index, documents, FINGERPRINT, *paths)
+    loaded_documents, loaded = load_index(FINGERPRINT, *paths)
+    assert_matches_exhaustive(DocumentMatrix(loaded, loaded_documents), loaded_documents, loaded)
+
+    add_document(loaded, loaded_documents, "doc_300", "https://www.motortrend.com/page/300",
+                 "tesla battery range range lithium")
+    delete_document(loaded, loaded_documents, "doc_4")
+    delete_document(loaded, loaded_documents, "doc_10")
+    matrix = DocumentMatrix(loaded, loaded_documents)
+    assert "doc_4" not in matrix.doc_numbers_by_id
+    assert_matches_exhaustive(matrix, loaded_documents, loaded)
+
+
+@pytest.mark.parametrize("shards", [1, 2, 3, 7])
+@pytest.mark.parametrize("ranking", ["tfidf", "bm25"])
+def test_sharded_results_equal_unsharded(collection, shards, ranking):
+    documents, index = collection
+    matrix = DocumentMatrix(index, documents)
+    sharded = ShardedMatrix(index, documents, shards)
+    assert len(sharded.shards) == shards
+    for query in QUERIES:
+        assert sharded.search(query, 20, ranking) == matrix.search(query, 20, ranking)
+        terms, allowed, _ = plan_query(query, index, 20)
+        numbers = _doc_numbers(allowed, matrix.doc_numbers_by_id)
+        assert sharded.top_hits(terms, 20, numbers, ranking) == matrix.top_hits(terms, 20, numbers, ranking)
+    assert sharded.search_batch(QUERIES, 20, ranking) == matrix.search_batch(QUERIES, 20, ranking)
+    sharded.close()
+
+
+def test_equal_scores_tie_across_shards():
+    # Every document scores the same, so the top k is the k smallest doc_ids
+    # wherever the shards split them
+    documents = {f"doc_{number}": [f"https://www.motortrend.com/page/{number}",
+                                   "tesla battery range" if number % 2 else "hybrid torque range"]
+                 for number in range(80)}
+    index = build_inverted_index(documents)
+    expected = sorted(doc_id for doc_id, (_, text) in documents.items() if "tesla" in text)[:15]
+    for shards in (1, 3, 4, 9):
+        sharded = ShardedMatrix(index, documents, shards)
+        hits = sharded.top_hits(["tesla"], 15)
+        assert [doc_id for _, doc_id, _ in hits] == expected
+        assert len({score for score, _, _ in hits}) == 1
+        assert [result["doc_id"] for result in sharded.search("tesla", 15)] == expected
+        sharded.close()
+
+
+def test_more_shards_than_documents():
+    documents = make_documents(num_docs=5)
+    index = build_inverted_index(documents)
+    sharded = ShardedMatrix(index, documents, 16)
+    assert sum(len(shard.doc_ids) for shard in sharded.shards) == 5
+    for query in QUERIES:
+        assert sharded.search(query, 20) == search_exhaustive(query, documents, index, 20)
+    sharded.close()
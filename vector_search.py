@@ -0,0 +1,268 @@
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from math import log
+
+import numpy as np
+
+from indexer import (MIN_SCORE, MAX_RESULTS, hit_order, rank_query, plan_query, finish_query)
+from metrics import stage
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Scores for at most this many (query, document) pairs are held at once in search_batch
+BATCH_CELLS = 50_000_000
+
+
+class DocumentMatrix:
+    """Sparse term-document matrix for vectorized scoring.
+
+    Stored in CSR form with one row per term, i.e. the term's postings:
+    row t spans doc_numbers[indptr[t]:indptr[t + 1]] and tf[...] over the
+    same range. Scoring a query gathers the rows of its terms and adds
+    their weights into a dense score vector, one NumPy operation per term.
+
+    The matrix is a snapshot of the index; build a new one after the
+    index changes. Phrases and proximity read positions from the index.
+    """
+
+    def __init__(self, index, documents):
+        self.index = index
+        postings = index["postings"]
+        self.doc_ids = list(index["doc_lengths"])
+        self.urls = [documents[doc_id][0] for doc_id in self.doc_ids]
+        self.doc_numbers_by_id = doc_numbers = {doc_id: number for number, doc_id in enumerate(self.doc_ids)}
+        # Doc number of doc_ids[0]; shards number from their own first document
+        self.start = 0
+        self.total_docs = len(documents)
+
+        self.terms = {}
+        indptr = [0]
+        rows = []
+        counts = []
+        # A mapped index numbers its documents the same way unless some were
+        # removed since loading; then its doc numbers and tfs can be used
+        # without decoding positions
+        saved_doc_ids = getattr(postings, "doc_ids", None)
+        numbered_alike = saved_doc_ids is not None and self.doc_ids[:len(saved_doc_ids)] == saved_doc_ids
+        for term in postings:
+            self.terms[term] = len(self.terms)
+            reader = postings.reader(term) if numbered_alike else None
+            if reader is not None:
+                term_docs, term_tfs, _ = reader.decode(with_positions=False)
+                rows.append(term_docs.astype(np.int32))
+                counts.append(term_tfs.astype(np.int32))
+            else:
+                word_postings = postings[term]
+                rows.append(np.fromiter((doc_numbers[doc_id] for doc_id in word_postings), np.int32,
+                                        len(word_postings)))
+                counts.append(np.fromiter((len(positions) for positions in word_postings.values()),
+                                          np.int32, len(word_postings)))
+            indptr.append(indptr[-1] + len(rows[-1]))
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.doc_numbers = np.concatenate(rows) if rows else np.zeros(0, np.int32)
+        self.tf = np.concatenate(counts) if counts else np.zeros(0, np.int32)
+
+        self.doc_lengths = np.array([index["doc_lengths"][doc_id] for doc_id in self.doc_ids], dtype=np.float64)
+        self.avg_doc_length = self.doc_lengths.mean() if len(self.doc_ids) else 0.0
+        self.blocked = np.zeros(len(self.doc_ids), dtype=bool)
+        self.blocked[[doc_numbers[doc_id] for doc_id in index["blocked"]]] = True
+
+        doc_freqs = np.diff(self.indptr).astype(np.float64)
+        # Same formulas as calculate_tf_idf, so TF-IDF scores match search()
+        self.idf = np.array([log(self.total_docs / (df + 1)) for df in doc_freqs], dtype=np.float64)
+        self.bm25_idf = np.log1p((self.total_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+        lengths = self.doc_lengths[self.doc_numbers]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.tf_idf = np.where(lengths > 0, self.tf / lengths, 0.0) * np.repeat(self.idf, doc_freqs.astype(np.int64))
+
+    def memory_bytes(self):
+        arrays = (self.indptr, self.doc_numbers, self.tf, self.doc_lengths, self.blocked,
+                  self.idf, self.bm25_idf, self.tf_idf)
+        return sum(array.nbytes for array in arrays)
+
+    def _term_weights(self, term, ranking, k1, b):
+        row = self.terms[term]
+        start, end = self.indptr[row], self.indptr[row + 1]
+        doc_numbers = self.doc_numbers[start:end]
+        if ranking == "tfidf":
+            return doc_numbers, self.tf_idf[start:end]
+        if ranking == "bm25":
+            tf = self.tf[start:end]
+            norm = k1 * (1 - b + b * self.doc_lengths[doc_numbers] / self.avg_doc_length)
+            return doc_numbers, self.bm25_idf[row] * tf * (k1 + 1) / (tf + norm)
+        raise ValueError(f"Unknown ranking: {ranking}")
+
+    def score(self, terms, ranking="tfidf", k1=BM25_K1, b=BM25_B):
+        """Dense vector of every document's score for the query terms"""
+        scores = np.zeros(len(self.doc_ids), dtype=np.float64)
+        for term in terms:
+            if term in self.terms:
+                doc_numbers, weights = self._term_weights(term, ranking, k1, b)
+                # A document appears once per row, so fancy-index += is safe
+                scores[doc_numbers] += weights
+        return scores
+
+    def search(self, query, top_k=MAX_RESULTS, ranking="tfidf", k1=BM25_K1, b=BM25_B):
+        """Same results as indexer.search, or BM25 ranked"""
+        return rank_query(query, self.index, top_k, lambda terms, depth, allowed: self.top_hits(
+            terms, depth, _doc_numbers(allowed, self.doc_numbers_by_id), ranking, k1, b))
+
+    def top_hits(self, terms, top_k, allowed=None, ranking="tfidf", k1=BM25_K1, b=BM25_B):
+        """Best (score, doc_id, url) hits for terms, before normalization.
+
+        allowed, unless None, is the sorted array of doc numbers that may
+        match (see _doc_numbers)."""
+        scores = self.score(terms, ranking, k1, b)
+        with stage("sort"):
+            return self._top(scores, top_k, allowed)
+
+    def search_batch(self, queries, top_k=MAX_RESULTS, ranking="tfidf", k1=BM25_K1, b=BM25_B):
+        """Results for many queries at once, e.g. for offline evaluation.
+
+        Each chunk of queries becomes one sparse query-term matrix, and its
+        product with the document matrix is accumulated in a single
+        bincount over (query, document) cells.
+        """
+        plans = [_numbered_plan(plan_query(query, self.index, top_k), self.doc_numbers_by_id) for query in queries]
+        hits = self.top_hits_batch(plans, ranking, k1, b)
+        return [finish_query(terms, query_hits, self.index, top_k)
+                for (terms, _, _), query_hits in zip(plans, hits)]
+
+    def top_hits_batch(self, plans, ranking="tfidf", k1=BM25_K1, b=BM25_B):
+        """top_hits for each (terms, allowed doc numbers, depth) plan"""
+        num_docs = len(self.doc_ids)
+        chunk = max(1, BATCH_CELLS // max(1, num_docs))
+        hits = []
+        for first in range(0, len(plans), chunk):
+            batch = plans[first:first + chunk]
+            cells = []
+            weights = []
+            for row, (terms, _, _) in enumerate(batch):
+                for term in terms:
+                    if term in self.terms:
+                        doc_numbers, term_weights = self._term_weights(term, ranking, k1, b)
+                        cells.append(doc_numbers + row * num_docs)
+                        weights.append(term_weights)
+            if cells:
+                scores = np.bincount(np.concatenate(cells), np.concatenate(weights), minlength=len(batch) * num_docs)
+            else:
+                scores = np.zeros(len(batch) * num_docs)
+            scores = scores.reshape(len(batch), num_docs)
+            hits.extend(self._top(row_scores, depth, allowed)
+                        for row_scores, (_, allowed, depth) in zip(scores, batch))
+        return hits
+
+    def _top(self, scores, top_k, allowed=None):
+        candidates = (scores >= MIN_SCORE) & ~self.blocked
+        if allowed is not None:
+            # This matrix's slice of the sorted doc numbers
+            first, last = np.searchsorted(allowed, (self.start, self.start + len(self.doc_ids)))
+            allowed = allowed[first:last] - self.start
+            keep = allowed[candidates[allowed]]
+        else:
+            keep = np.flatnonzero(candidates)
+        if len(keep) > top_k:
+            # Keep everything tied with the k-th score; ties are broken by doc_id below
+            kth = np.partition(scores[keep], len(keep) - top_k)[len(keep) - top_k]
+            keep = keep[scores[keep] >= kth]
+        hits = [(float(scores[n]), self.doc_ids[n], self.urls[n]) for n in keep]
+        hits.sort(key=hit_order)
+        return hits[:top_k]
+
+    def shard(self, start, end):
+        """The documents numbered start to end - 1 as a matrix of their own.
+
+        IDF, BM25 IDF and the average document length stay those of the
+        whole collection, so shard scores equal the unsharded scores.
+        """
+        shard = object.__new__(DocumentMatrix)
+        shard.index = self.index
+        shard.doc_ids = self.doc_ids[start:end]
+        shard.start = self.start + start
+        shard.urls = self.urls[start:end]
+        shard.total_docs = self.total_docs
+        shard.terms = self.terms
+        shard.idf = self.idf
+        shard.bm25_idf = self.bm25_idf
+        shard.avg_doc_length = self.avg_doc_length
+        shard.doc_lengths = self.doc_lengths[start:end]
+        shard.blocked = self.blocked[start:end]
+
+        inside = (self.doc_numbers >= start) & (self.doc_numbers < end)
+        rows = np.repeat(np.arange(len(self.indptr) - 1), np.diff(self.indptr))
+        shard.indptr = np.zeros(len(self.indptr), dtype=np.int64)
+        np.cumsum(np.bincount(rows[inside], minlength=len(self.indptr) - 1), out=shard.indptr[1:])
+        shard.doc_numbers = (self.doc_numbers[inside] - start).astype(np.int32)
+        shard.tf = self.tf[inside]
+        shard.tf_idf = self.tf_idf[inside]
+        return shard
+
+
+def _doc_numbers(allowed, doc_numbers_by_id):
+    """allowed doc_ids as a sorted array of doc numbers, or None if allowed is None.
+
+    Made once per query; each shard slices out its own range.
+    """
+    if allowed is None:
+        return None
+    numbers = np.fromiter((doc_numbers_by_id[doc_id] for doc_id in allowed if doc_id in doc_numbers_by_id),
+                          np.int64)
+    numbers.sort()
+    return numbers
+
+
+def _numbered_plan(plan, doc_numbers_by_id):
+    terms, allowed, depth = plan
+    return terms, _doc_numbers(allowed, doc_numbers_by_id), depth
+
+
+class ShardedMatrix:
+    """DocumentMatrix split into shards by doc number, scored in parallel.
+
+    Each query is scored on every shard by a thread pool (NumPy releases
+    the GIL in the array operations that dominate scoring a large shard).
+    The per-shard top k lists are merged into the global top k, which is
+    the same as DocumentMatrix.search on the whole collection. The pool's
+    threads exit once the matrix is garbage collected, or on close().
+    """
+
+    def __init__(self, index, documents, shards):
+        matrix = DocumentMatrix(index, documents)
+        self.index = index
+        self.doc_numbers_by_id = matrix.doc_numbers_by_id
+        self.total_docs = matrix.total_docs
+        size = max(1, -(-len(matrix.doc_ids) // shards))
+        self.shards = [matrix.shard(start, start + size) for start in range(0, max(1, len(matrix.doc_ids)), size)]
+        self.pool = ThreadPoolExecutor(max_workers=len(self.shards)) if len(self.shards) > 1 else None
+
+    def memory_bytes(self):
+        return sum(shard.memory_bytes() for shard in self.shards)
+
+    def _map(self, function):
+        if self.pool is None:
+            return [function(shard) for shard in self.shards]
+        return list(self.pool.map(function, self.shards))
+
+    def search(self, query, top_k=MAX_RESULTS, ranking="tfidf", k1=BM25_K1, b=BM25_B):
+        return rank_query(query, self.index, top_k, lambda terms, depth, allowed: self.top_hits(
+            terms, depth, _doc_numbers(allowed, self.doc_numbers_by_id), ranking, k1, b))
+
+    def top_hits(self, terms, top_k, allowed=None, ranking="tfidf", k1=BM25_K1, b=BM25_B):
+        shard_hits = self._map(lambda shard: shard.top_hits(terms, top_k, allowed, ranking, k1, b))
+        with stage("sort"):
+            return _merge(shard_hits, top_k)
+
+    def search_batch(self, queries, top_k=MAX_RESULTS, ranking="tfidf", k1=BM25_K1, b=BM25_B):
+        plans = [_numbered_plan(plan_query(query, self.index, top_k), self.doc_numbers_by_id) for query in queries]
+        shard_hits = self._map(lambda shard: shard.top_hits_batch(plans, ranking, k1, b))
+        return [finish_query(terms, _merge(query_hits, depth), self.index, top_k)
+                for (terms, _, depth), query_hits in zip(plans, zip(*shard_hits))]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+
+
+def _merge(shard_hits, top_k):
+    return list(islice(heapq.merge(*shard_hits, key=hit_order), top_k))